@@ -1,13 +1,22 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 import os
-from ..api.utils import read_json, write_json, users_path
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from ..api.utils import read_json_async, run_io, update_json_async
+from ..services.config_registry import get_config, get_config_registry
+from ..services.key_pool import flush_key_pool
+from ..services.metrics_service import RESOLUTIONS, get_metrics, record
+from ..services.notification_dispatcher import queue_path
+from ..services.notification_queue import read_pending
+from ..services.plan_cache import get_plan_cache
+from ..storage import get_async_storage, get_storage
 
 def require_admin(request: Request):
     session_user = request.session.get("user") if hasattr(request, "session") else None
     if not session_user:
         raise HTTPException(status_code=401, detail="Authentication required")
-    users = read_json(users_path(), [])
-    u = next((x for x in users if x.get("username") == session_user.get("username")), None)
+    u = get_storage().get_user(session_user.get("username"))
     if not u:
         raise HTTPException(status_code=401, detail="Authentication required")
     # Simple rule: admin if role==admin or plan==enterprise
@@ -26,104 +35,141 @@ async def admin_health():
 
 @router.get("/admin/users")
 async def admin_users():
-    users = read_json(users_path(), [])
-    return {"users": users}
+    return {"users": await get_async_storage().list_users()}
 
 
 @router.get("/admin/api-keys")
 async def admin_api_keys():
-    cfg_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "gemini_keys.json")
-    return {"keys": read_json(cfg_path, [])}
+    await run_io(flush_key_pool)  # usage counters are batched in memory
+    return {"keys": get_config("gemini_keys", [])}
 
 
 @router.post("/admin/api-keys/add")
 async def admin_api_keys_add(key: str, quota_limit: int = 100000):
-    cfg_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "gemini_keys.json")
-    keys = read_json(cfg_path, [])
-    if any(k.get("key") == key for k in keys):
-        raise HTTPException(status_code=400, detail="Key exists")
-    keys.append({"key": key, "quota_limit": quota_limit, "current_usage": 0, "last_used": None, "status": "active", "error_count": 0})
-    write_json(cfg_path, keys)
+    def apply(keys: list) -> None:
+        if any(k.get("key") == key for k in keys):
+            raise HTTPException(status_code=400, detail="Key exists")
+        keys.append({"key": key, "quota_limit": quota_limit, "current_usage": 0, "last_used": None, "status": "active", "error_count": 0})
+
+    await run_io(get_config_registry().update, "gemini_keys", [], apply)
     return {"ok": True}
 
 
 @router.delete("/admin/api-keys/{key}")
 async def admin_api_keys_delete(key: str):
-    cfg_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "gemini_keys.json")
-    keys = read_json(cfg_path, [])
-    new_list = [k for k in keys if k.get("key") != key]
-    write_json(cfg_path, new_list)
+    await run_io(get_config_registry().update, "gemini_keys", [], lambda keys: [k for k in keys if k.get("key") != key])
     return {"ok": True}
 
 
 @router.get("/admin/upgrade-requests")
 async def admin_upgrade_requests():
     path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "upgrade_requests.json")
-    return {"items": read_json(path, [])}
+    return {"items": await read_json_async(path, [])}
+
+
+def _dead_letters(limit: int) -> list:
+    return list(deque(get_storage().iter_log("notifications_dead"), maxlen=limit))
 
 
 @router.get("/admin/notifications-queue")
-async def admin_notifications_queue():
-    path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "notifications_queue.json")
-    return {"items": read_json(path, [])}
+async def admin_notifications_queue(dead_limit: int = 100):
+    return {
+        "items": await run_io(read_pending, queue_path()),
+        "dead_letters": await run_io(_dead_letters, max(0, min(dead_limit, 1000))),
+    }
 
 
 @router.post("/admin/approve-upgrade")
 async def approve_upgrade(username: str, plan: str, approve: bool = True):
     base = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-    users = read_json(os.path.join(base, "data", "users.json"), [])
     reqs_path = os.path.join(base, "data", "upgrade_requests.json")
-    reqs = read_json(reqs_path, [])
-    # update request status
-    for r in reqs:
-        if r.get("username") == username and r.get("plan") == plan and r.get("status") == "pending":
-            r["status"] = "approved" if approve else "rejected"
-            break
-    write_json(reqs_path, reqs)
+
+    def apply(reqs: list) -> None:
+        # update request status
+        for r in reqs:
+            if r.get("username") == username and r.get("plan") == plan and r.get("status") == "pending":
+                r["status"] = "approved" if approve else "rejected"
+                break
+
+    await update_json_async(reqs_path, [], apply)
     if approve:
         # update user plan
-        for u in users:
-            if u.get("username") == username:
-                u["plan"] = plan
-                break
-        write_json(os.path.join(base, "data", "users.json"), users)
+        store = get_async_storage()
+        user = await store.get_user(username)
+        if user and user.get("plan", "free") != plan:
+            await record("plan_users." + user.get("plan", "free"), -1)
+            await record("plan_users." + plan)
+            user["plan"] = plan
+            await store.save_user(user)
+        await record("upgrades_approved")
     return {"ok": True}
 
 
 @router.get("/admin/bank-info")
 async def admin_bank_info_get():
-    path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "bank_info.json")
-    return read_json(path, {})
+    return get_config("bank_info", {})
 
 
 @router.post("/admin/bank-info")
 async def admin_bank_info_set(account_name: str = "", account_number: str = "", bank: str = "", qr_base64: str = ""):
-    path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "bank_info.json")
-    data = read_json(path, {})
-    data.update({
+    await run_io(get_config_registry().update, "bank_info", {}, lambda data: data.update({
         "account_name": account_name,
         "account_number": account_number,
         "bank": bank,
         "qr_base64": qr_base64,
-    })
-    write_json(path, data)
+    }))
     return {"ok": True}
 
 
-@router.get("/admin/metrics")
-async def admin_metrics():
-    base = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
-    metrics_path = os.path.join(base, "business_metrics.json")
-    users = read_json(os.path.join(base, "users.json"), [])
-    upgrades = read_json(os.path.join(base, "upgrade_requests.json"), [])
-    ai_log = read_json(os.path.join(base, "ai_call_log.json"), [])
-    out = read_json(metrics_path, {})
-    # simple aggregates
-    out["total_users"] = len(users)
-    out["upgrade_requests"] = len(upgrades)
-    out["ai_calls_total"] = len(ai_log)
-    out["pro_users"] = sum(1 for u in users if u.get("plan") in ("pro_basic", "pro_plus", "enterprise"))
-    write_json(metrics_path, out)
-    return out
+def _epoch(day: Optional[str], end: bool = False) -> Optional[float]:
+    """Epoch seconds at the start (or last second) of a YYYY-MM-DD day, UTC."""
+    if not day:
+        return None
+    try:
+        start = datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    moment = start + timedelta(days=1, seconds=-1) if end else start
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+
+def _range_summary(series: Dict[str, Any]) -> Dict[str, Any]:
+    """Dashboard figures for the selected range, from at most one ring of points."""
+    points = series["points"]
+
+    def total(name: str) -> int:
+        return sum(p["counts"].get(name, 0) for p in points)
+
+    calls, failed = total("ai_calls_total"), total("ai_calls_errors")
+    days = max(1, round(len(points) * series["step"] / 86400))
+    return {
+        "new_users": total("total_users"),
+        "ai_calls": calls,
+        "growth_data": {
+            "labels": [datetime.utcfromtimestamp(p["ts"]).isoformat() for p in points],
+            "values": [p["counts"].get("total_users", 0) for p in points],
+        },
+        "ai_stats": {
+            "total_calls": calls,
+            "successful_calls": calls - failed,
+            "failed_calls": failed,
+            "success_rate": round(100 * (calls - failed) / calls, 1) if calls else 0,
+            "avg_per_day": round(calls / days, 1),
+        },
+    }
 
 
+@router.get("/admin/metrics")
+async def admin_metrics(resolution: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """Counters kept up to date as events happen; ``resolution`` (minute, hour,
+    day) or a date range adds a time series for charts."""
+    if resolution is None and (start_date or end_date):
+        resolution = "day"
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    out = await run_io(get_metrics().snapshot, resolution, _epoch(start_date), _epoch(end_date, end=True))
+    if "series" in out:
+        out.update(_range_summary(out["series"]))
+    out["plan_distribution"] = out.get("plan_users", {})
+    out["ai_plan_cache"] = get_plan_cache().stats()  # live counters, not persisted
+    return out
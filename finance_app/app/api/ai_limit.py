@@ -1,87 +1,73 @@
-import os
 from datetime import datetime
-from typing import Dict, Optional
-
-from .utils import read_json, write_json
-
-
-def _limits_path() -> str:
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "account_types.json")
-
-
-def _ai_log_path() -> str:
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "ai_call_log.json")
-
-
-def _reset_log_path() -> str:
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "reset_log.json")
+from typing import Dict, List, Optional
+
+from .utils import run_io
+from ..services.config_registry import get_config
+from ..services.event_writer import get_event_writer
+from ..services.metrics_service import record
+from ..services.quota_service import QuotaDecision, QuotaRule, get_quota_service
+
+# usage field -> (period, plan limit field, message when exceeded); monthly first,
+# so a user over both limits is told about the monthly one
+AI_QUOTAS = {
+    "ai_month": ("month", "ai_monthly", "AI monthly quota exceeded"),
+    "ai_day": ("day", "ai_daily", "AI daily quota exceeded"),
+}
+VOICE_QUOTAS = {
+    "voice_month": ("month", "voice_monthly", "Voice monthly quota exceeded"),
+}
+_MESSAGES = {name: spec[2] for quotas in (AI_QUOTAS, VOICE_QUOTAS) for name, spec in quotas.items()}
 
 
 def get_plan_limits(plan: str) -> Dict:
-    cfg = read_json(_limits_path(), {})
+    cfg = get_config("account_types", {})
     return cfg.get(plan, cfg.get("free", {}))
 
 
-def should_reset_month(last_month: Optional[str], tz: str = "Asia/Ho_Chi_Minh") -> bool:
-    # Simplified: ignore tz for now
-    now_key = datetime.utcnow().strftime("%Y-%m")
-    return last_month != now_key
-
-
-def log_ai_call(entry: Dict) -> None:
-    log = read_json(_ai_log_path(), [])
-    log.append(entry)
-    write_json(_ai_log_path(), log)
-
+def quota_rules(plan_cfg: Dict, quotas: Dict) -> List[QuotaRule]:
+    return [QuotaRule(name, period, int(plan_cfg.get(field, 0))) for name, (period, field, _) in quotas.items()]
 
-def log_reset(username: str, kind: str) -> None:
-    log = read_json(_reset_log_path(), [])
-    log.append({"username": username, "kind": kind, "ts": datetime.utcnow().isoformat()})
-    write_json(_reset_log_path(), log)
 
+def quota_message(name: str) -> str:
+    return _MESSAGES.get(name, "Quota exceeded")
 
-def ensure_usage_fields(user: Dict) -> Dict:
-    user.setdefault("plan_usage", {})
-    for key in ("ai_month", "ai_day", "voice_month"):
-        user["plan_usage"].setdefault(key, 0)
-    return user
 
+async def log_ai_call(entry: Dict) -> None:
+    get_event_writer().emit("ai_call_log", entry)
+    await record("ai_calls_total")
+    await record("ai_calls_by_type." + str(entry.get("type", "unknown")))
+    if entry.get("status") == "error":
+        await record("ai_calls_errors")
 
-def reset_month_if_needed(user: Dict, username: str) -> None:
-    if should_reset_month(user.get("last_reset_month")):
-        ensure_usage_fields(user)
-        user["plan_usage"]["ai_month"] = 0
-        user["plan_usage"]["voice_month"] = 0
-        user["last_reset_month"] = datetime.utcnow().strftime("%Y-%m")
-        log_reset(username, "ai_month")
-        log_reset(username, "voice_month")
 
+async def log_reset(username: str, *kinds: str) -> None:
+    ts = datetime.utcnow().isoformat()
+    get_event_writer().emit_many("reset_log", [{"username": username, "kind": kind, "ts": ts} for kind in kinds])
 
-def reset_day_if_needed(user: Dict, username: str) -> None:
-    today_key = datetime.utcnow().strftime("%Y-%m-%d")
-    if user.get("last_reset_day") != today_key:
-        ensure_usage_fields(user)
-        user["plan_usage"]["ai_day"] = 0
-        user["last_reset_day"] = today_key
-        log_reset(username, "ai_day")
 
+async def consume_quota(username: str, rules: List[QuotaRule]) -> QuotaDecision:
+    """Check and charge one unit of every rule atomically.
 
-def check_ai_quota(user: Dict, plan_cfg: Dict) -> Optional[str]:
-    monthly_limit = plan_cfg.get("ai_monthly", 0)
-    daily_limit = plan_cfg.get("ai_daily", 0)
-    if monthly_limit >= 0 and user["plan_usage"].get("ai_month", 0) >= monthly_limit:
-        return "AI monthly quota exceeded"
-    if daily_limit >= 0 and user["plan_usage"].get("ai_day", 0) >= daily_limit:
-        return "AI daily quota exceeded"
-    return None
+    Counters are keyed by period, so there is nothing to reset; the first
+    charge of a new day or month is recorded in ``reset_log`` instead.
+    """
+    service = get_quota_service()
+    decision = await run_io(service.consume, username, rules) if service.blocking else service.consume(username, rules)
+    if decision.started:
+        await log_reset(username, *decision.started)
+    return decision
 
 
-def check_voice_quota(user: Dict, plan_cfg: Dict) -> Optional[str]:
-    monthly_limit = plan_cfg.get("voice_monthly", 0)
-    if monthly_limit == 0:
-        return "Voice input not available for your plan"
-    if monthly_limit >= 0 and user["plan_usage"].get("voice_month", 0) >= monthly_limit:
-        return "Voice monthly quota exceeded"
-    return None
+async def refund_quota(decision: QuotaDecision) -> None:
+    service = get_quota_service()
+    if service.blocking:
+        await run_io(service.refund, decision)
+    else:
+        service.refund(decision)
 
 
+async def check_quota(username: str, rules: List[QuotaRule]) -> Optional[str]:
+    """Message for the first exhausted rule, or None; nothing is charged."""
+    service = get_quota_service()
+    exceeded = await run_io(service.check, username, rules) if service.blocking else service.check(username, rules)
+    return quota_message(exceeded) if exceeded else None
@@ -2,15 +2,39 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from passlib.hash import bcrypt
-from .utils import read_json, write_json, users_path
-import os, secrets
-from datetime import datetime, timedelta
+from .utils import run_io
+from ..storage import get_async_storage
 from ..services.email_service import EmailService
+from ..services.metrics_service import record
+from ..services.password_hasher import PasswordHasherBusy, get_password_hasher
+from ..services.reset_tokens import ResetTokenError, get_reset_tokens
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+async def hash_password(password: str) -> str:
+    try:
+        return await get_password_hasher().hash(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+
+async def check_password(user: Optional[dict], password: str) -> bool:
+    """Verify off the event loop; re-hash and save when the stored cost is outdated."""
+    if not user:
+        return False
+    try:
+        ok, new_hash = await get_password_hasher().verify_and_update(password, user.get("password_hash", ""))
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    if new_hash:
+        # Only the hash, and only if a reset has not replaced it meanwhile
+        await get_async_storage().update_user(
+            user["username"], {"password_hash": new_hash}, expect={"password_hash": user.get("password_hash")}
+        )
+    return ok
+
+
 class RegisterRequest(BaseModel):
     username: str
     email: EmailStr
@@ -25,13 +49,13 @@ class LoginRequest(BaseModel):
 
 @router.post("/register")
 async def register_user(body: RegisterRequest):
-    users = read_json(users_path(), [])
-    if any(u.get("username") == body.username or u.get("email") == body.email for u in users):
+    store = get_async_storage()
+    if await store.user_exists(username=body.username, email=str(body.email)):
         raise HTTPException(status_code=400, detail="User already exists")
     user = {
         "username": body.username,
         "email": str(body.email),
-        "password_hash": bcrypt.hash(body.password),
+        "password_hash": await hash_password(body.password),
         "plan": "free",
         "plan_usage": {"ai_month": 0, "ai_day": 0, "voice_month": 0},
         "last_reset_day": None,
@@ -41,30 +65,28 @@ async def register_user(body: RegisterRequest):
         "points": 0,
     }
     # Referral bonus: if referral_code matches an existing username, give both 1 month-equivalent points (stub: +50)
-    if body.referral_code:
-        ref = next((u for u in users if u.get("username") == body.referral_code), None)
-        if ref:
-            ref["points"] = int(ref.get("points", 0)) + 50
-            user["points"] = int(user.get("points", 0)) + 50
-    users.append(user)
-    write_json(users_path(), users)
+    # The existence check above only saves a hash; create_user decides atomically
+    if not await store.create_user(user, referrer=body.referral_code, referral_points=50):
+        raise HTTPException(status_code=400, detail="User already exists")
+    await record("total_users")
+    await record("plan_users.free")
     return {"ok": True, "message": "registered", "user": {"username": body.username, "email": body.email}}
 
 
 @router.post("/login")
 async def login_user(body: LoginRequest):
-    users = read_json(users_path(), [])
-    user = next((u for u in users if u.get("username") == body.username_or_email or u.get("email") == body.username_or_email), None)
-    if not user or not bcrypt.verify(body.password, user.get("password_hash", "")):
+    store = get_async_storage()
+    user = await store.get_user(body.username_or_email) or await store.get_user_by_email(body.username_or_email)
+    if not await check_password(user, body.password):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     return {"ok": True, "message": "logged_in", "user": {"username": user["username"], "plan": user.get("plan", "free")}}
 
 
 @router.post("/login-form")
 async def login_form(request: Request, username_or_email: str = Form(...), password: str = Form(...)):
-    users = read_json(users_path(), [])
-    user = next((u for u in users if u.get("username") == username_or_email or u.get("email") == username_or_email), None)
-    if not user or not bcrypt.verify(password, user.get("password_hash", "")):
+    store = get_async_storage()
+    user = await store.get_user(username_or_email) or await store.get_user_by_email(username_or_email)
+    if not await check_password(user, password):
         response = RedirectResponse(url="/login?error=1", status_code=302)
         return response
     request.session["user"] = {"username": user["username"], "plan": user.get("plan", "free"), "role": user.get("role", "user")}
@@ -73,13 +95,13 @@ async def login_form(request: Request, username_or_email: str = Form(...), passw
 
 @router.post("/register-form")
 async def register_form(request: Request, username: str = Form(...), email: EmailStr = Form(...), password: str = Form(...), referral_code: str = Form(None)):
-    users = read_json(users_path(), [])
-    if any(u.get("username") == username or u.get("email") == str(email) for u in users):
+    store = get_async_storage()
+    if await store.user_exists(username=username, email=str(email)):
         return RedirectResponse(url="/register?error=1", status_code=302)
     user = {
         "username": username,
         "email": str(email),
-        "password_hash": bcrypt.hash(password),
+        "password_hash": await hash_password(password),
         "plan": "free",
         "plan_usage": {"ai_month": 0, "ai_day": 0, "voice_month": 0},
         "last_reset_day": None,
@@ -89,13 +111,10 @@ async def register_form(request: Request, username: str = Form(...), email: Emai
         "points": 0,
         "role": "user",
     }
-    if referral_code:
-        ref = next((u for u in users if u.get("username") == referral_code), None)
-        if ref:
-            ref["points"] = int(ref.get("points", 0)) + 50
-            user["points"] = int(user.get("points", 0)) + 50
-    users.append(user)
-    write_json(users_path(), users)
+    if not await store.create_user(user, referrer=referral_code, referral_points=50):
+        return RedirectResponse(url="/register?error=1", status_code=302)
+    await record("total_users")
+    await record("plan_users.free")
     request.session["user"] = {"username": username, "plan": "free", "role": "user"}
     return RedirectResponse(url="/", status_code=302)
 
@@ -111,8 +130,7 @@ async def me(request: Request):
     user_session = request.session.get("user")
     if not user_session:
         return {"authenticated": False}
-    users = read_json(users_path(), [])
-    user = next((u for u in users if u.get("username") == user_session.get("username")), None)
+    user = await get_async_storage().get_user(user_session.get("username"))
     if not user:
         return {"authenticated": False}
     return {
@@ -125,19 +143,10 @@ async def me(request: Request):
 
 @router.post("/forgot-password")
 async def forgot_password(email: EmailStr):
-    users = read_json(users_path(), [])
-    user = next((u for u in users if u.get("email") == str(email)), None)
-    token_store = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "password_resets.json")
-    resets = read_json(token_store, [])
+    user = await get_async_storage().get_user_by_email(str(email))
     if user:
-        token = secrets.token_urlsafe(24)
-        resets.append({
-            "username": user["username"],
-            "token": token,
-            "expires_at": (datetime.utcnow() + timedelta(hours=1)).isoformat()
-        })
-        write_json(token_store, resets)
-        EmailService().send(str(email), "Password Reset", f"Use this token to reset: {token}")
+        token = await run_io(get_reset_tokens().issue, user["username"])
+        await run_io(EmailService().send, str(email), "Password Reset", f"Use this token to reset: {token}")
     return {"ok": True}
 
 
@@ -154,22 +163,17 @@ class ResetPasswordRequest(BaseModel):
 
 @router.post("/reset-password")
 async def reset_password(body: ResetPasswordRequest):
-    token_store = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "password_resets.json")
-    resets = read_json(token_store, [])
-    now = datetime.utcnow()
-    record = next((r for r in resets if r.get("token") == body.token), None)
-    if not record:
-        raise HTTPException(status_code=400, detail="Invalid token")
-    if datetime.fromisoformat(record.get("expires_at")) < now:
-        raise HTTPException(status_code=400, detail="Token expired")
-    users = read_json(users_path(), [])
-    for u in users:
-        if u.get("username") == record.get("username"):
-            u["password_hash"] = bcrypt.hash(body.new_password)
-            break
-    write_json(users_path(), users)
-    resets = [r for r in resets if r.get("token") != body.token]
-    write_json(token_store, resets)
+    tokens = get_reset_tokens()
+    try:
+        # Reject unknown or expired tokens before spending a bcrypt hash on them
+        await run_io(tokens.check, body.token)
+    except ResetTokenError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    # Hash before consuming: a busy hasher answers 503 and the token must survive the retry
+    password_hash = await hash_password(body.new_password)
+    try:
+        username = await run_io(tokens.consume, body.token)
+    except ResetTokenError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    await get_async_storage().update_user(username, {"password_hash": password_hash})
     return {"ok": True}
-
-
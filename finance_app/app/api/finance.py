@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Response, HTTPException
+from fastapi import APIRouter, HTTPException, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
-import os
-from datetime import datetime, timedelta
-from .utils import read_json, write_json, user_data_dir
-import io
-import csv
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from collections import defaultdict
+from typing import Any, List, Optional, Dict, Tuple
+from datetime import date, datetime, timedelta
+from ..storage import get_async_storage
+from ..storage.query import ExpenseFilter
+from ..services.expense_ingest import IMPORT_FORMATS, MAX_BATCH_ROWS, ingest_expenses, parse_import
+from ..services.analytics_service import GROUP_BY, get_analytics_service, months_between
+from ..services.cache_service import cached
+from ..services.export_jobs import artifact_filename, artifact_path, get_export_jobs, get_job, job_response
+from ..services.export_service import gzip_stream, iter_export
+from .ai_limit import get_plan_limits
+from .utils import run_io
 
 router = APIRouter(prefix="/finance", tags=["finance"])
 
@@ -20,32 +23,100 @@ class Expense(BaseModel):
     note: Optional[str] = None
 
 
-@router.get("/expenses", response_model=List[Expense])
-async def list_expenses(username: str = "demo"):
-    year_month = datetime.utcnow().strftime("%Y-%m")
-    path = os.path.join(user_data_dir(username), f"expenses_{year_month}.json")
-    data = read_json(path, [])
-    return data
+class StoredExpense(Expense):
+    id: str
+
+
+_MAX_PAGE = 500
+
+
+@router.get("/expenses", response_model=List[StoredExpense])
+async def list_expenses(
+    response: Response,
+    username: str = "demo",
+    month: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    """Newest-first expenses of one month.
+
+    Without ``limit`` the whole (filtered) month is returned as before. With
+    it, the response holds one page and ``X-Next-Cursor`` carries the value
+    to pass as ``cursor`` for the next one.
+    """
+    if limit is not None and not 1 <= limit <= _MAX_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {_MAX_PAGE}")
+    year_month = month or datetime.utcnow().strftime("%Y-%m")
+    flt = ExpenseFilter(
+        category=category,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        start_date=start_date,
+        end_date=end_date,
+        note=q or None,
+    )
+    rows, next_cursor = await get_async_storage().query_expenses(username, year_month, flt, limit, cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 
 @router.post("/expenses")
 async def add_expense(expense: Expense, username: str = "demo"):
     year_month = datetime.utcnow().strftime("%Y-%m")
-    path = os.path.join(user_data_dir(username), f"expenses_{year_month}.json")
-    data = read_json(path, [])
-    data.insert(0, expense.dict())
-    write_json(path, data)
-    return {"ok": True, "expense": expense}
+    row = await get_async_storage().add_expense(username, year_month, expense.dict())
+    return {"ok": True, "expense": row}
 
 
-@router.delete("/expenses/{index}")
-async def delete_expense(index: int, username: str = "demo"):
-    year_month = datetime.utcnow().strftime("%Y-%m")
-    path = os.path.join(user_data_dir(username), f"expenses_{year_month}.json")
-    data = read_json(path, [])
-    if 0 <= index < len(data):
-        data.pop(index)
-        write_json(path, data)
+class ExpenseBatch(BaseModel):
+    expenses: List[Any]
+
+
+_MAX_IMPORT_BYTES = 8 * 1024 * 1024
+
+
+@router.post("/expenses/batch")
+async def add_expenses_batch(batch: ExpenseBatch, username: str = "demo", return_rows: bool = False):
+    """Store up to ``MAX_BATCH_ROWS`` expenses, filed by the month of each row's date.
+
+    Invalid rows are reported in ``errors`` by index and the rest are stored.
+    """
+    if len(batch.expenses) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per batch")
+    result = await run_io(ingest_expenses, username, batch.expenses, None, return_rows)
+    return {"ok": True, **result}
+
+
+@router.post("/expenses/import")
+async def import_expenses(file: UploadFile, username: str = "demo", format: Optional[str] = None):
+    """Bulk import a CSV (``date,category,amount,note`` header) or JSON-lines file."""
+    fmt = (format or (file.filename or "").rsplit(".", 1)[-1]).lower()
+    fmt = "jsonl" if fmt == "ndjson" else fmt
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl")
+    data = await file.read(_MAX_IMPORT_BYTES + 1)
+    if len(data) > _MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    try:
+        rows = await run_io(parse_import, data, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per import")
+    result = await run_io(ingest_expenses, username, rows)
+    return {"ok": True, **result}
+
+
+@router.delete("/expenses/{expense_id}")
+async def delete_expense(expense_id: str, username: str = "demo", month: Optional[str] = None):
+    year_month = month or datetime.utcnow().strftime("%Y-%m")
+    if await get_async_storage().delete_expense(username, year_month, expense_id):
         return {"ok": True}
     raise HTTPException(status_code=404, detail="Not found")
 
@@ -53,52 +124,93 @@ async def delete_expense(index: int, username: str = "demo"):
 @router.get("/budget")
 async def get_budget(username: str = "demo"):
     year_month = datetime.utcnow().strftime("%Y-%m")
-    path = os.path.join(user_data_dir(username), f"budget_{year_month}.json")
-    data = read_json(path, {"items": []})
-    return data
+    return await get_async_storage().get_doc(username, f"budget_{year_month}", {"items": []})
+
+
+def _parse_range(start: Optional[str], end: Optional[str], max_months: int) -> Tuple[date, date]:
+    """Inclusive ``YYYY-MM-DD`` range; missing bounds default to the current month."""
+    today = datetime.utcnow().date()
+    try:
+        start_d = datetime.strptime(start, "%Y-%m-%d").date() if start else today.replace(day=1)
+        end_d = datetime.strptime(end, "%Y-%m-%d").date() if end else today
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be YYYY-MM-DD")
+    if end_d < start_d:
+        raise HTTPException(status_code=400, detail="end is before start")
+    if len(months_between(start_d, end_d)) > max_months:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {max_months} months")
+    return start_d, end_d
+
+
+_EXPORT_MEDIA_TYPES = {"csv": "text/csv", "pdf": "application/pdf"}
+_MAX_EXPORT_MONTHS = 120
 
 
 @router.get("/expenses/export")
-async def export_expenses(format: str = "csv", username: str = "demo"):
-    year_month = datetime.utcnow().strftime("%Y-%m")
-    path = os.path.join(user_data_dir(username), f"expenses_{year_month}.json")
-    data: List[dict] = read_json(path, [])
-    if format == "csv":
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=["date", "category", "amount", "note"])
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-        return Response(content=buf.getvalue(), media_type="text/csv")
-    elif format == "pdf":
-        buf = io.BytesIO()
-        pdf = canvas.Canvas(buf, pagesize=A4)
-        textobject = pdf.beginText(40, 800)
-        textobject.textLine(f"Expenses {year_month} for {username}")
-        textobject.textLine("")
-        for row in data[:200]:
-            line = f"{row.get('date')} | {row.get('category')} | {row.get('amount')} | {row.get('note','')}"
-            textobject.textLine(line)
-        pdf.drawText(textobject)
-        pdf.showPage()
-        pdf.save()
-        return Response(content=buf.getvalue(), media_type="application/pdf")
-    else:
+async def export_expenses(
+    format: str = "csv",
+    username: str = "demo",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    gzip: bool = False,
+):
+    if format not in _EXPORT_MEDIA_TYPES:
         raise HTTPException(status_code=400, detail="Unsupported format")
+    start_d, end_d = _parse_range(start, end, _MAX_EXPORT_MONTHS)
+    # A sync generator: Starlette pulls it from the threadpool, so storage
+    # reads and PDF encoding stay off the event loop.
+    body = iter_export(format, username, start_d, end_d)
+    filename = f"expenses_{username}_{start_d.isoformat()}_{end_d.isoformat()}.{format}"
+    media_type = _EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        body, filename, media_type = gzip_stream(body), filename + ".gz", "application/gzip"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/exports", status_code=202)
+async def create_export(
+    format: str = "csv",
+    username: str = "demo",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    gzip: bool = False,
+):
+    """Render an export in the background; poll the job, then download it."""
+    if format not in _EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    start_d, end_d = _parse_range(start, end, _MAX_EXPORT_MONTHS)
+    job = await run_io(get_export_jobs().enqueue, username, format, start_d, end_d, gzip)
+    return job_response(job)
+
+
+async def _get_user_job(job_id: str, username: str) -> Dict:
+    job = await run_io(get_job, job_id)
+    if not job or job.get("username") != username:
+        raise HTTPException(status_code=404, detail="Not found")
+    return job
+
+
+@router.get("/exports/{job_id}")
+async def export_status(job_id: str, username: str = "demo"):
+    return job_response(await _get_user_job(job_id, username))
+
+
+@router.get("/exports/{job_id}/download")
+async def export_download(job_id: str, username: str = "demo"):
+    job = await _get_user_job(job_id, username)
+    if job.get("status") != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job.get('status')}")
+    media_type = "application/gzip" if job.get("gzip") else _EXPORT_MEDIA_TYPES[job["format"]]
+    return FileResponse(artifact_path(job), media_type=media_type, filename=artifact_filename(job))
 
 
 @router.get("/expenses/summary")
 async def expenses_summary(username: str = "demo"):
     year_month = datetime.utcnow().strftime("%Y-%m")
-    path = os.path.join(user_data_dir(username), f"expenses_{year_month}.json")
-    data: List[dict] = read_json(path, [])
-    total = 0.0
-    by_cat: Dict[str, float] = defaultdict(float)
-    for row in data:
-        amt = float(row.get("amount", 0) or 0)
-        total += amt
-        by_cat[row.get("category", "Other")] += amt
-    return {"month": year_month, "total": total, "by_category": by_cat, "count": len(data)}
+    summary = await get_async_storage().month_summary(username, year_month)
+    return summary.as_response(year_month)
 
 
 @router.get("/expenses/compare-month")
@@ -107,21 +219,44 @@ async def compare_month(username: str = "demo"):
     curr_key = now.strftime("%Y-%m")
     prev_month = (now.replace(day=1) - timedelta(days=1))
     prev_key = prev_month.strftime("%Y-%m")
-    curr_path = os.path.join(user_data_dir(username), f"expenses_{curr_key}.json")
-    prev_path = os.path.join(user_data_dir(username), f"expenses_{prev_key}.json")
-    curr = read_json(curr_path, [])
-    prev = read_json(prev_path, [])
-    def total(items):
-        return float(sum(float(x.get("amount", 0) or 0) for x in items))
-    curr_total = total(curr)
-    prev_total = total(prev)
-    delta = curr_total - prev_total
-    pct = (delta / prev_total * 100) if prev_total else None
-    return {"current": {"month": curr_key, "total": curr_total, "count": len(curr)},
-            "previous": {"month": prev_key, "total": prev_total, "count": len(prev)},
+    curr = await get_async_storage().month_summary(username, curr_key)
+    prev = await get_async_storage().month_summary(username, prev_key)
+    delta = curr.total - prev.total
+    pct = (delta / prev.total * 100) if prev.total else None
+    return {"current": {"month": curr_key, "total": curr.total, "count": curr.count},
+            "previous": {"month": prev_key, "total": prev.total, "count": prev.count},
             "delta": delta, "percent": pct}
 
 
+# Ranges beyond the current and previous month are a paid feature.
+_MULTI_MONTH_FEATURES = {"multi_month_compare", "advanced_analytics"}
+_MAX_ANALYTICS_MONTHS = 36
+# Results are keyed by the storage versions of the months, so they never go
+# stale; the TTL only bounds memory.
+_ANALYTICS_TTL = 3600
+
+
+@cached(ttl_seconds=_ANALYTICS_TTL, prefix="analytics:result")
+async def _analyze(username: str, start: date, end: date, group_by: str, window: int, version: str) -> Dict:
+    return await run_io(get_analytics_service().analyze, username, start, end, group_by, window)
+
+
+@router.get("/analytics")
+async def analytics(start: str, end: str, group_by: str = "month", window: int = 3, username: str = "demo"):
+    start_d, end_d = _parse_range(start, end, _MAX_ANALYTICS_MONTHS)
+    if group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY)}")
+    if window < 1:
+        raise HTTPException(status_code=400, detail="window must be positive")
+    if len(months_between(start_d, end_d)) > 2:
+        user = await get_async_storage().get_user(username) or {}
+        features = set(get_plan_limits(user.get("plan", "free")).get("features", ()))
+        if not features & _MULTI_MONTH_FEATURES:
+            raise HTTPException(status_code=403, detail="Multi-month analytics requires a Pro Plus plan")
+    version = await run_io(get_analytics_service().version, username, start_d, end_d)
+    return await _analyze(username, start_d, end_d, group_by, window, version)
+
+
 class ReceiptOCRRequest(BaseModel):
     image_base64: Optional[str] = None
 
@@ -141,27 +276,23 @@ class Goal(BaseModel):
 
 @router.get("/goals")
 async def list_goals(username: str = "demo"):
-    path = os.path.join(user_data_dir(username), "goals.json")
-    return read_json(path, {"items": []})
+    return await get_async_storage().get_doc(username, "goals", {"items": []})
 
 
 @router.post("/goals")
 async def add_goal(goal: Goal, username: str = "demo"):
-    path = os.path.join(user_data_dir(username), "goals.json")
-    data = read_json(path, {"items": []})
-    data["items"].append(goal.dict())
-    write_json(path, data)
+    await get_async_storage().update_doc(username, "goals", {"items": []}, lambda data: data["items"].append(goal.dict()))
     return {"ok": True}
 
 
 @router.post("/goals/{index}/progress")
 async def update_goal_progress(index: int, amount: float, username: str = "demo"):
-    path = os.path.join(user_data_dir(username), "goals.json")
-    data = read_json(path, {"items": []})
-    if index < 0 or index >= len(data.get("items", [])):
-        raise HTTPException(status_code=404, detail="Goal not found")
-    data["items"][index]["saved_amount"] = float(data["items"][index].get("saved_amount", 0)) + float(amount)
-    write_json(path, data)
+    def apply(data: Dict) -> None:
+        if index < 0 or index >= len(data.get("items", [])):
+            raise HTTPException(status_code=404, detail="Goal not found")
+        data["items"][index]["saved_amount"] = float(data["items"][index].get("saved_amount", 0)) + float(amount)
+
+    await get_async_storage().update_doc(username, "goals", {"items": []}, apply)
     return {"ok": True}
 
 
@@ -171,31 +302,34 @@ class CategoryIn(BaseModel):
 
 @router.get("/categories")
 async def list_categories(username: str = "demo"):
-    path = os.path.join(user_data_dir(username), "categories.json")
-    data = read_json(path, {"items": []})
-    return data
+    return await get_async_storage().get_doc(username, "categories", {"items": []})
 
 
 @router.post("/categories")
 async def add_category(cat: CategoryIn, username: str = "demo"):
-    path = os.path.join(user_data_dir(username), "categories.json")
-    data = read_json(path, {"items": []})
-    items = data.get("items", [])
-    if any(i.get("name") == cat.name for i in items):
+    exists = False
+
+    def apply(data: Dict) -> None:
+        nonlocal exists
+        items = data.get("items", [])
+        if any(i.get("name") == cat.name for i in items):
+            exists = True
+            return
+        items.append({"name": cat.name})
+        data["items"] = items
+
+    await get_async_storage().update_doc(username, "categories", {"items": []}, apply)
+    if exists:
         return {"ok": False, "message": "exists"}
-    items.append({"name": cat.name})
-    data["items"] = items
-    write_json(path, data)
     return {"ok": True}
 
 
 @router.delete("/categories/{name}")
 async def delete_category(name: str, username: str = "demo"):
-    path = os.path.join(user_data_dir(username), "categories.json")
-    data = read_json(path, {"items": []})
-    items = [i for i in data.get("items", []) if i.get("name") != name]
-    data["items"] = items
-    write_json(path, data)
+    def apply(data: Dict) -> None:
+        data["items"] = [i for i in data.get("items", []) if i.get("name") != name]
+
+    await get_async_storage().update_doc(username, "categories", {"items": []}, apply)
     return {"ok": True}
 
 
@@ -212,27 +346,21 @@ class BudgetPayload(BaseModel):
 @router.post("/budget")
 async def save_budget(payload: BudgetPayload, username: str = "demo"):
     year_month = datetime.utcnow().strftime("%Y-%m")
-    dir_path = user_data_dir(username)
-    path = os.path.join(dir_path, f"budget_{year_month}.json")
-    history_path = os.path.join(dir_path, f"budget_{year_month}_history.json")
-    current = read_json(path, {"items": []})
-    history = read_json(history_path, [])
+    store = get_async_storage()
+    current = await store.get_doc(username, f"budget_{year_month}", {"items": []})
     # append current to history with timestamp
-    history.append({
+    await store.update_doc(username, f"budget_{year_month}_history", [], lambda history: history.append({
         "ts": datetime.utcnow().isoformat(),
         "data": current,
         "note": payload.version_note or ""
-    })
-    write_json(history_path, history)
-    write_json(path, {"items": [i.dict() for i in payload.items]})
+    }))
+    await store.put_doc(username, f"budget_{year_month}", {"items": [i.dict() for i in payload.items]})
     return {"ok": True}
 
 
 @router.get("/budget/history")
 async def get_budget_history(username: str = "demo"):
     year_month = datetime.utcnow().strftime("%Y-%m")
-    history_path = os.path.join(user_data_dir(username), f"budget_{year_month}_history.json")
-    history = read_json(history_path, [])
-    return history
+    return await get_async_storage().get_doc(username, f"budget_{year_month}_history", [])
 
 
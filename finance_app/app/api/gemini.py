@@ -1,20 +1,25 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
-from .utils import read_json, write_json, users_path
+from .utils import run_io
+from ..storage import get_async_storage
 from .ai_limit import (
+    AI_QUOTAS,
+    VOICE_QUOTAS,
     get_plan_limits,
-    should_reset_month,
     log_ai_call,
-    log_reset,
-    ensure_usage_fields,
-    reset_month_if_needed,
-    reset_day_if_needed,
-    check_ai_quota,
+    quota_rules,
+    quota_message,
+    consume_quota,
+    refund_quota,
+    check_quota,
 )
 from typing import Optional
 from datetime import datetime
 from ..services.ai_service import AIService
+from ..services.chat_parser import get_chat_parser
+from ..services.expense_ingest import ingest_expenses
+from ..services.plan_cache import get_plan_cache
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -28,32 +33,26 @@ class PlanRequest(BaseModel):
 async def generate_plan(req: PlanRequest):
     # Simplified: assume single demo user for now
     username = "demo"
-    users = read_json(users_path(), [])
-    user = next((u for u in users if u.get("username") == username), None)
-    if not user:
-        user = {"username": username, "plan": "free", "plan_usage": {"ai_month": 0, "ai_day": 0}, "last_reset_month": None}
-        users.append(user)
+    user = await get_async_storage().get_user(username) or {"username": username, "plan": "free"}
 
-    ensure_usage_fields(user)
-    reset_month_if_needed(user, username)
-    reset_day_if_needed(user, username)
-
-    limits = get_plan_limits(user.get("plan", "free"))
-    quota_error = check_ai_quota(user, limits)
-    if quota_error:
-        raise HTTPException(status_code=429, detail=quota_error)
+    # Reserve the quota up front so concurrent requests cannot overshoot it
+    quota = await consume_quota(username, quota_rules(get_plan_limits(user.get("plan", "free")), AI_QUOTAS))
+    if not quota.allowed:
+        raise HTTPException(status_code=429, detail=quota_message(quota.exceeded))
 
+    service = AIService()
     try:
-        service = AIService()
-        mock_plan = service.generate_plan(req.income, req.goals)
+        mock_plan, source = await get_plan_cache().get_or_generate(
+            service.model_name, req.income, req.goals, lambda: service.generate_plan(req.income, req.goals)
+        )
     except Exception as e:
-        log_ai_call({"username": username, "type": "generate_plan", "ts": datetime.utcnow().isoformat(), "status": "error", "error": str(e)})
+        await refund_quota(quota)
+        await log_ai_call({"username": username, "type": "generate_plan", "ts": datetime.utcnow().isoformat(), "status": "error", "error": str(e)})
         raise HTTPException(status_code=502, detail="AI service temporarily unavailable")
-    # increment usage and log
-    user["plan_usage"]["ai_month"] = user["plan_usage"].get("ai_month", 0) + 1
-    user["plan_usage"]["ai_day"] = user["plan_usage"].get("ai_day", 0) + 1
-    write_json(users_path(), users)
-    log_ai_call({"username": username, "type": "generate_plan", "ts": datetime.utcnow().isoformat(), "status": "ok"})
+    # Only the request that reached Gemini is charged; cached and coalesced plans are free
+    if source != "upstream":
+        await refund_quota(quota)
+    await log_ai_call({"username": username, "type": "generate_plan", "ts": datetime.utcnow().isoformat(), "status": "ok", "source": source})
     return {"ok": True, "plan": mock_plan}
 
 
@@ -65,103 +64,67 @@ class VoiceInputRequest(BaseModel):
 async def voice_input(_: VoiceInputRequest):
     # Quota check for voice
     username = "demo"
-    users = read_json(users_path(), [])
-    user = next((u for u in users if u.get("username") == username), None)
-    if not user:
-        user = {"username": username, "plan": "free", "plan_usage": {"ai_month": 0, "ai_day": 0, "voice_month": 0}, "last_reset_month": None}
-        users.append(user)
-    ensure_usage_fields(user)
-    reset_month_if_needed(user, username)
+    user = await get_async_storage().get_user(username) or {"username": username, "plan": "free"}
     limits = get_plan_limits(user.get("plan", "free"))
     # Free/Pro Basic -> voice not allowed
-    voice_limit = limits.get("voice_monthly", 0)
-    if voice_limit == 0:
+    if limits.get("voice_monthly", 0) == 0:
         raise HTTPException(status_code=403, detail="Voice input not available for your plan")
-    if voice_limit > 0 and user["plan_usage"]["voice_month"] >= voice_limit:
-        raise HTTPException(status_code=429, detail="Voice monthly quota exceeded")
+    quota = await consume_quota(username, quota_rules(limits, VOICE_QUOTAS))
+    if not quota.allowed:
+        raise HTTPException(status_code=429, detail=quota_message(quota.exceeded))
     # Stub transcription
-    user["plan_usage"]["voice_month"] += 1
-    write_json(users_path(), users)
     return {"ok": True, "text": "ăn cơm 30k"}
 
 
 class ChatRequest(BaseModel):
     text: str
+    lang: str = "vi"
+
+
+class ChatBatchRequest(BaseModel):
+    texts: List[str]
+    lang: str = "vi"
 
 
 @router.post("/chat")
 async def chat_parse(req: ChatRequest, username: str = "demo"):
     # Check AI quota first
-    if not check_ai_quota(username):
+    store = get_async_storage()
+    user = await store.get_user(username)
+    if user and await check_quota(username, quota_rules(get_plan_limits(user.get("plan", "free")), AI_QUOTAS)):
         return {"ok": False, "message": "Đã hết quota AI cho tháng này. Vui lòng nâng cấp để tiếp tục sử dụng."}
-    
-    # Enhanced parser: split by commas, extract trailing numbers as amounts
-    items = []
-    for part in req.text.split(','):
-        seg = part.strip()
-        if not seg:
-            continue
-        tokens = seg.split()
-        amount = None
-        category = "Khác"
-        
-        # Determine category based on keywords
-        seg_lower = seg.lower()
-        if any(word in seg_lower for word in ['ăn', 'cơm', 'trà', 'nước', 'cafe', 'bánh']):
-            category = "Ăn uống"
-        elif any(word in seg_lower for word in ['mua', 'áo', 'quần', 'giày', 'túi']):
-            category = "Mua sắm"
-        elif any(word in seg_lower for word in ['xăng', 'đổ', 'xe', 'taxi', 'grab']):
-            category = "Di chuyển"
-        elif any(word in seg_lower for word in ['phim', 'game', 'giải trí', 'karaoke']):
-            category = "Giải trí"
-        elif any(word in seg_lower for word in ['thuốc', 'bệnh viện', 'y tế', 'khám']):
-            category = "Y tế"
-        elif any(word in seg_lower for word in ['học', 'sách', 'khóa học', 'trường']):
-            category = "Học tập"
-        
-        for t in reversed(tokens):
-            t_clean = t.lower().replace('k', '000').replace('.', '').replace(',', '')
-            if t_clean.isdigit():
-                amount = float(t_clean)
-                break
-        label = seg
-        items.append({"label": label, "amount": amount, "category": category})
-    
-    # Save parsed chat as expenses
-    from .finance import add_expense, Expense  # local import to avoid cycle at module load
-    saved = []
-    for it in items:
-        if it.get("amount"):
-            exp = Expense(
-                date=datetime.utcnow().strftime("%Y-%m-%d"), 
-                category=it["category"], 
-                amount=it["amount"], 
-                note=it["label"]
-            ) 
-            await add_expense(exp, username)
-            saved.append(exp.dict())
+
+    items = get_chat_parser(req.lang).parse(req.text)
+
+    # Save all parsed items in one write
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    rows = [{"date": today, "category": it["category"], "amount": it["amount"], "note": it["label"]} for it in items if it.get("amount")]
+    saved = (await run_io(ingest_expenses, username, rows, None, True))["expenses"] if rows else []
     
     # Log AI call
-    log_ai_call(username, "chat_parse")
+    await log_ai_call({"username": username, "type": "chat_parse", "ts": datetime.utcnow().isoformat(), "status": "ok"})
     
     # Save to chat history
-    history_path = os.path.join(user_data_dir(username), "chat_history.json")
-    history = read_json(history_path, [])
-    history.append({
+    await store.update_doc(username, "chat_history", [], lambda history: history.append({
         "timestamp": datetime.utcnow().isoformat(),
         "input": req.text,
         "expenses": saved
-    })
-    write_json(history_path, history)
+    }))
     
     return {"ok": True, "expenses": saved}
 
 
+@router.post("/chat/parse")
+async def chat_parse_batch(req: ChatBatchRequest):
+    """Parse many chat messages without saving them; one item list per message."""
+    if len(req.texts) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 messages per request")
+    return {"ok": True, "results": get_chat_parser(req.lang).parse_many(req.texts)}
+
+
 @router.get("/chat/history")
 async def get_chat_history(username: str = "demo"):
-    history_path = os.path.join(user_data_dir(username), "chat_history.json")
-    history = read_json(history_path, [])
+    history = await get_async_storage().get_doc(username, "chat_history", [])
     return history[-20:]  # Return last 20 entries
 
 
@@ -1,31 +1,27 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import os
-from .utils import read_json, write_json
+from .utils import run_io
+from ..services.notification_dispatcher import enqueue
 
 router = APIRouter(prefix="/notify", tags=["notify"])
 
 
-def _queue_path() -> str:
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "notifications_queue.json")
-
-
 class NotifyRequest(BaseModel):
     kind: str  # email|in_app
     to: Optional[EmailStr] = None
+    username: Optional[str] = None  # in_app recipient
+    subject: Optional[str] = None
     message: str
 
 
 @router.post("/enqueue")
 async def enqueue_notify(req: NotifyRequest):
-    q = read_json(_queue_path(), [])
-    q.append(req.dict())
-    write_json(_queue_path(), q)
-    return {"ok": True, "queued": True}
-
-
-
-
-
-
+    if req.kind not in ("email", "in_app"):
+        raise HTTPException(status_code=400, detail="kind must be email or in_app")
+    if req.kind == "email" and not req.to:
+        raise HTTPException(status_code=400, detail="Email notifications need 'to'")
+    if req.kind == "in_app" and not req.username:
+        raise HTTPException(status_code=400, detail="In-app notifications need 'username'")
+    msg_id = await run_io(enqueue, req.kind, req.dict(exclude={"kind"}, exclude_none=True))
+    return {"ok": True, "queued": True, "id": msg_id}
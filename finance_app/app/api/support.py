@@ -1,16 +1,11 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import Optional
-import os
-from .utils import read_json, write_json
+from ..storage import get_async_storage
 
 router = APIRouter(prefix="/support", tags=["support"])
 
 
-def _tickets_path() -> str:
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "support_tickets.json")
-
-
 class Ticket(BaseModel):
     subject: str
     message: str
@@ -19,14 +14,12 @@ class Ticket(BaseModel):
 
 @router.get("/tickets")
 async def list_tickets():
-    return {"items": read_json(_tickets_path(), [])}
+    return {"items": await get_async_storage().list_tickets()}
 
 
 @router.post("/tickets")
 async def create_ticket(t: Ticket):
-    items = read_json(_tickets_path(), [])
-    items.append({"subject": t.subject, "message": t.message, "priority": t.priority, "status": "open"})
-    write_json(_tickets_path(), items)
+    await get_async_storage().add_ticket({"subject": t.subject, "message": t.message, "priority": t.priority, "status": "open"})
     return {"ok": True}
 
 
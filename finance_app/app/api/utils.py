@@ -1,49 +1,155 @@
 import json
 import os
-from threading import Lock
-from typing import Any, Dict, List
-
-_io_lock = Lock()
+import weakref
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+
+class RWLock:
+    """Many concurrent readers or one writer; writers are not starved by new readers."""
+
+    def __init__(self) -> None:
+        self._cond = Condition(Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+# One lock per file; entries disappear once no caller holds them.
+_path_locks: "weakref.WeakValueDictionary[str, RWLock]" = weakref.WeakValueDictionary()
+_path_locks_guard = Lock()
+
+
+def path_lock(path: str) -> RWLock:
+    key = os.path.abspath(path)
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = RWLock()
+            _path_locks[key] = lock
+        return lock
 
 
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def read_json(path: str, default: Any) -> Any:
-    ensure_dir(os.path.dirname(path))
+def file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def load_json(path: str, default: Any) -> Any:
+    """Unlocked read; the caller must hold ``path_lock(path)``."""
     if not os.path.exists(path):
         return default
-    with _io_lock:
-        with open(path, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return default
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return default
+
+
+def dump_json(path: str, data: Any) -> None:
+    """Unlocked atomic replace; the caller must hold ``path_lock(path).write()``."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_json(path: str, default: Any) -> Any:
+    ensure_dir(os.path.dirname(path))
+    with path_lock(path).read():
+        return load_json(path, default)
 
 
 def write_json(path: str, data: Any) -> None:
     ensure_dir(os.path.dirname(path))
-    tmp_path = path + ".tmp"
-    with _io_lock:
-        with open(tmp_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, path)
+    with path_lock(path).write():
+        dump_json(path, data)
 
 
-def users_path() -> str:
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "users.json")
+def update_json(path: str, default: Any, fn: Callable[[Any], Any]) -> Any:
+    """Read-modify-write under the file's write lock.
 
+    ``fn`` receives the current document and returns the document to store;
+    returning None keeps the mutated argument. The stored document is returned.
+    """
+    ensure_dir(os.path.dirname(path))
+    with path_lock(path).write():
+        data = load_json(path, default)
+        result = fn(data)
+        if result is not None:
+            data = result
+        dump_json(path, data)
+        return data
 
-def user_data_dir(username: str) -> str:
-    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "user_data", username)
 
+async def run_io(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run blocking file or database work in the threadpool, off the event loop."""
+    return await run_in_threadpool(fn, *args, **kwargs)
+
+
+async def read_json_async(path: str, default: Any) -> Any:
+    return await run_io(read_json, path, default)
+
+
+async def write_json_async(path: str, data: Any) -> None:
+    await run_io(write_json, path, data)
 
-def month_key(year: int, month: int) -> str:
-    return f"{year:04d}-{month:02d}"
 
+async def update_json_async(path: str, default: Any, fn: Callable[[Any], Any]) -> Any:
+    return await run_io(update_json, path, default, fn)
 
 
+def data_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 
+def users_path() -> str:
+    return os.path.join(data_dir(), "users.json")
+
+
+def user_data_dir(username: str) -> str:
+    return os.path.join(data_dir(), "user_data", username)
 
+
+def month_key(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
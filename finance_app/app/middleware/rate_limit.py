@@ -1,29 +1,82 @@
-from time import time
-from typing import Dict, List
-from fastapi import Request, HTTPException, status
+from typing import List, Optional, Tuple
 
-# Simple in-memory limiter (replace with Redis in production)
-_ip_bucket: Dict[str, List[float]] = {}
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
 
+from ..api.ai_limit import get_plan_limits
+from ..api.utils import run_io
+from ..services.config_registry import get_config
+from ..services.rate_limiter import RateDecision, get_rate_limiter
 
-def _prune_timestamps(timestamps: List[float], window_seconds: int) -> List[float]:
-    threshold = time() - window_seconds
-    return [t for t in timestamps if t >= threshold]
+# Limits come from config/rate_limits.json (anonymous and per-route) and
+# account_types.json (``rate_limit_per_minute`` per plan). As with the
+# quotas in account_types.json, a negative limit means unlimited and 0
+# blocks the route (or the plan) entirely.
+WINDOW_SECONDS = 60
+
+
+def _identity(request: Request) -> Tuple[str, Optional[str]]:
+    """(bucket key, plan): signed-in users by username, everyone else by IP."""
+    user = request.session.get("user") if "session" in request.scope else None
+    if user and user.get("username"):
+        return f"user:{user['username']}", user.get("plan", "free")
+    return f"ip:{request.client.host if request.client else 'unknown'}", None
+
+
+def _checks(request: Request, cfg: dict, plan: Optional[str], default_limit: int) -> List[Tuple[str, int]]:
+    if plan is None:
+        limit = int(cfg.get("anonymous_per_minute", default_limit))
+    else:
+        limit = int(get_plan_limits(plan).get("rate_limit_per_minute", cfg.get("anonymous_per_minute", default_limit)))
+    checks = [("all", limit)]
+    path, method = request.url.path, request.method
+    for rule in cfg.get("routes", ()):
+        methods = rule.get("methods")
+        if path.startswith(rule.get("prefix", "")) and (not methods or method in methods):
+            checks.append((rule.get("name") or rule["prefix"], int(rule.get("per_minute", -1))))
+    return [(name, n) for name, n in checks if n >= 0]
+
+
+def _too_many(decision: RateDecision) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Rate limit exceeded"},
+        headers={
+            "Retry-After": str(decision.retry_after),
+            "X-RateLimit-Limit": str(decision.limit),
+            "X-RateLimit-Remaining": "0",
+        },
+    )
 
 
 def rate_limit_middleware(max_requests_per_minute: int = 100):
-    window = 60
+    """Sliding-window limits per user (by plan) or per IP, plus per-route caps.
+
+    Register it before ``SessionMiddleware`` so it runs inside it and can
+    see the signed-in user.
+    """
 
     async def _middleware(request: Request, call_next):
-        client_ip = request.client.host if request.client else "unknown"
-        timestamps = _ip_bucket.get(client_ip, [])
-        timestamps = _prune_timestamps(timestamps, window)
-        if len(timestamps) >= max_requests_per_minute:
-            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded")
-        timestamps.append(time())
-        _ip_bucket[client_ip] = timestamps
-        return await call_next(request)
+        cfg = get_config("rate_limits", {})
+        path = request.url.path
+        if any(path.startswith(prefix) for prefix in cfg.get("exempt_prefixes", ())):
+            return await call_next(request)
 
-    return _middleware
+        key, plan = _identity(request)
+        limiter = get_rate_limiter()
+        checks = [(f"{name}:{key}", limit) for name, limit in _checks(request, cfg, plan, max_requests_per_minute)]
+        if limiter.blocking:
+            decisions = await run_io(limiter.hit_many, checks, WINDOW_SECONDS)
+        else:
+            decisions = limiter.hit_many(checks, WINDOW_SECONDS)
+        if decisions and not decisions[-1].allowed:
+            return _too_many(decisions[-1])
+        overall: Optional[RateDecision] = decisions[0] if decisions else None
 
+        response = await call_next(request)
+        if overall is not None:
+            response.headers["X-RateLimit-Limit"] = str(overall.limit)
+            response.headers["X-RateLimit-Remaining"] = str(overall.remaining)
+        return response
 
+    return _middleware
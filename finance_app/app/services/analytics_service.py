@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from ..storage import get_storage
+from .cache_service import CacheService, get_cache
+
+GROUP_BY = ("day", "week", "month", "category")
+_FREQ = {"day": "D", "week": "W-SUN", "month": "M"}  # W-SUN: weeks run Monday..Sunday
+_COLUMNS = ("date", "category", "amount")
+# Month columns are keyed by the storage version, so entries never go stale;
+# the TTL only bounds memory for inactive users.
+_MONTH_TTL = 6 * 3600
+
+
+def months_between(start: date, end: date) -> List[str]:
+    months = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+class AnalyticsService:
+    """Range rollups over a user's expenses using pandas.
+
+    Each month is loaded once into plain column lists (JSON-friendly, so the
+    Redis cache backend works too) and cached under the month's storage
+    version; a query concatenates the cached columns into one frame.
+    """
+
+    def __init__(self, storage: Any = None, cache: Optional[CacheService] = None) -> None:
+        self.storage = storage
+        self.cache = cache
+
+    def _month_columns(self, username: str, month: str) -> Dict[str, list]:
+        store = self.storage or get_storage()
+        cache = self.cache or get_cache()
+        key = f"analytics:month:{store.name}:{username}:{month}:{store.expenses_version(username, month)}"
+        cols = cache.get(key)
+        if cols is None:
+            rows = store.list_expenses(username, month)
+            cols = {c: [r.get(c) for r in rows] for c in _COLUMNS}
+            cache.set(key, cols, _MONTH_TTL)
+        return cols
+
+    def version(self, username: str, start: date, end: date) -> str:
+        """Changes whenever any month in the range does; results key on it."""
+        store = self.storage or get_storage()
+        return store.name + ":" + ",".join(store.expenses_version(username, m) for m in months_between(start, end))
+
+    def frame(self, username: str, start: date, end: date) -> Any:
+        import pandas as pd
+
+        parts = [self._month_columns(username, m) for m in months_between(start, end)]
+        df = pd.DataFrame({c: [v for p in parts for v in p[c]] for c in _COLUMNS})
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
+        df["category"] = df["category"].fillna("Other")
+        mask = (df["date"] >= pd.Timestamp(start)) & (df["date"] <= pd.Timestamp(end))
+        return df.loc[mask]
+
+    def analyze(self, username: str, start: date, end: date, group_by: str = "month", window: int = 3) -> Dict[str, Any]:
+        import numpy as np
+        import pandas as pd
+
+        df = self.frame(username, start, end)
+        result: Dict[str, Any] = {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "group_by": group_by,
+            "total": float(df["amount"].sum()),
+            "count": int(len(df)),
+        }
+
+        if group_by == "category":
+            grouped = df.groupby("category")["amount"].agg(["sum", "count", "mean"]).sort_values("sum", ascending=False)
+            total = result["total"] or 1.0
+            result["series"] = [
+                {"category": name, "total": float(row["sum"]), "count": int(row["count"]),
+                 "average": float(row["mean"]), "share": float(row["sum"] / total)}
+                for name, row in grouped.iterrows()
+            ]
+            return result
+
+        freq = _FREQ[group_by]
+        periods = pd.period_range(start, end, freq=freq)
+        grouped = df.groupby(df["date"].dt.to_period(freq))["amount"]
+        totals = grouped.sum().reindex(periods, fill_value=0.0)
+        counts = grouped.count().reindex(periods, fill_value=0)
+        moving = totals.rolling(window, min_periods=1).mean()
+
+        labels = periods.start_time.strftime("%Y-%m-%d")
+        result["series"] = [
+            {"period": label, "total": t, "count": n, "moving_avg": ma}
+            for label, t, n, ma in zip(labels, totals.astype(float).tolist(), counts.tolist(), moving.tolist())
+        ]
+        values = totals.to_numpy(dtype=float)
+        slope = float(np.polyfit(np.arange(len(values)), values, 1)[0]) if len(values) > 1 else 0.0
+        first, last = (values[0], values[-1]) if len(values) else (0.0, 0.0)
+        result["average"] = float(values.mean()) if len(values) else 0.0
+        result["trend"] = {
+            "slope": slope,
+            "direction": "up" if slope > 0 else "down" if slope < 0 else "flat",
+            "change_pct": float((last - first) / first * 100) if first else None,
+        }
+        return result
+
+
+_service: Optional[AnalyticsService] = None
+
+
+def get_analytics_service() -> AnalyticsService:
+    global _service
+    if _service is None:
+        _service = AnalyticsService()
+    return _service
@@ -0,0 +1,236 @@
+"""Fingerprinted, precompressed static assets.
+
+``AssetPipeline.build`` copies every file under the static directory to
+``{build_dir}/{name}.{hash}{ext}`` next to ``.br``/``.gz`` siblings, and
+writes ``manifest.json`` mapping source to fingerprinted names. Templates
+link assets with ``asset_url("css/main.css")``; ``AssetFiles`` serves
+fingerprinted names as immutable and negotiates the encoding.
+
+Build ahead of deploy (otherwise it runs at startup when sources changed)::
+
+    python -m finance_app.app.services.assets
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from ..api.utils import ensure_dir
+from .compression import negotiate, precompress
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE = {".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml"}
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    ensure_dir(os.path.dirname(path))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetPipeline:
+    """Builds and looks up fingerprinted copies of ``source_dir``.
+
+    Content-addressed names make concurrent builds from several workers
+    safe: they write identical files. With ``check_interval`` > 0 changed
+    sources are rebuilt on the next lookup after that many seconds.
+    """
+
+    def __init__(self, source_dir: str, build_dir: str, url_prefix: str = "/static", check_interval: float = 0.0) -> None:
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self.manifest: Dict[str, str] = {}
+        self.stamp: Optional[str] = None
+        self._entries: Dict[str, Tuple[Dict[str, Tuple[str, os.stat_result]], str, bool]] = {}
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.build_dir, "manifest.json")
+
+    def _sources(self) -> Dict[str, str]:
+        out = {}
+        for dirpath, _, files in os.walk(self.source_dir):
+            for name in files:
+                full = os.path.join(dirpath, name)
+                out[os.path.relpath(full, self.source_dir).replace(os.sep, "/")] = full
+        return out
+
+    def _source_stamp(self) -> str:
+        h = hashlib.sha256()
+        for rel, full in sorted(self._sources().items()):
+            st = os.stat(full)
+            h.update(f"{rel}:{st.st_mtime_ns}:{st.st_size};".encode())
+        return h.hexdigest()[:16]
+
+    def build(self) -> Dict[str, str]:
+        """Fingerprint and precompress every source file; returns the manifest.
+        Files from the previous build are kept so pages rendered just before
+        a deploy still resolve, older ones are removed."""
+        stamp = self._source_stamp()
+        previous = self._read_manifest()
+        manifest: Dict[str, str] = {}
+        for rel, full in sorted(self._sources().items()):
+            with open(full, "rb") as f:
+                data = f.read()
+            root, ext = os.path.splitext(rel)
+            built = f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            manifest[rel] = built
+            target = os.path.join(self.build_dir, built)
+            if os.path.exists(target):
+                continue
+            variants = precompress(data) if ext.lower() in COMPRESSIBLE else {"identity": data}
+            for encoding, body in variants.items():
+                if encoding != "identity":
+                    _write_atomic(target + SUFFIXES[encoding], body)
+            _write_atomic(target, data)
+        self._prune(set(manifest.values()) | set(previous.get("files", {}).values()))
+        _write_atomic(self.manifest_path, json.dumps({"stamp": stamp, "files": manifest}, indent=2).encode("utf-8"))
+        self._load({"stamp": stamp, "files": manifest})
+        return manifest
+
+    def _prune(self, keep: set) -> None:
+        keep_files = {b + s for b in keep for s in ("", *SUFFIXES.values())} | {"manifest.json"}
+        for dirpath, _, files in os.walk(self.build_dir):
+            for name in files:
+                rel = os.path.relpath(os.path.join(dirpath, name), self.build_dir).replace(os.sep, "/")
+                if rel not in keep_files and not name.endswith(".tmp"):  # another worker mid-write
+                    try:
+                        os.remove(os.path.join(dirpath, name))
+                    except FileNotFoundError:
+                        pass
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _load(self, data: Dict[str, Any]) -> None:
+        entries: Dict[str, Tuple[Dict[str, Tuple[str, os.stat_result]], str, bool]] = {}
+        for rel, built in data.get("files", {}).items():
+            target = os.path.join(self.build_dir, built)
+            files = {}
+            for encoding, suffix in (("identity", ""), *SUFFIXES.items()):
+                try:
+                    files[encoding] = (target + suffix, os.stat(target + suffix))
+                except FileNotFoundError:
+                    continue
+            if "identity" not in files:
+                continue
+            media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+            entries[built] = (files, media_type, True)
+            entries[rel] = (files, media_type, False)
+        with self._lock:
+            self.manifest = dict(data.get("files", {}))
+            self.stamp = data.get("stamp")
+            self._entries = entries
+
+    def ensure_built(self) -> None:
+        """Load the manifest, building first if it is missing or stale."""
+        data = self._read_manifest()
+        if data.get("stamp") != self._source_stamp():
+            self.build()
+        else:
+            self._load(data)
+
+    def _refresh(self) -> None:
+        if not self.check_interval or time.monotonic() - self._checked_at < self.check_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            self.ensure_built()
+        except OSError:
+            logger.exception("asset rebuild failed")
+
+    def version(self) -> Optional[str]:
+        """Changes whenever the manifest does; pages embedding asset URLs key on it."""
+        self._refresh()
+        return self.stamp
+
+    def url(self, name: str) -> str:
+        """``asset_url`` in templates: the fingerprinted URL of ``name``, or
+        its plain URL if it is not in the manifest."""
+        self._refresh()
+        return f"{self.url_prefix}/{self.manifest.get(name, name)}"
+
+    def lookup(self, path: str) -> Optional[Tuple[Dict[str, Tuple[str, os.stat_result]], str, bool]]:
+        """(variant files by encoding, media type, fingerprinted?) for a URL path."""
+        return self._entries.get(path.lstrip("/"))
+
+
+class AssetFiles(StaticFiles):
+    """``StaticFiles`` that serves built assets: the precompressed variant the
+    client accepts, immutable caching for fingerprinted names and
+    ``no-cache`` (revalidate by ETag) for plain ones."""
+
+    def __init__(self, pipeline: AssetPipeline) -> None:
+        super().__init__(directory=pipeline.source_dir)
+        self.pipeline = pipeline
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        entry = self.pipeline.lookup(path) if scope["method"] in ("GET", "HEAD") else None
+        if entry is None:
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("Cache-Control", "no-cache")
+            return response
+        files, media_type, fingerprinted = entry
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding"), files)
+        full_path, stat_result = files[encoding]
+        headers = {"Cache-Control": IMMUTABLE if fingerprinted else "no-cache"}
+        if len(files) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        response = FileResponse(full_path, headers=headers, media_type=media_type, stat_result=stat_result)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def create_asset_pipeline(source_dir: str) -> AssetPipeline:
+    default_build = os.path.join(os.path.dirname(os.path.abspath(source_dir)), "static_build")
+    return AssetPipeline(
+        source_dir,
+        os.getenv("ASSET_BUILD_DIR") or default_build,
+        check_interval=float(os.getenv("ASSET_CHECK_INTERVAL", "0")),
+    )
+
+
+def main() -> None:
+    default_source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets")
+    parser.add_argument("--source", default=default_source)
+    args = parser.parse_args()
+    pipeline = create_asset_pipeline(args.source)
+    manifest = pipeline.build()
+    for rel, built in manifest.items():
+        print(f"{rel} -> {built}")
+    print(f"manifest: {pipeline.manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,286 @@
-from typing import Optional
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..api.utils import run_io
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _approx_size(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = asdict(self)
+        lookups = self.hits + self.misses
+        out["hit_rate"] = round(self.hits / lookups, 4) if lookups else 0.0
+        return out
+
+
+class MemoryCacheBackend:
+    """Per-process LRU with monotonic TTLs, bounded by entry count and bytes."""
+
+    blocking = False
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expires_at or None, size)
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float], int]]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return default
+            value, expires_at, _ = item
+            if expires_at is not None and expires_at <= self._clock():
+                self._drop(key)
+                self.expirations += 1
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float]) -> None:
+        size = _approx_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            expires_at = self._clock() + ttl_seconds if ttl_seconds else None
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "bytes": self._bytes}
+
+
+class RedisCacheBackend:
+    """Shared cache across workers; values are stored as JSON under ``prefix``.
+
+    Any redis-py compatible client works, including ``InMemoryRedis``. Redis
+    errors are logged and treated as misses so a cache outage never fails a
+    request.
+    """
+
+    blocking = True  # network round trips; callers on the event loop use run_io
+
+    def __init__(self, client: Any, prefix: str = "cache:") -> None:
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception as exc:
+            logger.warning("cache get failed: %s", exc)
+            return default
+        if raw is None:
+            return default
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float]) -> None:
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        try:
+            if ttl_seconds:
+                self.client.set(self.prefix + key, data, px=int(ttl_seconds * 1000))
+            else:
+                self.client.set(self.prefix + key, data)
+        except Exception as exc:
+            logger.warning("cache set failed: %s", exc)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as exc:
+            logger.warning("cache delete failed: %s", exc)
+
+    def clear(self, batch: int = 500) -> None:
+        # SCAN rather than KEYS, which walks the whole keyspace in one blocking call
+        try:
+            keys = []
+            for key in self.client.scan_iter(match=self.prefix + "*", count=batch):
+                keys.append(key)
+                if len(keys) >= batch:
+                    self.client.delete(*keys)
+                    keys = []
+            if keys:
+                self.client.delete(*keys)
+        except Exception as exc:
+            logger.warning("cache clear failed: %s", exc)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": "redis", "prefix": self.prefix}
 
 
 class CacheService:
-    def __init__(self) -> None:
-        self._store: dict[str, tuple[bytes, int]] = {}
+    """Cache front-end with hit/miss accounting and an ``@cached`` decorator.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, backend: Any = None, default_ttl: float = 60) -> None:
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.default_ttl = default_ttl
+        self._stats = CacheStats()
+
+    @property
+    def blocking(self) -> bool:
+        return getattr(self.backend, "blocking", False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.backend.get(key, _MISSING)
+        if value is _MISSING:
+            self._stats.misses += 1
+            return default
+        self._stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self.backend.set(key, value, self.default_ttl if ttl_seconds is None else ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        self._stats.evictions = self.backend.evictions
+        self._stats.expirations = self.backend.expirations
+        out = self._stats.to_dict()
+        out.update(self.backend.info())
+        return out
+
+    def cached(
+        self,
+        ttl_seconds: Optional[float] = None,
+        key_fn: Optional[Callable[..., str]] = None,
+        prefix: Optional[str] = None,
+    ) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+        """Cache the result of an ``async def`` keyed by its arguments."""
+        return _cached(lambda: self, ttl_seconds, key_fn, prefix)
+
+
+def _cached(
+    resolve: Callable[[], CacheService],
+    ttl_seconds: Optional[float],
+    key_fn: Optional[Callable[..., str]],
+    prefix: Optional[str],
+) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    def decorator(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        name = prefix or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            cache = resolve()
+            suffix = key_fn(*args, **kwargs) if key_fn else repr((args, sorted(kwargs.items())))
+            key = f"{name}:{suffix}"
+            # Redis is network I/O: keep it off the event loop
+            if cache.blocking:
+                value = await run_io(cache.get, key, _MISSING)
+            else:
+                value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            value = await fn(*args, **kwargs)
+            if cache.blocking:
+                await run_io(cache.set, key, value, ttl_seconds)
+            else:
+                cache.set(key, value, ttl_seconds)
+            return value
+
+        wrapper.cache_key_prefix = name  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
 
-    def set(self, key: str, value: bytes, ttl_seconds: int = 60) -> None:
-        self._store[key] = (value, ttl_seconds)
 
-    def get(self, key: str) -> Optional[bytes]:
-        item = self._store.get(key)
-        if not item:
-            return None
-        return item[0]
+def cached(
+    ttl_seconds: Optional[float] = None,
+    key_fn: Optional[Callable[..., str]] = None,
+    prefix: Optional[str] = None,
+) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """``@cached`` on the shared cache; ``get_cache()`` is resolved per call,
+    so module-level functions can be decorated at import time."""
+    return _cached(lambda: get_cache(), ttl_seconds, key_fn, prefix)
 
 
+def create_cache(kind: Optional[str] = None) -> CacheService:
+    kind = (kind or os.getenv("CACHE_BACKEND") or ("redis" if os.getenv("REDIS_URL") else "memory")).lower()
+    if kind == "redis":
+        return CacheService(RedisCacheBackend(get_redis()))
+    return CacheService(
+        MemoryCacheBackend(
+            max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        )
+    )
 
 
+_cache: Optional[CacheService] = None
 
 
+def get_cache() -> CacheService:
+    global _cache
+    if _cache is None:
+        _cache = create_cache()
+    return _cache
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .config_registry import get_config
+
+# Multipliers for amount suffixes (matched against lower-cased text).
+AMOUNT_UNITS: Dict[str, float] = {
+    "k": 1e3, "nghìn": 1e3, "ngàn": 1e3, "ng": 1e3,
+    "tr": 1e6, "triệu": 1e6, "củ": 1e6, "m": 1e6,
+    "tỷ": 1e9, "tỉ": 1e9,
+    "đ": 1, "d": 1, "vnđ": 1, "vnd": 1, "đồng": 1,
+}
+
+# Thousands-grouped (30.000, 1,500,000) or plain/decimal (30, 1.5, 2,5) numbers,
+# an optional unit, and for k/tr-style units an optional trailing fraction
+# ("1tr5" is 1.5 million, "2k5" is 2500). Numbers glued to letters or part of
+# dates and times ("iphone15", "12/5", "7:30") are not amounts.
+_AMOUNT = re.compile(
+    r"(?<![\w.,/:-])"
+    r"(\d{1,3}(?:([.,])\d{3})(?:\2\d{3})*(?![.,]?\d)|\d+(?:[.,]\d+)?)"
+    r"\s?(" + "|".join(sorted(map(re.escape, AMOUNT_UNITS), key=len, reverse=True)) + r")?"
+    r"(\d{1,3})?"
+    r"(?![\w/:])"
+)
+
+
+def split_items(text: str) -> List[str]:
+    """Split on commas, semicolons and newlines; a comma between digits
+    belongs to a number ("2,5tr")."""
+    parts: List[str] = []
+    for part in text.replace(";", ",").replace("\n", ",").split(","):
+        if parts and part[:1].isdigit() and parts[-1][-1:].isdigit():
+            parts[-1] += "," + part
+        else:
+            parts.append(part)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _amount(lowered: str) -> Optional[float]:
+    for number, sep, unit, fraction in reversed(_AMOUNT.findall(lowered)):
+        if fraction and (not unit or AMOUNT_UNITS[unit] == 1 or sep or not number.isdigit()):
+            continue  # "30đ5" or "1.5k5" are not amounts
+        value = float(number.replace(sep, "")) if sep else float(number.replace(",", "."))
+        if fraction:
+            value += int(fraction) / 10 ** len(fraction)
+        return value * AMOUNT_UNITS[unit] if unit else value
+    return None
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """Last amount in ``text`` in đồng, or None."""
+    return _amount(text.lower())
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Alternation of ``words`` factored by common prefix, so matching at a
+    position follows one branch per character instead of trying every word."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # Optional tails are greedy, so the longest keyword at a position wins.
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+class ChatExpenseParser:
+    """Turns chat lines like "ăn phở 45k, đổ xăng 1tr2" into expense items.
+
+    All keywords are compiled into one prefix-factored regex, so each
+    segment is scanned once whatever the size of the table. When several
+    keywords match, the longest wins ("tiền nước" beats "nước") and ties go to
+    the category listed first in the table.
+    """
+
+    def __init__(self, keywords: Mapping[str, Sequence[str]], default_category: str = "Khác") -> None:
+        self.default_category = default_category
+        self._rank: Dict[str, Tuple[int, int, str]] = {}
+        for priority, (category, words) in enumerate(keywords.items()):
+            for word in words:
+                word = unicodedata.normalize("NFC", word.strip().lower())
+                if word and word not in self._rank:
+                    self._rank[word] = (-len(word), priority, category)
+        self._pattern = re.compile(r"(?<!\w)(?:" + _trie_pattern(self._rank) + r")(?!\w)") if self._rank else None
+
+    def _category(self, lowered: str) -> str:
+        found = self._pattern.findall(lowered) if self._pattern is not None else ()
+        if not found:
+            return self.default_category
+        if len(found) == 1:
+            return self._rank[found[0]][2]
+        return min(map(self._rank.__getitem__, found))[2]
+
+    def categorize(self, text: str) -> str:
+        return self._category(unicodedata.normalize("NFC", text).lower())
+
+    def parse(self, text: str) -> List[Dict[str, Any]]:
+        if not unicodedata.is_normalized("NFC", text):
+            text = unicodedata.normalize("NFC", text)
+        items = []
+        for seg in split_items(text):
+            lowered = seg.lower()
+            items.append({"label": seg, "amount": _amount(lowered), "category": self._category(lowered)})
+        return items
+
+    def parse_many(self, texts: Iterable[str]) -> List[List[Dict[str, Any]]]:
+        return [self.parse(text) for text in texts]
+
+
+_parsers: Dict[str, Tuple[Any, ChatExpenseParser]] = {}
+
+
+def get_chat_parser(lang: str = "vi") -> ChatExpenseParser:
+    """Parser for ``config/lang/{lang}.json``, recompiled only when the file changes."""
+    if not re.fullmatch(r"[a-z]{2}", lang):
+        lang = "vi"
+    cfg = get_config(f"lang/{lang}", {})
+    cached = _parsers.get(lang)
+    if cached is None or cached[0] is not cfg:
+        parser = ChatExpenseParser(cfg.get("expense_keywords", {}), cfg.get("expense_default_category", "Khác"))
+        cached = _parsers[lang] = (cfg, parser)
+    return cached[1]
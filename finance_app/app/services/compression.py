@@ -0,0 +1,55 @@
+"""Precompressed response variants and ``Accept-Encoding`` negotiation.
+
+Brotli is used when the optional ``brotli`` package is installed; gzip
+is always available.
+"""
+from __future__ import annotations
+
+import gzip
+from typing import Dict, Optional
+
+MIN_SIZE = 512  # smaller bodies are served as-is
+
+
+def _brotli() -> Optional[object]:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def precompress(data: bytes, min_size: int = MIN_SIZE, gzip_level: int = 9, brotli_quality: Optional[int] = 11) -> Dict[str, bytes]:
+    """``{"identity": data, "br": ..., "gzip": ...}``, keeping only encodings
+    that are actually smaller. The defaults compress hardest, for bodies
+    built once and served many times; ``brotli_quality=None`` skips brotli."""
+    variants = {"identity": data}
+    if len(data) < min_size:
+        return variants
+    brotli = _brotli() if brotli_quality is not None else None
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=brotli_quality)  # type: ignore[attr-defined]
+    variants["gzip"] = gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    return {k: v for k, v in variants.items() if k == "identity" or len(v) < len(data)}
+
+
+def negotiate(accept_encoding: Optional[str], available) -> str:
+    """Best of ``available`` for the request's ``Accept-Encoding``: br, then
+    gzip, then identity; ``q=0`` excludes an encoding."""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
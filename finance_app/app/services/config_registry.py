@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..api.utils import read_json, update_json, write_json
+
+
+class FrozenDict(dict):
+    """A dict that refuses mutation; still JSON-serialisable as a plain dict."""
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError("config snapshots are read-only; use thaw() for a mutable copy")
+
+    __setitem__ = __delitem__ = _readonly  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _readonly  # type: ignore[assignment]
+
+    def __hash__(self) -> int:  # type: ignore[override]
+        return id(self)
+
+
+def freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+@dataclass
+class _Entry:
+    value: Any
+    stamp: Optional[Tuple[int, int]]
+    checked_at: float
+
+
+class ConfigRegistry:
+    """Parsed, immutable snapshots of the JSON files under ``config/``.
+
+    Names are paths relative to the config directory without ``.json``
+    (``account_types``, ``lang/vi``). A file is stat()-ed at most once every
+    ``check_interval`` seconds and re-parsed only when its mtime or size
+    changed, so steady-state reads are a dict lookup.
+    """
+
+    def __init__(
+        self,
+        config_dir: str,
+        check_interval: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.config_dir = config_dir
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.config_dir, f"{name}.json")
+
+    def _stat(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path(name))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        now = self._clock()
+        entry = self._entries.get(name)
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            return entry.value
+        with self._lock:
+            entry = self._entries.get(name)
+            stamp = self._stat(name)
+            if entry is not None and entry.stamp == stamp:
+                entry.checked_at = now
+                return entry.value
+            value = freeze(read_json(self.path(name), default))
+            self._entries[name] = _Entry(value, stamp, now)
+            return value
+
+    def write(self, name: str, data: Any) -> Any:
+        write_json(self.path(name), data)
+        return self._store(name, data)
+
+    def update(self, name: str, default: Any, fn: Callable[[Any], Any]) -> Any:
+        """Atomic read-modify-write on a mutable copy (see ``utils.update_json``)."""
+        return self._store(name, update_json(self.path(name), default, fn))
+
+    def _store(self, name: str, data: Any) -> Any:
+        value = freeze(data)
+        with self._lock:
+            self._entries[name] = _Entry(value, self._stat(name), self._clock())
+        return value
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+def config_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config")
+
+
+_registry: Optional[ConfigRegistry] = None
+
+
+def get_config_registry() -> ConfigRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ConfigRegistry(config_dir(), check_interval=float(os.getenv("CONFIG_RELOAD_INTERVAL", "2")))
+    return _registry
+
+
+def get_config(name: str, default: Any = None) -> Any:
+    return get_config_registry().get(name, default)
@@ -1,10 +1,7 @@
-class EmailService:
-    def send(self, to_email: str, subject: str, body: str) -> None:
-        # TODO: integrate real email provider or SMTP
-        print(f"[EMAIL] to={to_email} subject={subject}")
-
-
-
-
+from .notification_dispatcher import enqueue
 
 
+class EmailService:
+    def send(self, to_email: str, subject: str, body: str) -> str:
+        """Queue the email for the notification dispatcher; returns its id."""
+        return enqueue("email", {"to": to_email, "subject": subject, "message": body})
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..api.utils import run_io
+from ..storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedEventWriter:
+    """Batches log entries in memory and writes them with ``append_logs``.
+
+    ``emit`` only queues the entry; a background task on the running loop
+    writes everything pending once ``max_batch`` entries are queued or
+    ``flush_interval`` seconds have passed, so a burst of AI calls costs one
+    append per log instead of one per call. The task exits when nothing is
+    pending. Without a running loop (scripts, threadpool code) entries are
+    written synchronously. Entries that fail to write are re-queued.
+    """
+
+    def __init__(self, max_batch: int = 256, flush_interval: float = 1.0) -> None:
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._size = 0
+        self._mutex = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def emit(self, name: str, entry: Dict[str, Any]) -> None:
+        self.emit_many(name, [entry])
+
+    def emit_many(self, name: str, entries: Iterable[Dict[str, Any]]) -> None:
+        entries = list(entries)
+        if not entries:
+            return
+        with self._mutex:
+            self._pending.setdefault(name, []).extend(entries)
+            self._size += len(entries)
+            full = self._size >= self.max_batch
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while self.pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    @property
+    def pending(self) -> int:
+        return self._size
+
+    def _take(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._mutex:
+            batch, self._pending, self._size = self._pending, {}, 0
+        return batch
+
+    def _requeue(self, name: str, entries: List[Dict[str, Any]]) -> None:
+        with self._mutex:
+            self._pending[name] = entries + self._pending.get(name, [])
+            self._size += len(entries)
+
+    def flush_sync(self) -> int:
+        """Write everything pending now; returns the number of entries written."""
+        written = 0
+        with self._write_lock:  # keeps batches in order across threads
+            for name, entries in self._take().items():
+                try:
+                    get_storage().append_logs(name, entries)
+                except Exception:
+                    logger.exception("event log %s: write failed, %d entries re-queued", name, len(entries))
+                    self._requeue(name, entries)
+                else:
+                    written += len(entries)
+        return written
+
+    async def flush(self) -> int:
+        if not self.pending:
+            return 0
+        return await run_io(self.flush_sync)
+
+    async def aclose(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+_event_writer: Optional[BufferedEventWriter] = None
+
+
+def get_event_writer() -> BufferedEventWriter:
+    global _event_writer
+    if _event_writer is None:
+        _event_writer = BufferedEventWriter(
+            max_batch=int(os.getenv("EVENT_LOG_BATCH", "256")),
+            flush_interval=float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "1.0")),
+        )
+    return _event_writer
+
+
+async def close_event_writer() -> None:
+    if _event_writer is not None:
+        await _event_writer.aclose()
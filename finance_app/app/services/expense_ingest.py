@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..storage import get_storage
+
+MAX_BATCH_ROWS = 10_000
+IMPORT_FORMATS = ("csv", "jsonl")
+
+_DATE = re.compile(r"\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])")
+
+
+def validate_expense(raw: Any) -> Dict[str, Any]:
+    """Normalised ``{date, category, amount, note}`` or ValueError with the reason."""
+    if isinstance(raw, Exception):
+        raise ValueError(str(raw))
+    if not isinstance(raw, dict):
+        raise ValueError("row must be an object")
+    day = raw.get("date")
+    if not isinstance(day, str) or not _DATE.fullmatch(day):
+        raise ValueError("date must be YYYY-MM-DD")
+    category = raw.get("category")
+    if not isinstance(category, str) or not category.strip():
+        raise ValueError("category is required")
+    amount = raw.get("amount")
+    if isinstance(amount, bool):
+        raise ValueError("amount must be a number")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        raise ValueError("amount must be a number")
+    if not math.isfinite(amount):
+        raise ValueError("amount must be a number")
+    note = raw.get("note")
+    if note is not None and not isinstance(note, str):
+        note = str(note)
+    return {"date": day, "category": category.strip(), "amount": amount, "note": note or None}
+
+
+def ingest_expenses(
+    username: str, rows: Sequence[Any], storage: Any = None, return_rows: bool = False
+) -> Dict[str, Any]:
+    """Validate ``rows`` and store the valid ones, one write per month.
+
+    Rows are grouped by the month of their ``date`` and each group goes to
+    the backend's ``add_expenses`` in one call. Invalid rows are skipped and
+    reported as ``{"row": index, "error": reason}``; the rest are stored.
+    """
+    store = storage or get_storage()
+    groups: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    errors: List[Dict[str, Any]] = []
+    for index, raw in enumerate(rows):
+        try:
+            row = validate_expense(raw)
+        except ValueError as exc:
+            errors.append({"row": index, "error": str(exc)})
+            continue
+        groups.setdefault(row["date"][:7], []).append((index, row))
+
+    stored: List[Optional[Dict[str, Any]]] = [None] * len(rows) if return_rows else []
+    months: Dict[str, int] = {}
+    for month in sorted(groups):
+        items = groups[month]
+        saved = store.add_expenses(username, month, [row for _, row in items])
+        months[month] = len(saved)
+        if return_rows:
+            for (index, _), row in zip(items, saved):
+                stored[index] = row
+
+    result: Dict[str, Any] = {"inserted": sum(months.values()), "months": months, "errors": errors}
+    if return_rows:
+        result["expenses"] = [row for row in stored if row is not None]
+    return result
+
+
+def parse_import(data: bytes, fmt: str) -> List[Any]:
+    """Rows of a CSV (header: date,category,amount[,note]) or JSON-lines upload.
+
+    Unparseable lines become ValueError entries so their position is
+    reported by ``ingest_expenses`` like any other invalid row.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("file must be UTF-8")
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text, newline=""))
+        missing = {"date", "category", "amount"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError("CSV header must include " + ", ".join(sorted(missing)))
+        return [row for row in reader]
+    if fmt == "jsonl":
+        rows: List[Any] = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(ValueError("invalid JSON"))
+        return rows
+    raise ValueError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
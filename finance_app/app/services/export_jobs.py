@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from ..api.utils import data_dir, ensure_dir, load_json, path_lock, read_json, update_json
+from ..storage import get_storage
+from .analytics_service import months_between
+from .export_service import gzip_stream, iter_export
+
+logger = logging.getLogger(__name__)
+
+# A queued/running job that has not finished within this many seconds is
+# assumed lost (worker restarted) and is submitted again.
+JOB_TIMEOUT = 15 * 60
+ARTIFACT_TTL = 24 * 3600
+
+
+def exports_dir() -> str:
+    return os.path.join(data_dir(), "exports")
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(exports_dir(), f"{job_id}.json")
+
+
+def artifact_filename(job: Dict[str, Any]) -> str:
+    name = f"expenses_{job['username']}_{job['start']}_{job['end']}.{job['format']}"
+    return name + ".gz" if job.get("gzip") else name
+
+
+def data_version(username: str, start: date, end: date, storage: Any = None) -> str:
+    store = storage or get_storage()
+    parts = [store.expenses_version(username, m) for m in months_between(start, end)]
+    return store.name + ":" + ",".join(parts)
+
+
+def job_id_for(username: str, fmt: str, start: date, end: date, gzip: bool, version: str) -> str:
+    """Deterministic id: the same request over unchanged data maps to the same job."""
+    key = "|".join([username, fmt, start.isoformat(), end.isoformat(), "gz" if gzip else "", version])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    if not job_id.isalnum():
+        return None
+    return read_json(_job_path(job_id), None)
+
+
+def artifact_path(job: Dict[str, Any]) -> str:
+    return os.path.join(exports_dir(), f"{job['id']}.bin")
+
+
+def run_export_job(job_id: str) -> None:
+    """Render one job's artifact. Runs in a worker process, thread or Celery task."""
+    job = get_job(job_id)
+    if job is None:
+        return
+    update_json(_job_path(job_id), job, lambda j: j.update(status="running", started_at=time.time()))
+    path = artifact_path(job)
+    tmp_path = path + ".tmp"
+    try:
+        start, end = date.fromisoformat(job["start"]), date.fromisoformat(job["end"])
+        chunks = iter_export(job["format"], job["username"], start, end)
+        if job.get("gzip"):
+            chunks = gzip_stream(chunks)
+        size = 0
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, path)
+    except Exception as exc:
+        logger.exception("export job %s failed", job_id)
+        update_json(_job_path(job_id), job, lambda j: j.update(status="failed", error=str(exc), finished_at=time.time()))
+        return
+    update_json(_job_path(job_id), job, lambda j: j.update(status="done", size=size, finished_at=time.time()))
+
+
+class ExecutorQueue:
+    """Submits jobs to a ``concurrent.futures`` executor in this process."""
+
+    def __init__(self, executor: Executor, name: str) -> None:
+        self.executor = executor
+        self.name = name
+
+    def submit(self, job_id: str) -> None:
+        self.executor.submit(run_export_job, job_id)
+
+
+class CeleryQueue:
+    """Hands jobs to the Celery worker (``finance_app.app.worker``)."""
+
+    name = "celery"
+
+    def submit(self, job_id: str) -> None:
+        from ..worker import render_export
+
+        render_export.delay(job_id)
+
+
+def create_export_queue(kind: Optional[str] = None) -> Any:
+    """``EXPORT_QUEUE``: ``process`` (default), ``celery``, or ``local`` threads for tests."""
+    kind = (kind or os.getenv("EXPORT_QUEUE", "process")).lower()
+    workers = int(os.getenv("EXPORT_WORKERS", "2"))
+    if kind == "celery":
+        return CeleryQueue()
+    if kind == "process":
+        # spawn: never fork the server process with its threads and locks
+        ctx = multiprocessing.get_context("spawn")
+        return ExecutorQueue(ProcessPoolExecutor(max_workers=workers, mp_context=ctx), "process")
+    if kind == "local":
+        return ExecutorQueue(ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export"), "local")
+    raise ValueError(f"Unknown export queue: {kind}")
+
+
+class ExportJobService:
+    """Export jobs are JSON records under ``data/exports`` next to their artifact.
+
+    The job id hashes (user, format, range, gzip, data version), so repeating
+    an export over unchanged data returns the finished job immediately; any
+    write to a month in the range changes the version and yields a new job.
+    """
+
+    def __init__(self, queue: Any = None) -> None:
+        self._queue = queue
+        self._last_cleanup = 0.0
+
+    @property
+    def queue(self) -> Any:
+        if self._queue is None:
+            self._queue = create_export_queue()
+        return self._queue
+
+    def enqueue(self, username: str, fmt: str, start: date, end: date, gzip: bool = False) -> Dict[str, Any]:
+        self.cleanup()
+        job_id = job_id_for(username, fmt, start, end, gzip, data_version(username, start, end))
+        now = time.time()
+        submit = []
+
+        def apply(job: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            if job and self._is_live(job, now):
+                return job
+            submit.append(True)
+            return {
+                "id": job_id,
+                "username": username,
+                "format": fmt,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "gzip": gzip,
+                "status": "queued",
+                "created_at": now,
+            }
+
+        ensure_dir(exports_dir())
+        job = update_json(_job_path(job_id), None, apply)
+        if submit:
+            self.queue.submit(job_id)
+        return job
+
+    def _is_live(self, job: Dict[str, Any], now: float) -> bool:
+        if job.get("status") == "done":
+            return os.path.exists(artifact_path(job))
+        if job.get("status") in ("queued", "running"):
+            return now - float(job.get("started_at") or job.get("created_at") or 0) < JOB_TIMEOUT
+        return False
+
+    def cleanup(self, max_age: float = ARTIFACT_TTL, force: bool = False) -> int:
+        """Expire jobs older than ``max_age`` together with their artifacts, so
+        a record never says "done" for a deleted file; runs at most hourly.
+        Returns how many jobs were removed."""
+        now = time.time()
+        if not force and now - self._last_cleanup < 3600:
+            return 0
+        self._last_cleanup = now
+        root = exports_dir()
+        if not os.path.isdir(root):
+            return 0
+        removed = 0
+        for fname in os.listdir(root):
+            if not fname.endswith(".json"):
+                continue
+            path = os.path.join(root, fname)
+            with path_lock(path).write():
+                job = load_json(path, None)
+                try:
+                    if job is None:
+                        job, born = {"id": fname[: -len(".json")]}, os.path.getmtime(path)
+                    elif job.get("status") in ("queued", "running") and self._is_live(job, now):
+                        continue
+                    else:
+                        born = float(job.get("finished_at") or job.get("created_at") or os.path.getmtime(path))
+                    if now - born <= max_age:
+                        continue
+                    # Record first: from here on the job reads as unknown, not as done
+                    os.remove(path)
+                except OSError:
+                    continue
+            for leftover in (artifact_path(job), artifact_path(job) + ".tmp"):
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        # Artifacts whose record is gone (e.g. removed by hand)
+        for fname in os.listdir(root):
+            job_id = fname.split(".", 1)[0]
+            path = os.path.join(root, fname)
+            try:
+                if not fname.endswith(".json") and not os.path.exists(_job_path(job_id)) and now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+        return removed
+
+
+def job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: job.get(k) for k in ("id", "status", "format", "start", "end", "gzip", "size", "error")}
+    for key in ("created_at", "finished_at"):
+        if job.get(key):
+            out[key] = datetime.utcfromtimestamp(job[key]).isoformat()
+    return out
+
+
+_service: Optional[ExportJobService] = None
+
+
+def get_export_jobs() -> ExportJobService:
+    global _service
+    if _service is None:
+        _service = ExportJobService()
+    return _service
+
+
+def set_export_jobs(service: ExportJobService) -> None:
+    global _service
+    _service = service
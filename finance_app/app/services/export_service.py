@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import csv
+import io
+import unicodedata
+import zlib
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from ..storage import get_storage
+from .analytics_service import months_between
+
+EXPORT_FIELDS = ["date", "category", "amount", "note"]
+_CSV_BATCH = 256
+
+
+def iter_expense_rows(username: str, start: date, end: date, storage: Any = None) -> Iterator[Dict[str, Any]]:
+    """Rows between ``start`` and ``end`` inclusive, newest month first.
+
+    Only one month is read at a time, so memory is bounded by the largest
+    month rather than the whole range.
+    """
+    store = storage or get_storage()
+    lo, hi = start.isoformat(), end.isoformat()
+    for month in reversed(months_between(start, end)):
+        for row in store.iter_expenses(username, month):
+            day = str(row.get("date") or "")[:10]
+            # Undated rows belong to the month file they are stored in
+            if not day or lo <= day <= hi:
+                yield row
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    pending = 1
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= _CSV_BATCH:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    if pending:
+        yield buf.getvalue().encode("utf-8")
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def _pdf_text(value: Any, width: Optional[int] = None) -> str:
+    """Latin-1 safe text for the built-in Helvetica font, escaped for a PDF string.
+
+    The standard fonts cannot render Vietnamese, so diacritics are dropped
+    (``Ăn uống`` -> ``An uong``) rather than printed as missing glyphs.
+    """
+    text = str(value if value is not None else "").replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.encode("latin-1", "replace").decode("latin-1")[:width]
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _fmt_amount(value: Any) -> str:
+    try:
+        amount = float(value or 0)
+    except (TypeError, ValueError):
+        return str(value)
+    return f"{amount:,.0f}" if amount.is_integer() else f"{amount:,.2f}"
+
+
+class PdfStreamWriter:
+    """Minimal PDF writer that emits each page as soon as it is full.
+
+    Objects are written in order and only their byte offsets are kept, so a
+    document of any length needs memory for one page. The page tree (object 2)
+    and the xref table go last, which PDF readers accept.
+    """
+
+    PAGE_W, PAGE_H = 595, 842  # A4 in points
+    MARGIN = 40
+    LINE_H = 14
+    FONT_SIZE = 9
+    # (field, x offset, max chars)
+    COLUMNS = (("date", 0, 12), ("category", 75, 24), ("amount", 215, 16), ("note", 305, 48))
+
+    def __init__(self, title: str) -> None:
+        self.title = title
+        self._offset = 0
+        self._offsets: Dict[int, int] = {}
+        self._pages: List[int] = []
+        self._next_id = 5  # 1 catalog, 2 page tree, 3-4 fonts
+
+    def _obj(self, num: int, body: bytes) -> bytes:
+        self._offsets[num] = self._offset
+        data = b"%d 0 obj\n" % num + body + b"\nendobj\n"
+        self._offset += len(data)
+        return data
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
+    def _header(self) -> bytes:
+        out = self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        out += self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        out += self._obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        out += self._obj(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        return out
+
+    def _page(self, lines: List[str]) -> bytes:
+        content = zlib.compress("\n".join(lines).encode("latin-1"))
+        stream_id, page_id = self._next_id, self._next_id + 1
+        self._next_id += 2
+        self._pages.append(page_id)
+        out = self._obj(
+            stream_id,
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream",
+        )
+        out += self._obj(
+            page_id,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (self.PAGE_W, self.PAGE_H, stream_id),
+        )
+        return out
+
+    def _trailer(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % p for p in self._pages)
+        out = self._obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)))
+        xref_at = self._offset
+        size = self._next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for num in range(1, size):
+            xref.append(b"%010d 00000 n \n" % self._offsets[num])
+        out += b"".join(xref)
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at)
+        return out
+
+    def _text(self, x: float, y: float, text: str, bold: bool = False) -> str:
+        font = "F2" if bold else "F1"
+        return f"BT /{font} {self.FONT_SIZE} Tf {x:.1f} {y:.1f} Td ({text}) Tj ET"
+
+    def _start_page(self, number: int) -> List[str]:
+        top = self.PAGE_H - self.MARGIN
+        lines = [
+            self._text(self.MARGIN, top, _pdf_text(self.title), bold=True),
+            self._text(self.PAGE_W - self.MARGIN - 50, top, f"Page {number}"),
+        ]
+        y = top - 2 * self.LINE_H
+        for field, dx, _ in self.COLUMNS:
+            lines.append(self._text(self.MARGIN + dx, y, field.capitalize(), bold=True))
+        return lines
+
+    def iter_pdf(self, rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+        yield self._header()
+        rows_per_page = (self.PAGE_H - 2 * self.MARGIN) // self.LINE_H - 3
+        lines = self._start_page(1)
+        on_page = 0
+        total, count = 0.0, 0
+        for row in rows:
+            if on_page == rows_per_page:
+                yield self._page(lines)
+                lines = self._start_page(len(self._pages) + 1)
+                on_page = 0
+            y = self.PAGE_H - self.MARGIN - (on_page + 3) * self.LINE_H
+            for field, dx, width in self.COLUMNS:
+                value = _fmt_amount(row.get(field)) if field == "amount" else row.get(field)
+                lines.append(self._text(self.MARGIN + dx, y, _pdf_text(value, width)))
+            try:
+                total += float(row.get("amount", 0) or 0)
+            except (TypeError, ValueError):
+                pass
+            count += 1
+            on_page += 1
+        if on_page == rows_per_page:
+            yield self._page(lines)
+            lines = self._start_page(len(self._pages) + 1)
+            on_page = 0
+        y = self.PAGE_H - self.MARGIN - (on_page + 4) * self.LINE_H
+        lines.append(self._text(self.MARGIN, y, f"Total: {_fmt_amount(total)} ({count} rows)", bold=True))
+        yield self._page(lines)
+        yield self._trailer()
+
+
+def iter_export(
+    fmt: str, username: str, start: date, end: date, storage: Any = None, title: Optional[str] = None
+) -> Iterator[bytes]:
+    rows = iter_expense_rows(username, start, end, storage)
+    if fmt == "csv":
+        return iter_csv(rows)
+    if fmt == "pdf":
+        return PdfStreamWriter(title or f"Expenses {start.isoformat()} - {end.isoformat()} for {username}").iter_pdf(rows)
+    raise ValueError(f"Unsupported format: {fmt}")
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AIServiceError(Exception):
+    def __init__(self, message: str, retriable: bool = False, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.retriable = retriable
+        self.status_code = status_code
+
+
+class CircuitOpenError(AIServiceError):
+    pass
+
+
+def resolve_secret(key: str) -> str:
+    """``ENV_NAME`` entries in gemini_keys.json refer to the ``NAME`` environment variable."""
+    if key.startswith("ENV_"):
+        return os.getenv(key[4:], "")
+    return key
+
+
+@dataclass
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; after
+    ``reset_timeout`` one probe is let through (half-open) and its outcome
+    closes or re-opens the circuit."""
+
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    failures: int = 0
+    opened_at: Optional[float] = None
+    probing: bool = False
+
+    def state(self, now: float) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self, now: float) -> bool:
+        state = self.state(now)
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures, self.opened_at, self.probing = 0, None, False
+
+    def record_failure(self, now: float) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = now
+
+    def release_probe(self) -> None:
+        """Let another probe through after one ended without an outcome
+        (cancelled, or stopped by the caller's own deadline)."""
+        self.probing = False
+
+
+class GeminiClient:
+    """Async Gemini ``generateContent`` client.
+
+    One ``httpx.AsyncClient`` (and connection pool) is shared by all calls.
+    Each API key gets a concurrency semaphore and a circuit breaker.
+    Transient failures (transport errors, 429 and 5xx) are retried with
+    full-jitter exponential backoff, honouring ``Retry-After``, and retries
+    stop once the next attempt could not finish before the call's deadline.
+    Pass ``transport`` (for example ``mock_transport()``) to run without
+    network access.
+    """
+
+    def __init__(
+        self,
+        model: str = "gemini-1.5-flash",
+        base_url: str = GEMINI_BASE_URL,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        timeout: float = 20.0,
+        deadline: float = 45.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+        per_key_concurrency: int = 8,
+        max_connections: int = 64,
+        breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.model = model
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.per_key_concurrency = per_key_concurrency
+        self._breaker_factory = breaker_factory
+        self._clock = clock
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = self._breaker_factory()
+        return breaker
+
+    def available(self, key: str) -> bool:
+        """False while the key's circuit is open (half-open counts as available)."""
+        return self.breaker(key).state(self._clock()) != "open"
+
+    def _semaphore(self, key: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(key)
+        if sem is None:
+            sem = self._semaphores[key] = asyncio.Semaphore(self.per_key_concurrency)
+        return sem
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    async def generate(self, key: str, prompt: str, json_output: bool = False, deadline: Optional[float] = None) -> str:
+        """Text of the first candidate for ``prompt`` using API key ``key``."""
+        breaker = self.breaker(key)
+        now = self._clock()
+        probe = breaker.state(now) == "half_open"
+        if not breaker.allow(now):
+            raise CircuitOpenError("circuit open for key", retriable=True)
+        body: Dict[str, Any] = {"contents": [{"parts": [{"text": prompt}]}]}
+        if json_output:
+            body["generationConfig"] = {"responseMimeType": "application/json"}
+        ends_at = now + (deadline or self.deadline)
+        attempt = 0
+        try:
+            while True:
+                remaining = ends_at - self._clock()
+                if remaining <= 0:
+                    # The caller's budget ran out; that says nothing about the key
+                    raise AIServiceError("deadline exceeded", retriable=False)
+                try:
+                    async with self._semaphore(key):
+                        text = await self._call(key, body, min(self.timeout, remaining))
+                except AIServiceError as exc:
+                    retry_after = getattr(exc, "retry_after", None)
+                    delay = self._backoff(attempt, retry_after)
+                    attempt += 1
+                    if not exc.retriable or attempt > self.max_retries or self._clock() + delay >= ends_at:
+                        breaker.record_failure(self._clock())
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception:
+                    breaker.record_failure(self._clock())
+                    raise
+                breaker.record_success()
+                return text
+        finally:
+            if probe:
+                breaker.release_probe()
+
+    async def _call(self, key: str, body: Dict[str, Any], timeout: float) -> str:
+        url = f"/v1beta/models/{self.model}:generateContent"
+        try:
+            resp = await self._http.post(url, params={"key": resolve_secret(key)}, json=body, timeout=timeout)
+        except httpx.TimeoutException as exc:
+            raise AIServiceError(f"timeout: {exc}", retriable=True) from exc
+        except httpx.TransportError as exc:
+            raise AIServiceError(f"transport error: {exc}", retriable=True) from exc
+        if resp.status_code != 200:
+            err = AIServiceError(
+                f"Gemini returned HTTP {resp.status_code}",
+                retriable=resp.status_code in _RETRY_STATUSES,
+                status_code=resp.status_code,
+            )
+            header = resp.headers.get("retry-after")
+            if header and header.isdigit():
+                err.retry_after = float(header)  # type: ignore[attr-defined]
+            raise err
+        try:
+            return resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+        except (ValueError, KeyError, IndexError) as exc:
+            raise AIServiceError("malformed Gemini response", retriable=False) from exc
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+class MockGemini:
+    """Stand-in Gemini server for ``httpx.MockTransport``.
+
+    It answers plan prompts with the same split the service used to return
+    inline. ``latency`` and ``failure_rate`` (HTTP 503) let benchmarks
+    exercise pooling, retries and breakers.
+    """
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            return httpx.Response(503, json={"error": {"message": "overloaded"}})
+        prompt = json.loads(request.content)["contents"][0]["parts"][0]["text"]
+        match = re.search(r"income[^0-9]*([0-9.]+)", prompt)
+        income = float(match.group(1)) if match else 0.0
+        plan = {
+            "savings": round(income * 0.2, 2),
+            "food": round(income * 0.25, 2),
+            "transport": round(income * 0.1, 2),
+            "others": round(income * 0.45, 2),
+        }
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": json.dumps(plan)}]}}]})
+
+
+def mock_transport(latency: float = 0.0, failure_rate: float = 0.0) -> httpx.MockTransport:
+    return httpx.MockTransport(MockGemini(latency, failure_rate))
+
+
+def create_gemini_client() -> GeminiClient:
+    """``GEMINI_MODE=live`` talks to Google; the default ``mock`` uses ``MockGemini``."""
+    mode = os.getenv("GEMINI_MODE", "mock").lower()
+    transport = None if mode == "live" else mock_transport()
+    return GeminiClient(
+        model=os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+        transport=transport,
+        timeout=float(os.getenv("GEMINI_TIMEOUT", "20")),
+        per_key_concurrency=int(os.getenv("GEMINI_KEY_CONCURRENCY", "8")),
+    )
+
+
+_client: Optional[GeminiClient] = None
+
+
+def get_gemini_client() -> GeminiClient:
+    global _client
+    if _client is None:
+        _client = create_gemini_client()
+    return _client
+
+
+async def close_gemini_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
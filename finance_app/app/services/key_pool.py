@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config_registry import get_config, get_config_registry
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+MAX_ERRORS = 3
+DISABLE_SECONDS = 300
+
+
+@dataclass
+class GeminiKey:
+    key: str
+    quota_limit: int
+    current_usage: int
+    last_used: Optional[float]
+    status: str
+    error_count: int
+
+
+def _as_time(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class _KeyState:
+    key: str
+    quota_limit: int = 0
+    usage: int = 0
+    pending: int = 0  # successful calls not yet flushed to gemini_keys.json
+    in_flight: int = 0
+    last_used: Optional[float] = None
+    status: str = "active"
+    error_count: int = 0
+    disabled_until: Optional[float] = None
+    version: int = 0
+    dirty: bool = False
+
+    def rank(self) -> Tuple[int, float]:
+        return (self.usage + self.in_flight, self.last_used or 0.0)
+
+    def exhausted(self) -> bool:
+        return self.quota_limit > 0 and self.usage >= self.quota_limit
+
+    def snapshot(self) -> GeminiKey:
+        return GeminiKey(self.key, self.quota_limit, self.usage, self.last_used, self.status, self.error_count)
+
+
+class GeminiKeyPool:
+    """Least-used key selection over ``config/gemini_keys.json`` without file I/O per call.
+
+    Active keys sit in a min-heap ordered by (usage + in-flight calls, last
+    used). Entries are invalidated lazily through a per-key version, so
+    ``acquire`` and ``release`` are O(log k). Keys disabled after
+    ``MAX_ERRORS`` consecutive failures wait in a second heap ordered by
+    ``last_disabled_until`` and rejoin once it passes. A key that is disabled
+    in the file without a deadline stays out until an admin re-enables it.
+
+    Counters live in memory, and ``flush`` merges them into the config file
+    in one read-modify-write every ``flush_interval`` seconds. With a
+    ``redis`` client, usage is counted with ``INCR`` so all workers share
+    one total. Edits to the file (for example adding a key from the admin
+    page) are picked up when the registry snapshot changes.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 5.0,
+        redis: Any = None,
+        prefix: str = "gemini:usage:",
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.redis = redis
+        self.prefix = prefix
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._keys: Dict[str, _KeyState] = {}
+        self._heap: List[Tuple[int, float, int, str]] = []  # (usage, last used, version, key)
+        self._disabled: List[Tuple[float, str]] = []  # (disabled until, key)
+        self._snapshot: Any = None
+        self._last_flush = 0.0
+
+    @property
+    def blocking(self) -> bool:
+        """``release`` makes a network round trip when counting in Redis."""
+        return self.redis is not None
+
+    def _push(self, state: _KeyState) -> None:
+        state.version += 1
+        if state.status == "active" and not state.exhausted():
+            usage, last_used = state.rank()
+            heapq.heappush(self._heap, (usage, last_used, state.version, state.key))
+            if len(self._heap) > 4 * len(self._keys) + 16:
+                self._heap = [e for e in self._heap if self._current(e)]
+                heapq.heapify(self._heap)
+
+    def _current(self, entry: Tuple[int, float, int, str]) -> bool:
+        state = self._keys.get(entry[3])
+        return state is not None and state.version == entry[2]
+
+    def _disable(self, state: _KeyState, until: Optional[float]) -> None:
+        state.status, state.disabled_until = "disabled", until
+        if until is not None:
+            heapq.heappush(self._disabled, (until, state.key))
+
+    def _sync(self, now: float) -> None:
+        snapshot = get_config("gemini_keys", [])
+        if snapshot is self._snapshot:
+            return
+        self._snapshot = snapshot
+        seen = set()
+        for item in snapshot:
+            key = item.get("key")
+            if not key:
+                continue
+            seen.add(key)
+            persisted = int(item.get("current_usage", 0) or 0)
+            until = item.get("last_disabled_until")
+            until = float(until) if until else None
+            state = self._keys.get(key)
+            if state is None:
+                state = self._keys[key] = _KeyState(
+                    key,
+                    last_used=_as_time(item.get("last_used")),
+                    error_count=int(item.get("error_count", 0) or 0),
+                )
+                if item.get("status", "active") != "active":
+                    self._disable(state, until)
+            elif until and (state.disabled_until or 0) < until and until > now:
+                self._disable(state, until)  # another worker disabled it
+            elif state.status != "active" and state.disabled_until is None and item.get("status") == "active":
+                state.status, state.error_count = "active", 0  # re-enabled by an admin
+            state.quota_limit = int(item.get("quota_limit", 0) or 0)
+            if self.redis is None:
+                state.usage = persisted + state.pending
+            else:
+                state.usage = max(persisted, state.usage)
+            self._push(state)
+        for key in set(self._keys) - seen:
+            del self._keys[key]
+
+    def _wake(self, now: float) -> None:
+        while self._disabled and self._disabled[0][0] <= now:
+            until, key = heapq.heappop(self._disabled)
+            state = self._keys.get(key)
+            if state is None or state.disabled_until != until:
+                continue
+            state.status, state.disabled_until, state.error_count = "active", None, 0
+            state.dirty = True
+            self._push(state)
+
+    def acquire(self, skip: Optional[Callable[[str], bool]] = None) -> Optional[GeminiKey]:
+        """Reserve the least-used available key; ``skip`` vetoes keys (e.g. open circuits)."""
+        now = self.clock()
+        with self._lock:
+            self._sync(now)
+            self._wake(now)
+            passed = []
+            chosen = None
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                if not self._current(entry):
+                    continue
+                if skip is not None and skip(entry[3]):
+                    passed.append(entry)
+                    continue
+                chosen = self._keys[entry[3]]
+                break
+            for entry in passed:
+                heapq.heappush(self._heap, entry)
+            if chosen is None:
+                return None
+            chosen.in_flight += 1
+            self._push(chosen)
+            return chosen.snapshot()
+
+    def release(self, key: str, success: bool) -> None:
+        total = None
+        if success and self.redis is not None:
+            try:
+                total = int(self.redis.incr(self.prefix + key))
+            except Exception as exc:
+                logger.warning("key usage counter unavailable: %s", exc)
+        now = self.clock()
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                return
+            state.in_flight = max(0, state.in_flight - 1)
+            if success:
+                state.pending += 1
+                state.usage = max(state.usage + 1, total or 0)
+                state.error_count = 0
+                state.last_used = now
+            else:
+                state.error_count += 1
+                if state.error_count >= MAX_ERRORS and state.status == "active":
+                    self._disable(state, now + DISABLE_SECONDS)
+            state.dirty = True
+            self._push(state)
+
+    def flush_due(self) -> bool:
+        """True (once per interval) when counters should be written back."""
+        now = self.clock()
+        with self._lock:
+            if now - self._last_flush < self.flush_interval or not any(s.dirty for s in self._keys.values()):
+                return False
+            self._last_flush = now
+            return True
+
+    def flush(self) -> None:
+        with self._lock:
+            dirty = {s.key: s for s in self._keys.values() if s.dirty}
+            changes = {
+                key: (s.pending, s.usage, s.last_used, s.status, s.error_count, s.disabled_until)
+                for key, s in dirty.items()
+            }
+            for s in dirty.values():
+                s.pending, s.dirty = 0, False
+            self._last_flush = self.clock()
+        if not changes:
+            return
+
+        def apply(keys: List[Dict[str, Any]]) -> None:
+            for k in keys:
+                change = changes.get(k.get("key"))
+                if change is None:
+                    continue
+                pending, usage, last_used, status, errors, until = change
+                persisted = int(k.get("current_usage", 0) or 0)
+                k["current_usage"] = persisted + pending if self.redis is None else max(persisted, usage)
+                k["last_used"] = last_used
+                k["status"] = status
+                k["error_count"] = errors
+                if until is None:
+                    k.pop("last_disabled_until", None)
+                else:
+                    k["last_disabled_until"] = until
+
+        try:
+            get_config_registry().update("gemini_keys", [], apply)
+        except Exception:
+            with self._lock:
+                for key, change in changes.items():
+                    state = self._keys.get(key)
+                    if state is not None:
+                        state.pending += change[0]
+                        state.dirty = True
+            raise
+
+
+def create_key_pool(kind: Optional[str] = None) -> GeminiKeyPool:
+    kind = (kind or os.getenv("GEMINI_KEY_POOL") or ("redis" if os.getenv("REDIS_URL") else "memory")).lower()
+    interval = float(os.getenv("GEMINI_KEY_FLUSH_INTERVAL", "5"))
+    return GeminiKeyPool(flush_interval=interval, redis=get_redis() if kind == "redis" else None)
+
+
+_pool: Optional[GeminiKeyPool] = None
+
+
+def get_key_pool() -> GeminiKeyPool:
+    global _pool
+    if _pool is None:
+        _pool = create_key_pool()
+    return _pool
+
+
+def set_key_pool(pool: Optional[GeminiKeyPool]) -> None:
+    global _pool
+    _pool = pool
+
+
+def flush_key_pool() -> None:
+    if _pool is not None:
+        _pool.flush()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..api.utils import data_dir, read_json, run_io, update_json
+from ..storage import get_storage
+from .event_writer import get_event_writer
+
+# resolution -> (bucket seconds, buckets kept): 24 hours, 30 days, a year
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {"minute": (60, 1440), "hour": (3600, 720), "day": (86400, 366)}
+PRO_PLANS = ("pro_basic", "pro_plus", "enterprise")
+
+
+class RingSeries:
+    """``size`` time buckets of ``step`` seconds. Bucket ``i`` lives in slot
+    ``i % size`` and is overwritten when a newer bucket needs the slot, so
+    memory and file size stay fixed however long the app runs."""
+
+    def __init__(self, step: int, size: int) -> None:
+        self.step = step
+        self.size = size
+        self._slots: List[Optional[Tuple[int, Dict[str, int]]]] = [None] * size
+
+    def add(self, ts: float, name: str, n: int = 1) -> None:
+        self.add_bucket(int(ts // self.step), {name: n})
+
+    def add_bucket(self, index: int, counts: Dict[str, int]) -> None:
+        slot = index % self.size
+        current = self._slots[slot]
+        if current is None or current[0] < index:
+            current = self._slots[slot] = (index, {})
+        elif current[0] > index:
+            return  # older than the window
+        bucket = current[1]
+        for name, n in counts.items():
+            bucket[name] = bucket.get(name, 0) + n
+
+    def merge(self, other: "RingSeries") -> None:
+        for item in other._slots:
+            if item is not None:
+                self.add_bucket(*item)
+
+    def points(self, since: Optional[float], until: float) -> List[Dict[str, Any]]:
+        """One point per bucket in [since, until], oldest first, empty buckets included."""
+        last = int(until // self.step)
+        first = last - self.size + 1
+        if since is not None:
+            first = max(first, int(since // self.step))
+        out = []
+        for index in range(first, last + 1):
+            item = self._slots[index % self.size]
+            out.append({"ts": index * self.step, "counts": dict(item[1]) if item is not None and item[0] == index else {}})
+        return out
+
+    def to_list(self) -> List[List[Any]]:
+        return [[index, counts] for index, counts in sorted(item for item in self._slots if item is not None)]
+
+    @classmethod
+    def from_list(cls, step: int, size: int, items: List[List[Any]]) -> "RingSeries":
+        ring = cls(step, size)
+        for index, counts in items:
+            ring.add_bucket(int(index), counts)
+        return ring
+
+
+def _seed_counters() -> Dict[str, int]:
+    """Totals rebuilt from the data files; used once, when none are stored yet."""
+    get_event_writer().flush_sync()  # so the log includes calls counted in memory
+    store = get_storage()
+    users = store.list_users()
+    counters = {
+        "total_users": len(users),
+        "upgrade_requests": len(read_json(os.path.join(data_dir(), "upgrade_requests.json"), [])),
+        "ai_calls_total": 0,
+        "ai_calls_errors": 0,
+    }
+    for user in users:
+        name = "plan_users." + str(user.get("plan", "free"))
+        counters[name] = counters.get(name, 0) + 1
+    for entry in store.iter_log("ai_call_log"):
+        counters["ai_calls_total"] += 1
+        if entry.get("status") == "error":
+            counters["ai_calls_errors"] += 1
+        name = "ai_calls_by_type." + str(entry.get("type", "unknown"))
+        counters[name] = counters.get(name, 0) + 1
+    return counters
+
+
+def _ensure_counters(data: Dict[str, Any]) -> None:
+    if "counters" not in data:
+        data["counters"] = _seed_counters()
+
+
+class MetricsAggregator:
+    """Business counters updated as events happen, plus per-minute, hour and
+    day rollups in ``RingSeries``.
+
+    ``incr`` only touches memory. Pending deltas are added to
+    ``business_metrics.json`` by ``flush`` every ``flush_interval`` seconds,
+    so workers sharing the file do not overwrite each other, and reading the
+    metrics costs the same whatever the size of the users file or logs.
+    Counter names with a dot (``ai_calls_by_type.chat_parse``) are reported
+    grouped by their prefix.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0, clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._reset_pending()
+        self._last_flush = clock()
+
+    def _reset_pending(self) -> None:
+        self._counters: Dict[str, int] = {}
+        self._series = {res: RingSeries(step, size) for res, (step, size) in RESOLUTIONS.items()}
+
+    def incr(self, name: str, n: int = 1) -> None:
+        now = self.clock()
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+            for ring in self._series.values():
+                ring.add(now, name, n)
+
+    def flush_due(self) -> bool:
+        return bool(self._counters) and self.clock() - self._last_flush >= self.flush_interval
+
+    def flush(self) -> None:
+        with self._lock:
+            counters, series = self._counters, self._series
+            self._reset_pending()
+            self._last_flush = self.clock()
+        if not counters:
+            return
+
+        def apply(data: Dict[str, Any]) -> None:
+            if "counters" not in data:
+                _ensure_counters(data)  # seeded totals already include these events
+            else:
+                stored = data["counters"]
+                for name, n in counters.items():
+                    stored[name] = stored.get(name, 0) + n
+            stored_series = data.setdefault("series", {})
+            for res, (step, size) in RESOLUTIONS.items():
+                ring = RingSeries.from_list(step, size, stored_series.get(res, []))
+                ring.merge(series[res])
+                stored_series[res] = ring.to_list()
+
+        try:
+            update_json(self.path, {}, apply)
+        except Exception:
+            with self._lock:
+                for name, n in counters.items():
+                    self._counters[name] = self._counters.get(name, 0) + n
+                for res, ring in series.items():
+                    self._series[res].merge(ring)
+            raise
+
+    def snapshot(self, resolution: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None) -> Dict[str, Any]:
+        """Stored metrics with counters at top level; ``resolution`` adds a
+        ``series`` of points between ``since`` and ``until`` (epoch seconds)."""
+        self.flush()
+        data = read_json(self.path, {})
+        if "counters" not in data:
+            data = update_json(self.path, {}, _ensure_counters)
+        out = {k: v for k, v in data.items() if k not in ("counters", "series")}
+        for name, value in data["counters"].items():
+            group, _, key = name.partition(".")
+            if key:
+                out.setdefault(group, {})[key] = value
+            else:
+                out[name] = value
+        out["pro_users"] = sum(out.get("plan_users", {}).get(plan, 0) for plan in PRO_PLANS)
+        if resolution is not None:
+            step, size = RESOLUTIONS[resolution]
+            ring = RingSeries.from_list(step, size, data.get("series", {}).get(resolution, []))
+            until = self.clock() if until is None else until
+            out["series"] = {"resolution": resolution, "step": step, "points": ring.points(since, until)}
+        return out
+
+
+_metrics: Optional[MetricsAggregator] = None
+
+
+def get_metrics() -> MetricsAggregator:
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsAggregator(
+            os.path.join(data_dir(), "business_metrics.json"),
+            flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "5")),
+        )
+    return _metrics
+
+
+def set_metrics(metrics: Optional[MetricsAggregator]) -> None:
+    global _metrics
+    _metrics = metrics
+
+
+async def record(name: str, n: int = 1) -> None:
+    """``incr`` from a request handler; writes the batch off the loop when due."""
+    metrics = get_metrics()
+    metrics.incr(name, n)
+    if metrics.flush_due():
+        await run_io(metrics.flush)
+
+
+def flush_metrics() -> None:
+    if _metrics is not None:
+        _metrics.flush()
@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import logging
+import os
+import random
+import smtplib
+import time
+import uuid
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+from ..api.utils import data_dir, ensure_dir, run_io
+from ..storage import get_storage
+from .notification_queue import NotificationQueue
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    """A message could not be delivered; ``permanent`` ones are not retried."""
+
+    def __init__(self, message: str, permanent: bool = False) -> None:
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class LogTransport:
+    """Prints emails, as ``EmailService`` used to; the default with no SMTP_HOST."""
+
+    async def send_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[DeliveryError]]:
+        for m in messages:
+            print(f"[EMAIL] to={m.get('to')} subject={m.get('subject')}")
+        return [None] * len(messages)
+
+
+class SmtpTransport:
+    """Sends a batch over one SMTP connection, in the threadpool."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 25,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        sender: str = "no-reply@localhost",
+        timeout: float = 10.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender
+        self.timeout = timeout
+
+    def _email(self, m: Dict[str, Any]) -> EmailMessage:
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = m["to"]
+        email["Subject"] = m.get("subject") or "Finance App"
+        email["Message-ID"] = f"<{m['id']}@finance-app>"
+        email.set_content(m.get("message", ""))
+        return email
+
+    def _send(self, messages: List[Dict[str, Any]]) -> List[Optional[DeliveryError]]:
+        results: List[Optional[DeliveryError]] = []
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password or "")
+                for m in messages:
+                    if not m.get("to"):
+                        results.append(DeliveryError("no recipient", permanent=True))
+                        continue
+                    try:
+                        smtp.send_message(self._email(m))
+                        results.append(None)
+                    except smtplib.SMTPRecipientsRefused as exc:
+                        results.append(DeliveryError(str(exc), permanent=True))
+                    except smtplib.SMTPResponseException as exc:
+                        results.append(DeliveryError(f"{exc.smtp_code} {exc.smtp_error!r}", permanent=exc.smtp_code >= 500))
+                        smtp.rset()
+        except (OSError, smtplib.SMTPException) as exc:
+            # The connection failed: what was not sent yet is retried
+            results.extend(DeliveryError(f"smtp: {exc}") for _ in range(len(messages) - len(results)))
+        return results
+
+    async def send_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[DeliveryError]]:
+        return await run_io(self._send, messages)
+
+
+class InAppTransport:
+    """Appends to each user's ``notifications`` document, one write per user."""
+
+    def _send(self, messages: List[Dict[str, Any]]) -> List[Optional[DeliveryError]]:
+        store = get_storage()
+        by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for m in messages:
+            if m.get("username"):
+                by_user.setdefault(m["username"], []).append({
+                    "id": m["id"],
+                    "title": m.get("subject") or "Thông báo",
+                    "message": m.get("message", ""),
+                    "timestamp": m.get("created_at") or datetime.utcnow().isoformat(),
+                    "read": False,
+                })
+        failed: Dict[str, DeliveryError] = {}
+        for username, items in by_user.items():
+            try:
+                store.update_doc(username, "notifications", [], lambda doc: doc.extend(items))
+            except Exception as exc:
+                failed[username] = DeliveryError(str(exc))
+        return [
+            DeliveryError("no username", permanent=True) if not m.get("username") else failed.get(m["username"])
+            for m in messages
+        ]
+
+    async def send_batch(self, messages: List[Dict[str, Any]]) -> List[Optional[DeliveryError]]:
+        return await run_io(self._send, messages)
+
+
+class NotificationDispatcher:
+    """Background loop that delivers ``NotificationQueue`` messages.
+
+    Due messages are grouped by ``kind`` into batches of ``batch_size`` and
+    handed to that channel's transport, with at most ``concurrency[kind]``
+    batches in flight per channel. Failures are retried with full-jitter
+    exponential backoff; after ``max_attempts`` (or a permanent error) the
+    message goes to the ``notifications_dead`` log and is acked.
+
+    Only one process consumes a queue: the dispatcher holds an exclusive
+    ``flock`` on ``{queue}.consumer`` and the other workers keep retrying
+    to take it over.
+    """
+
+    def __init__(
+        self,
+        queue: NotificationQueue,
+        transports: Dict[str, Any],
+        batch_size: int = 50,
+        concurrency: Optional[Dict[str, int]] = None,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 600.0,
+        poll_interval: float = 0.5,
+    ) -> None:
+        self.queue = queue
+        self.transports = transports
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self._limits = {kind: asyncio.Semaphore((concurrency or {}).get(kind, 4)) for kind in transports}
+        self._wakeup = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock_file: Any = None
+        self._inflight: set = set()
+        self.sent = 0
+        self.failed = 0
+
+    def wake(self) -> None:
+        """Start the next poll now; safe to call from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _acquire_consumer(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        ensure_dir(os.path.dirname(self.queue.path))
+        f = open(self.queue.path + ".consumer", "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def _backoff(self, attempts: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)))
+
+    async def _deliver(self, kind: str, batch: List[Dict[str, Any]]) -> None:
+        async with self._limits[kind]:
+            try:
+                results = await self.transports[kind].send_batch(batch)
+            except Exception as exc:
+                logger.exception("notify %s: transport error", kind)
+                results = [DeliveryError(str(exc))] * len(batch)
+        acked, dead = [], []
+        now = time.time()
+        for message, error in zip(batch, results):
+            if error is None:
+                acked.append(message["id"])
+                continue
+            attempts = message.get("attempts", 0) + 1
+            if error.permanent or attempts >= self.max_attempts:
+                acked.append(message["id"])
+                dead.append(dict(message, attempts=attempts, error=str(error), failed_at=datetime.utcnow().isoformat()))
+            else:
+                await run_io(self.queue.retry, message["id"], attempts, now + self._backoff(attempts), str(error))
+        if dead:
+            await run_io(get_storage().append_logs, "notifications_dead", dead)
+        await run_io(self.queue.ack, acked)
+        self.sent += len(acked) - len(dead)
+        self.failed += len(dead)
+
+    async def run_once(self) -> int:
+        """Start deliveries for everything due now; returns how many."""
+        await run_io(self.queue.poll)
+        messages = self.queue.take(self.batch_size * 16)
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        for message in messages:
+            kind = message.get("kind") if message.get("kind") in self.transports else None
+            if kind is None:
+                await run_io(get_storage().append_log, "notifications_dead", dict(message, error="unknown kind"))
+                await run_io(self.queue.ack, [message["id"]])
+                continue
+            batches.setdefault(kind, []).append(message)
+        for kind, items in batches.items():
+            for i in range(0, len(items), self.batch_size):
+                task = asyncio.create_task(self._deliver(kind, items[i:i + self.batch_size]))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+        return len(messages)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not self._acquire_consumer():
+                    await asyncio.sleep(5)
+                    continue
+                if not await self.run_once():
+                    await run_io(self.queue.compact)
+                    due = self.queue.next_due()
+                    wait = self.poll_interval if due is None else min(self.poll_interval, max(0.0, due - time.time()))
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                elif len(self._inflight) > 4 * len(self.transports):
+                    await asyncio.wait(self._inflight, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("notification dispatcher error")
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self, drain: float = 5.0) -> None:
+        """Stop polling and give in-flight batches ``drain`` seconds to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.wait(set(self._inflight), timeout=drain)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._loop = None
+
+
+def create_email_transport() -> Any:
+    host = os.getenv("SMTP_HOST")
+    if not host:
+        return LogTransport()
+    return SmtpTransport(
+        host,
+        port=int(os.getenv("SMTP_PORT", "25")),
+        username=os.getenv("SMTP_USER") or None,
+        password=os.getenv("SMTP_PASSWORD") or None,
+        starttls=os.getenv("SMTP_STARTTLS", "0").lower() in ("1", "true", "yes"),
+        sender=os.getenv("SMTP_FROM", "no-reply@localhost"),
+    )
+
+
+_queue: Optional[NotificationQueue] = None
+_dispatcher: Optional[NotificationDispatcher] = None
+
+
+def queue_path() -> str:
+    return os.path.join(data_dir(), "notifications_queue.jsonl")
+
+
+def get_notification_queue() -> NotificationQueue:
+    global _queue
+    if _queue is None:
+        _queue = NotificationQueue(queue_path())
+        _queue.import_legacy(os.path.join(data_dir(), "notifications_queue.json"))
+    return _queue
+
+
+def enqueue(kind: str, message: Dict[str, Any]) -> str:
+    """Queue one notification (one journal append) and wake the local dispatcher."""
+    msg_id = get_notification_queue().put(dict(message, kind=kind, id=uuid.uuid4().hex, created_at=datetime.utcnow().isoformat()))
+    if _dispatcher is not None:
+        _dispatcher.wake()
+    return msg_id
+
+
+async def start_notification_dispatcher() -> None:
+    global _dispatcher
+    if os.getenv("NOTIFY_DISPATCHER", "1").lower() in ("0", "false", "no"):
+        return
+    _dispatcher = NotificationDispatcher(
+        await run_io(get_notification_queue),
+        {"email": create_email_transport(), "in_app": InAppTransport()},
+        batch_size=int(os.getenv("NOTIFY_BATCH", "50")),
+        concurrency={
+            "email": int(os.getenv("NOTIFY_EMAIL_CONCURRENCY", "4")),
+            "in_app": int(os.getenv("NOTIFY_IN_APP_CONCURRENCY", "8")),
+        },
+        max_attempts=int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5")),
+    )
+    _dispatcher.start()
+
+
+async def stop_notification_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.stop()
+        _dispatcher = None
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import fcntl
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..api.utils import ensure_dir, load_json
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+@contextmanager
+def _flock(path: str, mode: int) -> Iterator[None]:
+    with open(path, "a") as f:
+        fcntl.flock(f, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class NotificationQueue:
+    """Durable queue kept as an append-only journal ``{path}``.
+
+    Producers in any process append one ``enq`` line per message, so
+    enqueueing costs one small write whatever the queue length. One
+    consumer replays the journal into memory (``poll`` reads only what was
+    appended since the last call) and records its outcomes as ``ack`` and
+    ``retry`` lines; a message is delivered at least once until acked.
+    ``compact`` rewrites the journal with only the live messages once acked
+    lines dominate it. Appends hold a shared ``flock`` and compaction an
+    exclusive one, so no append lands in a replaced file.
+    """
+
+    def __init__(self, path: str, compact_bytes: int = 1024 * 1024) -> None:
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.compact_bytes = compact_bytes
+        self._mutex = threading.Lock()
+        self._offset = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._ready: List[Tuple[float, int, str]] = []  # (not_before, seq, id)
+        self._seq = 0
+        self._in_flight: set = set()
+
+    # Producer side
+    @staticmethod
+    def _encode(messages: Iterable[Dict[str, Any]]) -> Tuple[List[str], bytes]:
+        now = time.time()
+        ids: List[str] = []
+        data = b""
+        for message in messages:
+            msg_id = message.get("id") or uuid.uuid4().hex
+            ids.append(msg_id)
+            data += _line({"op": "enq", "id": msg_id, "msg": dict(message, id=msg_id), "attempts": 0, "not_before": now})
+        return ids, data
+
+    def put_many(self, messages: Iterable[Dict[str, Any]]) -> List[str]:
+        ids, data = self._encode(messages)
+        if data:
+            self._append(data)
+        return ids
+
+    def put(self, message: Dict[str, Any]) -> str:
+        return self.put_many([message])[0]
+
+    def _append(self, data: bytes) -> None:
+        ensure_dir(os.path.dirname(self.path))
+        with _flock(self.lock_path, fcntl.LOCK_SH):
+            self._write(data)
+
+    def _write(self, data: bytes) -> None:
+        # One O_APPEND write per batch: concurrent producers never interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    # Consumer side
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op, msg_id = record.get("op"), record.get("id")
+        if op == "enq":
+            self._entries[msg_id] = {"msg": record["msg"], "attempts": record.get("attempts", 0), "not_before": record.get("not_before", 0)}
+            self._push(msg_id)
+        elif op == "retry" and msg_id in self._entries:
+            entry = self._entries[msg_id]
+            entry.update(attempts=record["attempts"], not_before=record["not_before"], error=record.get("error"))
+            self._push(msg_id)
+        elif op == "ack":
+            self._entries.pop(msg_id, None)
+
+    def _push(self, msg_id: str) -> None:
+        self._seq += 1
+        heapq.heappush(self._ready, (self._entries[msg_id]["not_before"], self._seq, msg_id))
+
+    def poll(self) -> int:
+        """Apply lines appended since the last poll; returns how many."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return 0
+        applied = 0
+        with f, self._mutex:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # a producer is mid-write; read it next time
+                self._offset += len(raw)
+                try:
+                    self._apply(json.loads(raw))
+                except (ValueError, KeyError):
+                    continue
+                applied += 1
+        return applied
+
+    def take(self, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Up to ``limit`` due messages, marked in flight until ``ack`` or ``retry``."""
+        now = time.time() if now is None else now
+        out: List[Dict[str, Any]] = []
+        with self._mutex:
+            while self._ready and len(out) < limit and self._ready[0][0] <= now:
+                not_before, _, msg_id = heapq.heappop(self._ready)
+                entry = self._entries.get(msg_id)
+                # Skip stale heap items: acked, rescheduled or already taken
+                if entry is None or entry["not_before"] != not_before or msg_id in self._in_flight:
+                    continue
+                self._in_flight.add(msg_id)
+                out.append(dict(entry["msg"], attempts=entry["attempts"]))
+        return out
+
+    def next_due(self) -> Optional[float]:
+        with self._mutex:
+            return self._ready[0][0] if self._ready else None
+
+    def ack(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        self._append(b"".join(_line({"op": "ack", "id": msg_id}) for msg_id in ids))
+        with self._mutex:
+            for msg_id in ids:
+                self._entries.pop(msg_id, None)
+                self._in_flight.discard(msg_id)
+
+    def retry(self, msg_id: str, attempts: int, not_before: float, error: str) -> None:
+        self._append(_line({"op": "retry", "id": msg_id, "attempts": attempts, "not_before": not_before, "error": error}))
+        with self._mutex:
+            self._in_flight.discard(msg_id)
+            entry = self._entries.get(msg_id)
+            if entry is not None:
+                entry.update(attempts=attempts, not_before=not_before, error=error)
+                self._push(msg_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self._mutex:
+            return [dict(e["msg"], attempts=e["attempts"], not_before=e["not_before"], error=e.get("error")) for e in self._entries.values()]
+
+    def compact(self, force: bool = False) -> bool:
+        """Rewrite the journal with live messages only, when it has grown past
+        ``compact_bytes`` and is mostly acked lines."""
+        if not force and (self._offset < self.compact_bytes or len(self._entries) * 512 > self._offset):
+            return False
+        with _flock(self.lock_path, fcntl.LOCK_EX):
+            self.poll()  # pick up appends made before we got the lock
+            with self._mutex:
+                data = b"".join(
+                    _line({"op": "enq", "id": msg_id, "msg": e["msg"], "attempts": e["attempts"], "not_before": e["not_before"]})
+                    for msg_id, e in self._entries.items()
+                )
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._offset = len(data)
+        return True
+
+    def import_legacy(self, legacy_path: str) -> int:
+        """Move a ``notifications_queue.json`` array into the journal once.
+
+        Every worker calls this at startup, so the check, the import and the
+        rename all happen under the exclusive journal lock: the first worker
+        imports, the others find the file gone and import nothing.
+        """
+        if not os.path.exists(legacy_path):
+            return 0
+        ensure_dir(os.path.dirname(self.path))
+        with _flock(self.lock_path, fcntl.LOCK_EX):
+            if not os.path.exists(legacy_path):
+                return 0
+            items = load_json(legacy_path, [])
+            _, data = self._encode(items)
+            if data:
+                self._write(data)
+            try:
+                os.replace(legacy_path, legacy_path + ".bak")
+            except FileNotFoundError:
+                pass  # already moved aside: treat as imported
+        return len(items)
+
+
+def read_pending(path: str) -> List[Dict[str, Any]]:
+    """Pending messages from a fresh replay of the journal (for admin views
+    in processes that are not the consumer)."""
+    queue = NotificationQueue(path)
+    queue.poll()
+    return queue.pending()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.templating import Jinja2Templates
+
+from ..api.utils import run_io
+from .compression import negotiate, precompress
+
+logger = logging.getLogger(__name__)
+
+View = Optional[Tuple[Any, Any, Any]]
+
+
+class CachedPage:
+    """One rendered page: its precompressed variants and strong ETags."""
+
+    __slots__ = ("variants", "etags")
+
+    def __init__(self, body: bytes, shared: bool = True) -> None:
+        # Shared (anonymous) pages are compressed hard once; per-user ones
+        # only get a quick gzip, since each is built for one reader
+        self.variants = precompress(body) if shared else precompress(body, gzip_level=5, brotli_quality=None)
+        tag = hashlib.sha256(body).hexdigest()[:20]
+        # Strong ETags must differ per encoding, the bytes differ
+        self.etags = {enc: f'"{tag}"' if enc == "identity" else f'"{tag}-{enc}"' for enc in self.variants}
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or not tags.isdisjoint(self.etags.values())
+
+
+class _ViewRequest:
+    """What templates see as ``request``: only the session fields they read."""
+
+    def __init__(self, view: View) -> None:
+        self.session: Dict[str, Any] = {}
+        if view is not None:
+            self.session["user"] = {"username": view[0], "plan": view[1], "role": view[2]}
+
+
+class PageCache:
+    """Page templates rendered once into bytes, per (template, session view).
+
+    Pages take no request data except the signed-in user's name, plan and
+    role in ``base.html``, so that triple (or None for anonymous) is the
+    cache key and a page costs one Jinja render per distinct view. Misses
+    are rendered in the threadpool by ``response``, off the event loop.
+    Entries are evicted LRU beyond ``max_entries``; the whole cache is dropped when
+    a file under the template directories changes, checked at most every
+    ``check_interval`` seconds (0 disables the check), or when one of
+    ``versions`` (e.g. the asset manifest stamp) returns something new.
+    """
+
+    def __init__(
+        self,
+        templates: Jinja2Templates,
+        max_entries: int = 1024,
+        check_interval: float = 2.0,
+        versions: Iterable[Callable[[], Any]] = (),
+    ) -> None:
+        self.env = templates.env
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.versions = list(versions)
+        self._version = self._current_version()
+        self._pages: "OrderedDict[Tuple[str, View], CachedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = self._templates_stamp()
+        self._checked_at = time.monotonic()
+        self.renders = 0
+
+    @staticmethod
+    def view(session: Dict[str, Any]) -> View:
+        user = session.get("user")
+        if not user:
+            return None
+        return (user.get("username"), user.get("plan"), user.get("role"))
+
+    def _templates_stamp(self) -> Tuple[int, int]:
+        latest, count = 0, 0
+        for root in getattr(self.env.loader, "searchpath", []):
+            for dirpath, _, files in os.walk(root):
+                for name in files:
+                    try:
+                        latest = max(latest, os.stat(os.path.join(dirpath, name)).st_mtime_ns)
+                    except FileNotFoundError:
+                        continue
+                    count += 1
+        return latest, count
+
+    def _current_version(self) -> Tuple[Any, ...]:
+        return tuple(fn() for fn in self.versions)
+
+    def _check_templates(self) -> None:
+        version = self._current_version()
+        if version != self._version:
+            with self._lock:
+                self._version = version
+                self._pages.clear()
+        if not self.check_interval or time.monotonic() - self._checked_at < self.check_interval:
+            return
+        self._checked_at = time.monotonic()
+        stamp = self._templates_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                self._stamp = stamp
+                self._pages.clear()
+            logger.info("templates changed: page cache cleared")
+
+    def cached(self, name: str, view: View = None) -> Optional[CachedPage]:
+        self._check_templates()
+        key = (name, view)
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def get(self, name: str, view: View = None) -> CachedPage:
+        page = self.cached(name, view)
+        if page is not None:
+            return page
+        body = self.env.get_template(name).render(request=_ViewRequest(view)).encode("utf-8")
+        page = CachedPage(body, shared=view is None)
+        with self._lock:
+            self.renders += 1
+            self._pages[(name, view)] = page
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def page_templates(self) -> List[str]:
+        return [n for n in self.env.list_templates(extensions=["html"]) if n != "base.html"]
+
+    def warm(self, names: Optional[Iterable[str]] = None) -> None:
+        """Render the anonymous view of every page, so first hits are lookups."""
+        for name in names or self.page_templates():
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception("page cache: rendering %s failed", name)
+
+    async def response(self, name: str, request: Request) -> Response:
+        view = self.view(request.session)
+        page = self.cached(name, view) or await run_io(self.get, name, view)
+        encoding = negotiate(request.headers.get("accept-encoding"), page.variants)
+        headers = {
+            "ETag": page.etags[encoding],
+            "Vary": "Accept-Encoding, Cookie",
+            "Cache-Control": "private, no-cache",
+        }
+        if page.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(page.variants[encoding], media_type="text/html; charset=utf-8", headers=headers)
+
+
+def create_page_cache(templates: Jinja2Templates, versions: Iterable[Callable[[], Any]] = ()) -> PageCache:
+    return PageCache(
+        templates,
+        max_entries=int(os.getenv("PAGE_CACHE_SIZE", "1024")),
+        check_interval=float(os.getenv("PAGE_CACHE_CHECK_INTERVAL", "2")),
+        versions=versions,
+    )
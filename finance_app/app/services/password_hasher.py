@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.hash import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """More hashes are waiting than the pool accepts; retry shortly."""
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.verify(password, hashed)
+
+
+def _rounds(hashed: str) -> Optional[int]:
+    # $2b$12$<salt+digest>
+    parts = hashed.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a bounded worker pool.
+
+    Each bcrypt call costs 100-300 ms of CPU, so it never runs on the event
+    loop. At most ``workers`` run at once (bcrypt releases the GIL, so
+    threads run in parallel; ``pool="process"`` is also supported). Up to
+    ``max_pending`` calls may wait for a worker; a call that cannot get a
+    place within ``queue_timeout`` seconds raises ``PasswordHasherBusy``
+    instead of piling up behind a login burst.
+    """
+
+    def __init__(
+        self,
+        rounds: int = 12,
+        workers: int = 2,
+        max_pending: int = 64,
+        queue_timeout: float = 5.0,
+        pool: str = "thread",
+    ) -> None:
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.pool = pool
+        self._slots = asyncio.Semaphore(workers + max_pending)
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PasswordHasherBusy("password hashing queue is full")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        if not hashed:
+            return False
+        try:
+            return await self._run(_verify, password, hashed)
+        except ValueError:  # not a bcrypt hash
+            return False
+
+    def needs_update(self, hashed: str) -> bool:
+        """True when ``hashed`` was made with a different cost than ``rounds``."""
+        return _rounds(hashed) != self.rounds
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash or None); a new hash is made when the stored cost is outdated."""
+        if not await self.verify(password, hashed):
+            return False, None
+        if self.needs_update(hashed):
+            return True, await self.hash(password)
+        return True, None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def create_password_hasher() -> PasswordHasher:
+    return PasswordHasher(
+        rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+        workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        max_pending=int(os.getenv("PASSWORD_HASH_QUEUE", "64")),
+        queue_timeout=float(os.getenv("PASSWORD_HASH_TIMEOUT", "5")),
+        pool=os.getenv("PASSWORD_HASH_POOL", "thread").lower(),
+    )
+
+
+_hasher: Optional[PasswordHasher] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = create_password_hasher()
+    return _hasher
+
+
+def close_password_hasher() -> None:
+    global _hasher
+    if _hasher is not None:
+        _hasher.close()
+        _hasher = None
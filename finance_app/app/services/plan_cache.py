@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..api.utils import run_io
+from .cache_service import CacheService, MemoryCacheBackend, RedisCacheBackend
+from .redis_client import get_redis
+
+_MISSING = object()
+
+
+def plan_cache_key(model: str, income: float, goals: List[str]) -> str:
+    """Content address of a plan request: goals are trimmed and case-folded, order kept."""
+    canonical = json.dumps(
+        {"model": model, "income": round(float(income), 2), "goals": [g.strip().casefold() for g in goals]},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return "ai:plan:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call.
+
+    Followers await the leader's future, so N simultaneous callers cost one
+    upstream request. Errors are shared too, but a cancelled leader is not:
+    its followers retry and one of them leads. Nothing is remembered after
+    the call finishes. Scope is one event loop (one worker process).
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(result, shared) where ``shared`` is True for followers."""
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # Only the leader was cancelled (its client went away): try
+                # again, the first follower to get here becomes the new leader
+                task = asyncio.current_task()
+                if not future.cancelled() or (task is not None and task.cancelling()):
+                    raise
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+                future.exception()  # mark retrieved when there are no followers
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+
+class PlanCache:
+    """Cached and single-flighted ``AIService.generate_plan`` results.
+
+    Results are keyed by ``plan_cache_key`` and kept for ``ttl`` seconds in
+    their own ``CacheService``, so hit rates are reported apart from other
+    caches. ``get_or_generate`` reports where a plan came from so only
+    requests that reach Gemini are charged AI quota.
+    """
+
+    def __init__(self, cache: Optional[CacheService] = None, ttl: float = 3600) -> None:
+        self.cache = cache if cache is not None else CacheService(MemoryCacheBackend(max_entries=4096))
+        self.ttl = ttl
+        self.flights = SingleFlight()
+        self.coalesced = 0
+        self.upstream = 0
+
+    async def _get(self, key: str) -> Any:
+        if self.cache.blocking:
+            return await run_io(self.cache.get, key, _MISSING)
+        return self.cache.get(key, _MISSING)
+
+    async def _set(self, key: str, value: Any) -> None:
+        if self.cache.blocking:
+            await run_io(self.cache.set, key, value, self.ttl)
+        else:
+            self.cache.set(key, value, self.ttl)
+
+    async def get_or_generate(
+        self,
+        model: str,
+        income: float,
+        goals: List[str],
+        generate: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], str]:
+        """(plan, source) with source ``cache``, ``coalesced`` or ``upstream``."""
+        key = plan_cache_key(model, income, goals)
+        plan = await self._get(key)
+        if plan is not _MISSING:
+            return dict(plan, goals=goals), "cache"
+
+        async def call() -> Dict[str, Any]:
+            result = await generate()
+            self.upstream += 1
+            await self._set(key, result)
+            return result
+
+        plan, shared = await self.flights.do(key, call)
+        if shared:
+            self.coalesced += 1
+        return dict(plan, goals=goals), "coalesced" if shared else "upstream"
+
+    def stats(self) -> Dict[str, Any]:
+        out = self.cache.stats()
+        out["coalesced"] = self.coalesced
+        out["upstream_calls"] = self.upstream
+        requests = out["hits"] + out["misses"]
+        out["upstream_saved_rate"] = round((requests - self.upstream) / requests, 4) if requests else 0.0
+        return out
+
+
+def create_plan_cache(kind: Optional[str] = None) -> PlanCache:
+    kind = (kind or os.getenv("CACHE_BACKEND") or ("redis" if os.getenv("REDIS_URL") else "memory")).lower()
+    ttl = float(os.getenv("PLAN_CACHE_TTL", "3600"))
+    if kind == "redis":
+        return PlanCache(CacheService(RedisCacheBackend(get_redis(), prefix="cache:")), ttl)
+    return PlanCache(CacheService(MemoryCacheBackend(max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "4096")))), ttl)
+
+
+_plan_cache: Optional[PlanCache] = None
+
+
+def get_plan_cache() -> PlanCache:
+    global _plan_cache
+    if _plan_cache is None:
+        _plan_cache = create_plan_cache()
+    return _plan_cache
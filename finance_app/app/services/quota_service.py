@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..api.utils import data_dir, ensure_dir
+from ..storage import get_storage
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# (key, limit, expires_at): one counter per user, quota and period
+_Item = Tuple[str, int, float]
+
+
+def period_window(period: str, now: float) -> Tuple[str, float]:
+    """(label, end) of the UTC ``day`` or ``month`` containing ``now``."""
+    moment = datetime.utcfromtimestamp(now)
+    if period == "day":
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start.strftime("%Y-%m-%d"), (start + timedelta(days=1) - datetime(1970, 1, 1)).total_seconds()
+    if period == "month":
+        start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return start.strftime("%Y-%m"), (end - datetime(1970, 1, 1)).total_seconds()
+    raise ValueError(f"unknown quota period: {period}")
+
+
+def quota_key(prefix: str, username: str, name: str, label: str) -> str:
+    return f"{prefix}{username}:{name}:{label}"
+
+
+def legacy_usage(users: Iterable[Dict[str, Any]], prefix: str, now: float) -> List[_Item]:
+    """Counters for the current periods from the ``plan_usage`` that
+    ``users.json`` kept before quotas moved out of it. A count is only
+    carried over if its ``last_reset_day``/``last_reset_month`` is the
+    current day/month, as the old reset logic would have kept it."""
+    day, day_end = period_window("day", now)
+    month, month_end = period_window("month", now)
+    items = []
+    for user in users:
+        usage = user.get("plan_usage") or {}
+        for name, label, end, current in (
+            ("ai_day", day, day_end, user.get("last_reset_day")),
+            ("ai_month", month, month_end, user.get("last_reset_month")),
+            ("voice_month", month, month_end, user.get("last_reset_month")),
+        ):
+            count = int(usage.get(name) or 0)
+            if count > 0 and current == label:
+                items.append((quota_key(prefix, user.get("username"), name, label), count, end))
+    return items
+
+
+@dataclass(frozen=True)
+class QuotaRule:
+    name: str  # usage field, e.g. "ai_month"
+    period: str  # "day" or "month"
+    limit: int  # negative means unlimited
+
+
+@dataclass
+class QuotaDecision:
+    allowed: bool
+    exceeded: Optional[str] = None  # name of the first rule over its limit
+    usage: Dict[str, int] = field(default_factory=dict)
+    started: List[str] = field(default_factory=list)  # counters this call opened for a new period
+    keys: Tuple[str, ...] = ()  # counters charged, for ``QuotaService.refund``
+    amount: int = 0
+
+
+class MemoryQuotaBackend:
+    """Per-process counters. Check and increment of all rules happen under
+    one lock; counters of past periods are dropped as new ones are created."""
+
+    blocking = False
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[float]] = {}  # key -> [count, expires_at]
+        self._next_sweep = 0.0
+
+    def _get(self, key: str, now: float) -> int:
+        entry = self._counts.get(key)
+        return int(entry[0]) if entry is not None and entry[1] > now else 0
+
+    def _sweep(self, now: float) -> None:
+        if now >= self._next_sweep:
+            self._counts = {k: v for k, v in self._counts.items() if v[1] > now}
+            self._next_sweep = now + 60
+
+    def consume(self, items: Sequence[_Item], amount: int) -> Tuple[Optional[int], Optional[List[int]]]:
+        """(index of the first rule over its limit or None, counts after the call)."""
+        now = self._clock()
+        with self._lock:
+            self._sweep(now)
+            counts = [self._get(key, now) for key, _, _ in items]
+            for index, ((_, limit, _), count) in enumerate(zip(items, counts)):
+                if limit >= 0 and count + amount > limit:
+                    return index, counts
+            for (key, _, expires_at), count in zip(items, counts):
+                self._counts[key] = [count + amount, expires_at]
+            return None, [count + amount for count in counts]
+
+    def get(self, keys: Sequence[str]) -> List[int]:
+        now = self._clock()
+        with self._lock:
+            return [self._get(key, now) for key in keys]
+
+    def release(self, keys: Sequence[str], amount: int) -> None:
+        now = self._clock()
+        with self._lock:
+            for key in keys:
+                entry = self._counts.get(key)
+                if entry is not None and entry[1] > now:
+                    entry[0] = max(0, entry[0] - amount)
+
+
+_QUOTA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota_counters (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SQLiteQuotaBackend:
+    """Counters in a SQLite file, shared by every worker on the host and
+    kept across restarts; the default without Redis. Each ``consume`` is one
+    ``BEGIN IMMEDIATE`` transaction, so checks and increments from all
+    workers are serialised. ``seed`` is called once per database, the first
+    time it is used, to import existing usage as (key, count, expires_at).
+    Fails open, like the Redis backend, if the database cannot be written.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        clock: Callable[[], float] = time.time,
+        seed: Optional[Callable[[], Iterable[_Item]]] = None,
+    ) -> None:
+        self.path = path
+        self._clock = clock
+        self._seed = seed
+        self._local = threading.local()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            ensure_dir(os.path.dirname(os.path.abspath(self.path)))
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    self._setup(conn)
+                    self._ready = True
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        conn.executescript(_QUOTA_SCHEMA)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM quota_meta WHERE name = 'seeded'").fetchone():
+                return
+            if self._seed is not None:
+                now = self._clock()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO quota_counters (key, count, expires_at) VALUES (?, ?, ?)",
+                    [item for item in self._seed() if item[2] > now],
+                )
+            conn.execute("INSERT INTO quota_meta (name, value) VALUES ('seeded', ?)", (str(self._clock()),))
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, key: str, now: float) -> int:
+        row = conn.execute("SELECT count FROM quota_counters WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return int(row[0]) if row else 0
+
+    def consume(self, items: Sequence[_Item], amount: int) -> Tuple[Optional[int], Optional[List[int]]]:
+        """As ``MemoryQuotaBackend.consume``; counts are None when it failed open."""
+        now = self._clock()
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if now >= self._next_sweep:
+                    conn.execute("DELETE FROM quota_counters WHERE expires_at <= ?", (now,))
+                    self._next_sweep = now + 60
+                counts = [self._get(conn, key, now) for key, _, _ in items]
+                for index, ((_, limit, _), count) in enumerate(zip(items, counts)):
+                    if limit >= 0 and count + amount > limit:
+                        return index, counts
+                conn.executemany(
+                    "INSERT INTO quota_counters (key, count, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET count = excluded.count, expires_at = excluded.expires_at",
+                    [(key, count + amount, expires_at) for (key, _, expires_at), count in zip(items, counts)],
+                )
+            return None, [count + amount for count in counts]
+        except sqlite3.Error as exc:
+            logger.warning("quota backend unavailable: %s", exc)
+            return None, None
+
+    def get(self, keys: Sequence[str]) -> List[int]:
+        now = self._clock()
+        conn = self._conn()
+        return [self._get(conn, key, now) for key in keys]
+
+    def release(self, keys: Sequence[str], amount: int) -> None:
+        now = self._clock()
+        try:
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    "UPDATE quota_counters SET count = MAX(0, count - ?) WHERE key = ? AND expires_at > ?",
+                    [(amount, key, now) for key in keys],
+                )
+        except sqlite3.Error as exc:
+            logger.warning("quota refund failed: %s", exc)
+
+
+class RedisQuotaBackend:
+    """Counters shared by all workers: ``INCRBY`` each rule's key, ``EXPIRE``
+    it at the end of its period, and take the increments back if any rule is
+    over its limit. Every increment returns a distinct value, so concurrent
+    requests can never both get the last unit. Fails open if Redis is down,
+    after undoing whatever it had already charged.
+    """
+
+    blocking = True
+
+    def __init__(self, client: Any, clock: Callable[[], float] = time.time) -> None:
+        self.client = client
+        self._clock = clock
+
+    def consume(self, items: Sequence[_Item], amount: int) -> Tuple[Optional[int], Optional[List[int]]]:
+        """As ``MemoryQuotaBackend.consume``; counts are None when it failed
+        open and nothing is charged."""
+        charged: List[str] = []
+        counts: List[int] = []
+        try:
+            for index, (key, limit, expires_at) in enumerate(items):
+                count = int(self.client.incrby(key, amount))
+                charged.append(key)
+                if count == amount:
+                    self.client.pexpire(key, max(1, int((expires_at - self._clock()) * 1000)))
+                if limit >= 0 and count > limit:
+                    self.release(charged, amount)
+                    return index, counts + [count - amount]
+                counts.append(count)
+        except Exception as exc:
+            logger.warning("quota backend unavailable: %s", exc)
+            self.release(charged, amount)
+            return None, None
+        return None, counts
+
+    def get(self, keys: Sequence[str]) -> List[int]:
+        return [int(self.client.get(key) or 0) for key in keys]
+
+    def release(self, keys: Sequence[str], amount: int) -> None:
+        for key in keys:
+            try:
+                self.client.incrby(key, -amount)
+            except Exception as exc:
+                logger.warning("quota refund failed: %s", exc)
+
+
+class QuotaService:
+    """Per-user usage counters keyed by (user, quota, period).
+
+    The period is part of the key (``quota:alice:ai_day:2024-05-01``), so a
+    new day or month starts from zero without any reset write, and old
+    counters expire on their own. ``consume`` checks every rule and charges
+    all of them in one atomic step, or charges nothing.
+    """
+
+    def __init__(self, backend: Any = None, prefix: str = "quota:", clock: Callable[[], float] = time.time) -> None:
+        self.backend = backend if backend is not None else MemoryQuotaBackend(clock=clock)
+        self.prefix = prefix
+        self._clock = clock
+
+    @property
+    def blocking(self) -> bool:
+        return getattr(self.backend, "blocking", False)
+
+    def _items(self, username: str, rules: Sequence[QuotaRule]) -> List[_Item]:
+        now = self._clock()
+        items = []
+        for rule in rules:
+            label, end = period_window(rule.period, now)
+            items.append((quota_key(self.prefix, username, rule.name, label), rule.limit, end))
+        return items
+
+    def consume(self, username: str, rules: Sequence[QuotaRule], amount: int = 1) -> QuotaDecision:
+        items = self._items(username, rules)
+        exceeded, counts = self.backend.consume(items, amount)
+        if counts is None:
+            return QuotaDecision(True)  # failed open: nothing charged, nothing to refund
+        usage = {rule.name: count for rule, count in zip(rules, counts)}
+        if exceeded is not None:
+            return QuotaDecision(False, rules[exceeded].name, usage)
+        started = [rule.name for rule, count in zip(rules, counts) if count == amount]
+        return QuotaDecision(True, None, usage, started, tuple(key for key, _, _ in items), amount)
+
+    def refund(self, decision: QuotaDecision) -> None:
+        """Give back what ``decision`` charged (a no-op for rejected ones)."""
+        if decision.keys:
+            self.backend.release(decision.keys, decision.amount)
+
+    def usage(self, username: str, rules: Sequence[QuotaRule]) -> Dict[str, int]:
+        counts = self.backend.get([key for key, _, _ in self._items(username, rules)])
+        return {rule.name: count for rule, count in zip(rules, counts)}
+
+    def check(self, username: str, rules: Sequence[QuotaRule]) -> Optional[str]:
+        """Name of the first rule already at its limit, without charging."""
+        usage = self.usage(username, rules)
+        for rule in rules:
+            if rule.limit >= 0 and usage[rule.name] >= rule.limit:
+                return rule.name
+        return None
+
+
+def create_quota_service(kind: Optional[str] = None) -> QuotaService:
+    kind = (kind or os.getenv("QUOTA_BACKEND") or ("redis" if os.getenv("REDIS_URL") else "sqlite")).lower()
+    if kind == "redis":
+        return QuotaService(RedisQuotaBackend(get_redis()))
+    if kind == "memory":
+        return QuotaService(MemoryQuotaBackend())
+    path = os.getenv("QUOTA_DB") or os.path.join(data_dir(), "quota.db")
+    return QuotaService(SQLiteQuotaBackend(path, seed=lambda: legacy_usage(get_storage().list_users(), "quota:", time.time())))
+
+
+_quota_service: Optional[QuotaService] = None
+
+
+def get_quota_service() -> QuotaService:
+    global _quota_service
+    if _quota_service is None:
+        _quota_service = create_quota_service()
+    return _quota_service
+
+
+def set_quota_service(service: QuotaService) -> None:
+    global _quota_service
+    _quota_service = service
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RateDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int  # seconds; 0 when allowed
+    counted: Optional[int] = None  # window index the request was counted in, for ``undo``
+
+
+def _estimate(prev: int, curr: int, elapsed: float, window: float) -> float:
+    """Sliding-window-counter estimate: the previous window's count is
+    weighted by how much of it still overlaps the trailing window."""
+    return prev * (1.0 - elapsed / window) + curr
+
+
+def _retry_after(prev: int, curr: int, elapsed: float, window: float, limit: int) -> int:
+    """Seconds until one more request fits (estimate <= limit - 1) if no more arrive."""
+    room = limit - 1
+    if curr <= room:
+        # Still inside this window: wait for enough of ``prev`` to slide out
+        wait = window * (1.0 - (room - curr) / prev) - elapsed if prev else 0.0
+    else:
+        # Next window: ``curr`` becomes the weighted previous count
+        wait = (window - elapsed) + window * (1.0 - room / curr)
+    return max(1, math.ceil(wait))
+
+
+def _decide(prev: int, curr: int, elapsed: float, window: float, limit: int) -> Tuple[RateDecision, bool]:
+    """Decision for one more request; the bool says whether to count it."""
+    if limit <= 0:
+        return RateDecision(False, limit, 0, max(1, math.ceil(window))), False
+    estimate = _estimate(prev, curr, elapsed, window)
+    if estimate + 1 > limit:
+        return RateDecision(False, limit, 0, _retry_after(prev, curr, elapsed, window, limit)), False
+    return RateDecision(True, limit, max(0, int(limit - estimate - 1)), 0), True
+
+
+class MemoryRateLimitBackend:
+    """Per-process counters: one small record per key in an LRU.
+
+    Keys idle for two windows no longer affect any decision and are evicted
+    as new requests arrive, and ``max_keys`` bounds the table under scanning
+    traffic.
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000, clock: Callable[[], float] = time.time) -> None:
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> [window index, previous count, current count, window seconds, last seen]
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def hit(self, key: str, limit: int, window: float) -> RateDecision:
+        now = self._clock()
+        idx = int(now // window)
+        elapsed = now - idx * window
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [idx, 0, 0, window, now]
+            else:
+                self._entries.move_to_end(key)
+                if entry[0] != idx:
+                    entry[1] = entry[2] if entry[0] == idx - 1 else 0
+                    entry[0], entry[2] = idx, 0
+            entry[4] = now
+            decision, count = _decide(int(entry[1]), int(entry[2]), elapsed, window, limit)
+            if count:
+                entry[2] += 1
+                decision.counted = idx
+            self._evict(now)
+        return decision
+
+    def undo(self, key: str, window: float, decision: RateDecision) -> None:
+        """Take back the request ``decision`` counted."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or decision.counted is None:
+                return
+            if entry[0] == decision.counted:
+                entry[2] = max(0, entry[2] - 1)
+            elif entry[0] == decision.counted + 1:
+                entry[1] = max(0, entry[1] - 1)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_keys and now - entry[4] < 2 * entry[3]:
+                break
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisRateLimitBackend:
+    """Shared counters across workers: ``{prefix}{key}:{window index}`` integers.
+
+    Each window key expires after two windows, so Redis memory per client is
+    two small integers. Works with redis-py or ``InMemoryRedis``. If Redis is
+    unreachable the request is allowed (fail open) and the error is logged.
+    """
+
+    blocking = True  # network round trips; callers on the event loop use run_io
+
+    def __init__(self, client: Any, prefix: str = "rl:", clock: Callable[[], float] = time.time) -> None:
+        self.client = client
+        self.prefix = prefix
+        self._clock = clock
+
+    def hit(self, key: str, limit: int, window: float) -> RateDecision:
+        now = self._clock()
+        idx = int(now // window)
+        elapsed = now - idx * window
+        base = f"{self.prefix}{key}:"
+        curr_key = base + str(idx)
+        try:
+            # Count first so concurrent workers never both take the last slot,
+            # then give the slot back if the request is rejected.
+            curr = int(self.client.incr(curr_key))
+            if curr == 1:
+                self.client.pexpire(curr_key, int(window * 2000))
+            prev = int(self.client.get(base + str(idx - 1)) or 0)
+            decision, count = _decide(prev, curr - 1, elapsed, window, limit)
+            if count:
+                decision.counted = idx
+            else:
+                self.client.incrby(curr_key, -1)
+        except Exception as exc:
+            logger.warning("rate limit backend unavailable: %s", exc)
+            return RateDecision(True, limit, limit, 0)
+        return decision
+
+    def undo(self, key: str, window: float, decision: RateDecision) -> None:
+        if decision.counted is None or decision.counted < int(self._clock() // window) - 1:
+            return  # nothing counted, or the window key has expired
+        try:
+            self.client.incrby(f"{self.prefix}{key}:{decision.counted}", -1)
+        except Exception as exc:
+            logger.warning("rate limit undo failed: %s", exc)
+
+
+class RateLimiter:
+    def __init__(self, backend: Any = None) -> None:
+        self.backend = backend if backend is not None else MemoryRateLimitBackend()
+
+    @property
+    def blocking(self) -> bool:
+        return getattr(self.backend, "blocking", False)
+
+    def hit(self, key: str, limit: int, window: float = 60) -> RateDecision:
+        return self.backend.hit(key, limit, window)
+
+    def hit_many(self, checks: Sequence[Tuple[str, int]], window: float = 60) -> List[RateDecision]:
+        """Hit each (key, limit) in order and stop at the first rejection,
+        which is then the last decision. The hits already counted are taken
+        back, so a rejected request uses up no other budget."""
+        decisions: List[RateDecision] = []
+        for key, limit in checks:
+            decision = self.backend.hit(key, limit, window)
+            decisions.append(decision)
+            if not decision.allowed:
+                for (earlier, _), counted in zip(checks, decisions[:-1]):
+                    self.backend.undo(earlier, window, counted)
+                break
+        return decisions
+
+
+def create_rate_limiter(kind: Optional[str] = None) -> RateLimiter:
+    kind = (kind or os.getenv("RATE_LIMIT_BACKEND") or ("redis" if os.getenv("REDIS_URL") else "memory")).lower()
+    if kind == "redis":
+        return RateLimiter(RedisRateLimitBackend(get_redis()))
+    return RateLimiter(MemoryRateLimitBackend(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))))
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = create_rate_limiter()
+    return _limiter
+
+
+def set_rate_limiter(limiter: RateLimiter) -> None:
+    global _limiter
+    _limiter = limiter
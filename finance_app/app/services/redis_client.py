@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_client: Any = None
+_client_url: Optional[str] = None
+
+
+def get_redis(url: Optional[str] = None) -> Any:
+    """Shared redis-py client for ``REDIS_URL``, or None when Redis is not configured."""
+    global _client, _client_url
+    url = url or os.getenv("REDIS_URL")
+    if not url:
+        return None
+    if _client is None or _client_url != url:
+        import redis
+
+        _client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        _client_url = url
+    return _client
+
+
+class InMemoryRedis:
+    """Single-process stand-in for the subset of redis-py commands the app uses.
+
+    Values are stored as bytes like the real client returns them. Intended for
+    tests, benchmarks and running without a Redis server.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    def _live(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None, px: Optional[int] = None, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return False
+            ttl = px / 1000.0 if px is not None else ex
+            self._data[key] = (self._encode(value), time.monotonic() + ttl if ttl is not None else None)
+            return True
+
+    def getdel(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._live(key)
+            self._data.pop(key, None)
+            return value
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                key = key.decode("utf-8") if isinstance(key, bytes) else key
+                if self._live(key) is not None:
+                    removed += 1
+                self._data.pop(key, None)
+            return removed
+
+    def exists(self, key: str) -> int:
+        with self._lock:
+            return int(self._live(key) is not None)
+
+    def incrby(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            current = self._live(key)
+            expires_at = self._data[key][1] if current is not None else None
+            value = int(current or 0) + amount
+            self._data[key] = (self._encode(value), expires_at)
+            return value
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.incrby(key, amount)
+
+    def expire(self, key: str, seconds: int) -> bool:
+        return self.pexpire(key, int(seconds * 1000))
+
+    def pexpire(self, key: str, milliseconds: int) -> bool:
+        with self._lock:
+            value = self._live(key)
+            if value is None:
+                return False
+            self._data[key] = (value, time.monotonic() + milliseconds / 1000.0)
+            return True
+
+    def pttl(self, key: str) -> int:
+        with self._lock:
+            if self._live(key) is None:
+                return -2
+            expires_at = self._data[key][1]
+            if expires_at is None:
+                return -1
+            return int((expires_at - time.monotonic()) * 1000)
+
+    def ttl(self, key: str) -> int:
+        pttl = self.pttl(key)
+        return pttl if pttl < 0 else pttl // 1000
+
+    def keys(self, pattern: str = "*") -> List[bytes]:
+        with self._lock:
+            return [k.encode("utf-8") for k in list(self._data) if self._live(k) is not None and fnmatch.fnmatchcase(k, pattern)]
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None) -> Iterator[bytes]:
+        """Matching keys from a snapshot; ``count`` is accepted for parity with redis-py."""
+        yield from self.keys(match or "*")
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._data.clear()
+            return True
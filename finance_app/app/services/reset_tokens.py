@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from ..api.utils import data_dir, dump_json, ensure_dir, file_stamp, load_json, path_lock, read_json, run_io
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class ResetTokenError(Exception):
+    """The token is unknown, already used or expired; ``str()`` is the API message."""
+
+
+def hash_token(token: str) -> str:
+    """Tokens are stored by SHA-256 only, so a leaked store cannot reset passwords."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _normalise(data: Any) -> Dict[str, Dict[str, Any]]:
+    """``{hash: {username, expires_at}}``; converts the legacy list of plain tokens."""
+    if isinstance(data, dict):
+        return data
+    out: Dict[str, Dict[str, Any]] = {}
+    for item in data or []:
+        try:
+            expires_at = (datetime.fromisoformat(item["expires_at"]) - datetime(1970, 1, 1)).total_seconds()
+            out[hash_token(item["token"])] = {"username": item["username"], "expires_at": expires_at}
+        except (KeyError, TypeError, ValueError):
+            continue
+    return out
+
+
+class JsonResetTokenBackend:
+    """Tokens in one JSON object keyed by token hash.
+
+    Lookups go through an in-memory copy that is reloaded only when the file
+    changes, so an unknown token is rejected without a write. Every write
+    also drops expired records, and ``sweep`` does so in bulk once the
+    earliest expiry has passed, so the file holds live tokens only.
+    """
+
+    blocking = True
+    needs_sweep = True
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stamp: Any = None
+        self._tokens: Dict[str, Dict[str, Any]] = {}
+        self._next_expiry = math.inf
+
+    def _remember(self, tokens: Dict[str, Dict[str, Any]]) -> None:
+        self._tokens = tokens
+        self._next_expiry = min((t["expires_at"] for t in tokens.values()), default=math.inf)
+        self._stamp = file_stamp(self.path)
+
+    def _view(self) -> Dict[str, Dict[str, Any]]:
+        stamp = file_stamp(self.path)
+        with self._lock:
+            if stamp != self._stamp:
+                self._remember(_normalise(read_json(self.path, {})))
+            return self._tokens
+
+    def _write(self, fn: Callable[[Dict[str, Dict[str, Any]]], Any]) -> Dict[str, Any]:
+        """Apply ``fn`` to the stored tokens and drop expired ones, in one write."""
+        result: Dict[str, Any] = {"swept": 0}
+        ensure_dir(os.path.dirname(self.path))
+        with path_lock(self.path).write():
+            tokens = _normalise(load_json(self.path, {}))
+            result["value"] = fn(tokens)
+            now = self.clock()
+            for key in [k for k, t in tokens.items() if t["expires_at"] <= now]:
+                del tokens[key]
+                result["swept"] += 1
+            dump_json(self.path, tokens)
+            with self._lock:
+                self._remember(tokens)
+        return result
+
+    def put(self, token_hash: str, username: str, expires_at: float) -> None:
+        self._write(lambda tokens: tokens.__setitem__(token_hash, {"username": username, "expires_at": expires_at}))
+
+    def peek(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        return self._view().get(token_hash)
+
+    def take(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        if token_hash not in self._view():
+            return None
+        return self._write(lambda tokens: tokens.pop(token_hash, None))["value"]
+
+    def sweep(self) -> int:
+        self._view()
+        if self.clock() < self._next_expiry:
+            return 0
+        return self._write(lambda tokens: None)["swept"]
+
+    def __len__(self) -> int:
+        return len(self._view())
+
+
+class RedisResetTokenBackend:
+    """``SET {prefix}{hash} username EX ttl``: Redis expires tokens itself and
+    ``GETDEL`` makes consumption single-use across workers."""
+
+    blocking = True
+    needs_sweep = False
+
+    def __init__(self, client: Any, prefix: str = "reset:", clock: Callable[[], float] = time.time) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+
+    def put(self, token_hash: str, username: str, expires_at: float) -> None:
+        self.client.set(self.prefix + token_hash, username, ex=max(1, math.ceil(expires_at - self.clock())))
+
+    def peek(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        value = self.client.get(self.prefix + token_hash)
+        if value is None:
+            return None
+        return {"username": value.decode("utf-8") if isinstance(value, bytes) else value, "expires_at": None}
+
+    def take(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        value = self.client.getdel(self.prefix + token_hash)
+        if value is None:
+            return None
+        return {"username": value.decode("utf-8") if isinstance(value, bytes) else value, "expires_at": None}
+
+    def sweep(self) -> int:
+        return 0
+
+
+class ResetTokenStore:
+    def __init__(self, backend: Any, ttl: float = 3600, clock: Callable[[], float] = time.time) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.clock = clock
+
+    @property
+    def blocking(self) -> bool:
+        return getattr(self.backend, "blocking", False)
+
+    def issue(self, username: str) -> str:
+        token = secrets.token_urlsafe(24)
+        self.backend.put(hash_token(token), username, self.clock() + self.ttl)
+        return token
+
+    def _username(self, record: Optional[Dict[str, Any]]) -> str:
+        if record is None:
+            raise ResetTokenError("Invalid token")
+        if record.get("expires_at") is not None and record["expires_at"] <= self.clock():
+            raise ResetTokenError("Token expired")
+        return record["username"]
+
+    def check(self, token: str) -> str:
+        """Username the token was issued for, without using it up: a cheap
+        lookup to reject bad tokens before any expensive work."""
+        return self._username(self.backend.peek(hash_token(token)))
+
+    def consume(self, token: str) -> str:
+        """Username the token was issued for; the token is removed either way."""
+        return self._username(self.backend.take(hash_token(token)))
+
+    def sweep(self) -> int:
+        return self.backend.sweep()
+
+
+def create_reset_token_store(kind: Optional[str] = None) -> ResetTokenStore:
+    kind = (kind or os.getenv("RESET_TOKEN_BACKEND") or ("redis" if os.getenv("REDIS_URL") else "json")).lower()
+    ttl = float(os.getenv("RESET_TOKEN_TTL", "3600"))
+    if kind == "redis":
+        return ResetTokenStore(RedisResetTokenBackend(get_redis()), ttl)
+    return ResetTokenStore(JsonResetTokenBackend(os.path.join(data_dir(), "password_resets.json")), ttl)
+
+
+_store: Optional[ResetTokenStore] = None
+_sweeper: Optional["asyncio.Task[None]"] = None
+
+
+def get_reset_tokens() -> ResetTokenStore:
+    global _store
+    if _store is None:
+        _store = create_reset_token_store()
+    return _store
+
+
+def set_reset_tokens(store: Optional[ResetTokenStore]) -> None:
+    global _store
+    _store = store
+
+
+async def _sweep_forever(interval: float) -> None:
+    while True:
+        try:
+            swept = await run_io(get_reset_tokens().sweep)
+            if swept:
+                logger.info("reset tokens: swept %d expired", swept)
+        except Exception:
+            logger.exception("reset token sweep failed")
+        await asyncio.sleep(interval)
+
+
+async def start_reset_token_sweeper() -> None:
+    global _sweeper
+    store = get_reset_tokens()
+    if getattr(store.backend, "needs_sweep", False) and _sweeper is None:
+        _sweeper = asyncio.get_running_loop().create_task(_sweep_forever(float(os.getenv("RESET_TOKEN_SWEEP_INTERVAL", "600"))))
+
+
+async def stop_reset_token_sweeper() -> None:
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
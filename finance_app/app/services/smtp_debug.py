@@ -0,0 +1,120 @@
+"""Local SMTP server that accepts every message and keeps or prints it.
+
+A stand-in for a real mail server in development, tests and benchmarks::
+
+    python -m finance_app.app.services.smtp_debug --port 1025
+    export SMTP_HOST=127.0.0.1 SMTP_PORT=1025
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from typing import List, Optional, Tuple
+
+
+class SmtpDebugServer:
+    """Minimal SMTP (HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) on asyncio.
+
+    Received messages are appended to ``messages`` as (sender, recipients,
+    data); with ``echo`` they are also printed. ``fail_rate`` rejects that
+    share of messages with a temporary 451 so retries can be exercised.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, echo: bool = False, keep: bool = True, fail_rate: float = 0.0) -> None:
+        self.host = host
+        self.port = port
+        self.echo = echo
+        self.keep = keep
+        self.fail_rate = fail_rate
+        self.messages: List[Tuple[str, List[str], bytes]] = []
+        self.received = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "SmtpDebugServer":
+        self._server = await asyncio.start_server(self._session, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        sender, recipients = "", []
+        await reply("220 smtp-debug ready")
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                command = raw.decode("utf-8", "replace").strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    await reply("250-smtp-debug\r\n250-8BITMIME\r\n250 SMTPUTF8")
+                elif verb == "HELO":
+                    await reply("250 smtp-debug")
+                elif verb == "MAIL":
+                    sender, recipients = command[10:].strip().split(" ")[0].strip("<>"), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command[8:].strip().split(" ")[0].strip("<>"))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while True:
+                        line = await reader.readline()
+                        if not line or line in (b".\r\n", b".\n"):
+                            break
+                        lines.append(line[1:] if line.startswith(b"..") else line)
+                    self.received += 1
+                    if self.fail_rate and (self.received * self.fail_rate) % 1 < self.fail_rate:
+                        await reply("451 Temporary failure, try again")
+                        continue
+                    data = b"".join(lines)
+                    if self.keep:
+                        self.messages.append((sender, recipients, data))
+                    if self.echo:
+                        print(f"---------- from={sender} to={','.join(recipients)}\n{data.decode('utf-8', 'replace')}")
+                    await reply("250 OK queued")
+                elif verb == "RSET":
+                    sender, recipients = "", []
+                    await reply("250 OK")
+                elif verb == "NOOP":
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(host: str, port: int) -> None:
+    server = await SmtpDebugServer(host, port, echo=True, keep=False).start()
+    print(f"SMTP debug server on {host}:{server.port}")
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print every message sent to a local SMTP port")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
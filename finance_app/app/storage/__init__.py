@@ -0,0 +1,63 @@
+import os
+from typing import Any, Optional
+
+from ..api.utils import data_dir, run_io
+from .base import StorageBackend
+from .json_backend import JsonStorage
+from .sqlite_backend import SQLiteStorage
+
+_storage: Optional[StorageBackend] = None
+
+
+def create_storage(kind: Optional[str] = None) -> StorageBackend:
+    kind = (kind or os.getenv("STORAGE_BACKEND", "json")).lower()
+    if kind == "sqlite":
+        return SQLiteStorage(os.getenv("SQLITE_PATH", os.path.join(data_dir(), "finance.db")))
+    if kind == "json":
+        return JsonStorage()
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+def set_storage(storage: StorageBackend) -> None:
+    global _storage
+    _storage = storage
+
+
+class AsyncStorage:
+    """Awaitable view of a backend: every method call runs in the threadpool."""
+
+    def __init__(self, backend: StorageBackend) -> None:
+        self.backend = backend
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await run_io(attr, *args, **kwargs)
+
+        return call
+
+
+def get_async_storage() -> AsyncStorage:
+    return AsyncStorage(get_storage())
+
+
+__all__ = [
+    "AsyncStorage",
+    "StorageBackend",
+    "JsonStorage",
+    "SQLiteStorage",
+    "create_storage",
+    "get_async_storage",
+    "get_storage",
+    "set_storage",
+]
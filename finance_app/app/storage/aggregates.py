@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def _amount(row: Dict[str, Any]) -> float:
+    return float(row.get("amount", 0) or 0)
+
+
+@dataclass
+class MonthSummary:
+    """Running aggregates for one user-month of expenses.
+
+    ``add``/``remove`` keep totals exact in O(1). Removing the current
+    minimum or maximum cannot be undone incrementally, so it marks the
+    extrema stale and the owner rebuilds them from the rows on next read.
+    Category and day buckets carry a row count so empty buckets disappear.
+    """
+
+    total: float = 0.0
+    count: int = 0
+    categories: Dict[str, List[float]] = field(default_factory=dict)  # name -> [sum, count]
+    days: Dict[str, List[float]] = field(default_factory=dict)  # YYYY-MM-DD -> [sum, count]
+    min: Optional[float] = None
+    max: Optional[float] = None
+    extrema_stale: bool = False
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]]) -> "MonthSummary":
+        summary = cls()
+        for row in rows:
+            summary.add(row)
+        return summary
+
+    @staticmethod
+    def _bump(buckets: Dict[str, List[float]], key: Any, amount: float, n: int) -> None:
+        bucket = buckets.setdefault(key, [0.0, 0])
+        bucket[0] += amount
+        bucket[1] += n
+        if bucket[1] <= 0:
+            del buckets[key]
+
+    def add(self, row: Dict[str, Any]) -> None:
+        amt = _amount(row)
+        self.total += amt
+        self.count += 1
+        self._bump(self.categories, row.get("category", "Other"), amt, 1)
+        self._bump(self.days, row.get("date") or "", amt, 1)
+        if not self.extrema_stale:
+            self.min = amt if self.min is None else min(self.min, amt)
+            self.max = amt if self.max is None else max(self.max, amt)
+
+    def remove(self, row: Dict[str, Any]) -> None:
+        amt = _amount(row)
+        self.count -= 1
+        if self.count <= 0:
+            self.total, self.count = 0.0, 0
+            self.categories, self.days = {}, {}
+            self.min = self.max = None
+            self.extrema_stale = False
+            return
+        self.total -= amt
+        self._bump(self.categories, row.get("category", "Other"), -amt, -1)
+        self._bump(self.days, row.get("date") or "", -amt, -1)
+        if amt == self.min or amt == self.max:
+            self.extrema_stale = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "count": self.count,
+            "categories": self.categories,
+            "days": self.days,
+            "min": self.min,
+            "max": self.max,
+            "extrema_stale": self.extrema_stale,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MonthSummary":
+        return cls(
+            total=float(data.get("total", 0.0)),
+            count=int(data.get("count", 0)),
+            categories={k: list(v) for k, v in (data.get("categories") or {}).items()},
+            days={k: list(v) for k, v in (data.get("days") or {}).items()},
+            min=data.get("min"),
+            max=data.get("max"),
+            extrema_stale=bool(data.get("extrema_stale", False)),
+        )
+
+    def as_response(self, month: str) -> Dict[str, Any]:
+        return {
+            "month": month,
+            "total": self.total,
+            "by_category": {k: v[0] for k, v in self.categories.items()},
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "by_day": {k: v[0] for k, v in sorted(self.days.items())},
+        }
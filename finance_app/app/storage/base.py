@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .aggregates import MonthSummary
+from .query import ExpenseFilter, ExpensePage
+
+
+class StorageBackend(ABC):
+    """Persistence interface used by the API routers.
+
+    Expenses are addressed by (username, month) where month is ``YYYY-MM``;
+    listings are returned newest first, matching the original JSON layout.
+    Every stored row carries a stable string ``id`` assigned on insert.
+    Per-user documents (goals, categories, budgets, chat history) are keyed by
+    the name the JSON backend uses for the file, e.g. ``budget_2025-09``.
+    """
+
+    name = "base"
+
+    # Users
+    @abstractmethod
+    def list_users(self) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def user_exists(self, username: Optional[str] = None, email: Optional[str] = None) -> bool:
+        return bool(
+            (username is not None and self.get_user(username))
+            or (email is not None and self.get_user_by_email(email))
+        )
+
+    @abstractmethod
+    def save_users(self, users: List[Dict[str, Any]]) -> None:
+        """Insert or replace the given users, matched by username."""
+
+    def save_user(self, user: Dict[str, Any]) -> None:
+        self.save_users([user])
+
+    @abstractmethod
+    def create_user(self, user: Dict[str, Any], referrer: Optional[str] = None, referral_points: int = 0) -> bool:
+        """Insert ``user`` unless its username or email is taken, atomically.
+
+        When ``referrer`` names an existing user, both get ``referral_points``
+        in the same write. Returns False if the user already exists.
+        """
+
+    @abstractmethod
+    def update_user(self, username: str, fields: Dict[str, Any], expect: Optional[Dict[str, Any]] = None) -> bool:
+        """Set ``fields`` on the stored record, leaving the rest as stored.
+
+        With ``expect``, nothing is written unless the stored record still has
+        those values. Returns False if the user is missing or did not match.
+        """
+
+    # Expenses
+    @abstractmethod
+    def list_expenses(self, username: str, month: str) -> List[Dict[str, Any]]:
+        ...
+
+    def iter_expenses(self, username: str, month: str) -> Iterator[Dict[str, Any]]:
+        """Newest-first rows of one month, for consumers that stream."""
+        return iter(self.list_expenses(username, month))
+
+    def query_expenses(
+        self,
+        username: str,
+        month: str,
+        flt: Optional[ExpenseFilter] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> ExpensePage:
+        """One newest-first page of matching rows.
+
+        ``cursor`` is the id of the last row of the previous page; the returned
+        cursor is None when there are no further rows.
+        """
+        flt = flt or ExpenseFilter()
+        rows: List[Dict[str, Any]] = []
+        seen_cursor = cursor is None
+        for row in self.iter_expenses(username, month):
+            if not seen_cursor:
+                seen_cursor = row.get("id") == cursor
+                continue
+            if not flt.matches(row):
+                continue
+            # A cursor only once a further match exists, so no page comes back empty
+            if limit is not None and len(rows) == limit:
+                return rows, rows[-1]["id"]
+            rows.append(row)
+        return rows, None
+
+    @abstractmethod
+    def add_expense(self, username: str, month: str, expense: Dict[str, Any]) -> Dict[str, Any]:
+        """Store the row and return it with its ``id``."""
+
+    def add_expenses(self, username: str, month: str, expenses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store many rows of one month in one write; returns them with ids, in order."""
+        return [self.add_expense(username, month, e) for e in expenses]
+
+    @abstractmethod
+    def delete_expense(self, username: str, month: str, expense_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def expenses_version(self, username: str, month: str) -> str:
+        """Opaque token that changes whenever the month's expenses change."""
+
+    @abstractmethod
+    def month_summary(self, username: str, month: str) -> MonthSummary:
+        """Materialised aggregates kept up to date by add/delete."""
+
+    @abstractmethod
+    def rebuild_summary(self, username: str, month: str) -> MonthSummary:
+        """Recompute the aggregates from the stored rows."""
+
+    # Per-user documents
+    @abstractmethod
+    def get_doc(self, username: str, name: str, default: Any) -> Any:
+        ...
+
+    @abstractmethod
+    def put_doc(self, username: str, name: str, data: Any) -> None:
+        ...
+
+    def update_doc(self, username: str, name: str, default: Any, fn: Callable[[Any], Any]) -> Any:
+        """Apply ``fn`` to a document and store it; backends make this atomic."""
+        data = self.get_doc(username, name, default)
+        result = fn(data)
+        if result is not None:
+            data = result
+        self.put_doc(username, name, data)
+        return data
+
+    # Support tickets
+    @abstractmethod
+    def list_tickets(self) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def add_ticket(self, ticket: Dict[str, Any]) -> None:
+        ...
+
+    # Append-only logs (ai_call_log, reset_log)
+    @abstractmethod
+    def append_log(self, name: str, entry: Dict[str, Any]) -> None:
+        ...
+
+    def append_logs(self, name: str, entries: List[Dict[str, Any]]) -> None:
+        """Append a batch of entries in one write."""
+        for entry in entries:
+            self.append_log(name, entry)
+
+    @abstractmethod
+    def read_log(self, name: str) -> List[Dict[str, Any]]:
+        ...
+
+    def iter_log(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Entries oldest first; backends override this to stream."""
+        return iter(self.read_log(name))
+
+    @abstractmethod
+    def count_log(self, name: str) -> int:
+        ...
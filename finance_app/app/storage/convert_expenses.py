@@ -0,0 +1,45 @@
+"""Convert legacy ``expenses_YYYY-MM.json`` arrays into append-only logs.
+
+JsonStorage also converts a month lazily the first time it is touched; this
+does the whole tree up front. Originals are kept as ``.json.bak``.
+
+Usage::
+
+    python -m finance_app.app.storage.convert_expenses [--data-dir DIR]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+
+from ..api.utils import data_dir
+from .json_backend import JsonStorage
+
+_LEGACY_FILE = re.compile(r"^expenses_(\d{4}-\d{2})\.json$")
+
+
+def convert_all(store: JsonStorage) -> int:
+    converted = 0
+    user_root = os.path.join(store.base_dir, "user_data")
+    for username in sorted(os.listdir(user_root)) if os.path.isdir(user_root) else []:
+        user_dir = os.path.join(user_root, username)
+        if not os.path.isdir(user_dir):
+            continue
+        for fname in sorted(os.listdir(user_dir)):
+            match = _LEGACY_FILE.match(fname)
+            if match:
+                store.rebuild_summary(username, match.group(1))  # converts, then refreshes the sidecar
+                converted += 1
+    return converted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert expense JSON arrays to JSON-lines logs")
+    parser.add_argument("--data-dir", default=data_dir())
+    args = parser.parse_args()
+    print(f"Converted {convert_all(JsonStorage(args.data_dir))} expense files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+from ..api.utils import ensure_dir, load_json, path_lock
+
+# strftime patterns naming the rotation period; None rotates on size only
+ROTATE_PERIODS = {"hourly": "%Y%m%d%H", "daily": "%Y%m%d", "monthly": "%Y%m", "none": None}
+
+
+def _line(entry: Dict[str, Any]) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _read_lines(path: str) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # torn last line from a crash mid-append
+            try:
+                yield json.loads(raw)
+            except ValueError:
+                continue
+
+
+def _count_lines(path: str) -> int:
+    opener = gzip.open if path.endswith(".gz") else open
+    n = 0
+    with opener(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            n += chunk.count(b"\n")
+    return n
+
+
+class EventLog:
+    """Append-only JSON-lines event log with rotation: ``{name}.jsonl`` plus
+    closed segments ``{name}.{stamp}.jsonl[.gz]``.
+
+    The active segment is rotated before a write that would take it past
+    ``max_bytes``, or when the ``rotate`` period (UTC) of its last write is
+    over. Closed segments are optionally gzipped, and only the newest ``keep``
+    are retained (0 keeps all). Appends take the path's write lock and add a
+    whole batch with one ``write`` call. Reads stream segments oldest first.
+    Closed segments never change, so their line counts are cached.
+
+    A legacy ``{name}.json`` array is moved into the log on first use and
+    kept as ``.json.bak``.
+    """
+
+    def __init__(
+        self,
+        base_path: str,
+        max_bytes: int = 16 * 1024 * 1024,
+        rotate: str = "daily",
+        compress: bool = True,
+        keep: int = 0,
+    ) -> None:
+        self.base_path = base_path
+        self.path = base_path + ".jsonl"
+        self.legacy_path = base_path + ".json"
+        self.max_bytes = max_bytes
+        self.period = ROTATE_PERIODS[rotate]
+        self.compress = compress
+        self.keep = keep
+        self._counts: Dict[str, int] = {}
+
+    @property
+    def lock(self) -> Any:
+        return path_lock(self.path)
+
+    def segments(self) -> List[str]:
+        """Closed segments, oldest first (stamps sort chronologically)."""
+        names = glob.glob(glob.escape(self.base_path) + ".*.jsonl") + glob.glob(glob.escape(self.base_path) + ".*.jsonl.gz")
+        return sorted(names)
+
+    def _convert_legacy(self) -> None:
+        if os.path.exists(self.legacy_path) and not os.path.exists(self.path):
+            entries = load_json(self.legacy_path, [])
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(_line(e) for e in entries))
+            os.replace(tmp_path, self.path)
+            os.replace(self.legacy_path, self.legacy_path + ".bak")
+
+    def _rotate_due(self, incoming: int, now: float) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if st.st_size == 0:
+            return False
+        if self.max_bytes and st.st_size + incoming > self.max_bytes:
+            return True
+        if self.period:
+            last = datetime.utcfromtimestamp(st.st_mtime).strftime(self.period)
+            return last != datetime.utcfromtimestamp(now).strftime(self.period)
+        return False
+
+    def _rotate(self) -> None:
+        mtime = os.stat(self.path).st_mtime
+        while True:
+            target = f"{self.base_path}.{datetime.utcfromtimestamp(mtime).strftime('%Y%m%dT%H%M%S%f')}.jsonl"
+            if not os.path.exists(target) and not os.path.exists(target + ".gz"):
+                break
+            mtime += 1e-6
+        os.replace(self.path, target)
+        if self.compress:
+            with open(target, "rb") as src, gzip.open(target + ".gz.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(target + ".gz.tmp", target + ".gz")
+            os.remove(target)
+        if self.keep:
+            for old in self.segments()[: -self.keep]:
+                os.remove(old)
+                self._counts.pop(old, None)
+
+    def append_many(self, entries: Iterable[Dict[str, Any]]) -> None:
+        data = b"".join(_line(e) for e in entries)
+        if not data:
+            return
+        ensure_dir(os.path.dirname(self.path))
+        with self.lock.write():
+            self._convert_legacy()
+            if self._rotate_due(len(data), time.time()):
+                self._rotate()
+            with open(self.path, "ab") as f:
+                f.write(data)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.append_many([entry])
+
+    def _snapshot(self) -> List[str]:
+        with self.lock.read():
+            if os.path.exists(self.legacy_path) and not os.path.exists(self.path):
+                return [self.legacy_path]
+            return self.segments() + ([self.path] if os.path.exists(self.path) else [])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Entries oldest first, streamed segment by segment."""
+        for path in self._snapshot():
+            try:
+                if path == self.legacy_path:
+                    yield from load_json(path, [])
+                else:
+                    yield from _read_lines(path)
+            except FileNotFoundError:
+                continue  # pruned by retention while we were reading
+
+    def count(self) -> int:
+        total = 0
+        for path in self._snapshot():
+            if path == self.legacy_path:
+                total += len(load_json(path, []))
+                continue
+            n = self._counts.get(path)
+            if n is None:
+                try:
+                    n = _count_lines(path)
+                except FileNotFoundError:
+                    continue
+                if path != self.path:
+                    self._counts[path] = n
+            total += n
+        return total
+
+
+def open_event_log(base_path: str) -> EventLog:
+    """``EventLog`` configured from ``EVENT_LOG_*`` environment variables."""
+    return EventLog(
+        base_path,
+        max_bytes=int(os.getenv("EVENT_LOG_MAX_BYTES", str(16 * 1024 * 1024))),
+        rotate=os.getenv("EVENT_LOG_ROTATE", "daily").lower(),
+        compress=os.getenv("EVENT_LOG_GZIP", "1").lower() not in ("0", "false", "no"),
+        keep=int(os.getenv("EVENT_LOG_KEEP", "0")),
+    )
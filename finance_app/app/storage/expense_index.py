@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .query import ExpenseFilter, ExpensePage
+
+# (offset, length, id, date, category, amount); None once deleted
+_Entry = Tuple[int, int, str, Any, Any, Any]
+
+
+class ExpenseIndex:
+    """In-memory index of one ``ExpenseLog`` file: row offsets plus filter columns.
+
+    The log is append-only, so when the file keeps its inode and grows, the
+    index catches up by parsing only the new tail. A different inode means
+    compaction replaced the file, and the index is rebuilt. Queries filter on
+    the indexed columns and seek to read just the rows they return. Only
+    ``note`` filters read candidate rows.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: List[Optional[_Entry]] = []
+        self._positions: Dict[str, int] = {}
+        self._inode: Optional[int] = None
+        self._size = 0
+
+    def _reset(self) -> None:
+        self._entries, self._positions, self._size = [], {}, 0
+
+    def refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            self._inode = None
+            return
+        if st.st_ino != self._inode or st.st_size < self._size:
+            self._reset()
+            self._inode = st.st_ino
+        if st.st_size == self._size:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            offset = self._size
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # an append still in flight; picked up next time
+                self._apply(offset, raw)
+                offset += len(raw)
+        self._size = offset
+
+    def _apply(self, offset: int, raw: bytes) -> None:
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            return
+        expense_id = record.get("id")
+        if record.get("op") == "del":
+            pos = self._positions.get(expense_id)
+            if pos is not None:
+                self._entries[pos] = None
+            return
+        self._positions[expense_id] = len(self._entries)
+        self._entries.append(
+            (offset, len(raw), expense_id, record.get("date"), record.get("category"), record.get("amount"))
+        )
+
+    def get(self, expense_id: str) -> Optional[Dict[str, Any]]:
+        """The live row with ``expense_id``, read at its indexed offset. Caller holds the log's lock."""
+        with self._lock:
+            self.refresh()
+            pos = self._positions.get(expense_id)
+            entry = self._entries[pos] if pos is not None else None
+            if entry is None:
+                return None
+            with open(self.path, "rb") as f:
+                f.seek(entry[0])
+                return json.loads(f.read(entry[1]))
+
+    def query(self, flt: ExpenseFilter, limit: Optional[int], cursor: Optional[str]) -> ExpensePage:
+        """Newest-first page after ``cursor`` (an expense id). Caller holds the log's read lock."""
+        with self._lock:
+            self.refresh()
+            start = len(self._entries) - 1
+            if cursor is not None:
+                pos = self._positions.get(cursor)
+                if pos is None:
+                    return [], None
+                start = pos - 1
+            rows: List[Dict[str, Any]] = []
+            if start < 0:
+                return rows, None
+            with open(self.path, "rb") as f:
+                for pos in range(start, -1, -1):
+                    entry = self._entries[pos]
+                    if entry is None or not flt.matches_fields(entry[3], entry[4], entry[5]):
+                        continue
+                    f.seek(entry[0])
+                    row = json.loads(f.read(entry[1]))
+                    if not flt.matches_note(row):
+                        continue
+                    # A cursor only once a further match exists, so no page comes back empty
+                    if limit is not None and len(rows) == limit:
+                        return rows, rows[-1]["id"]
+                    rows.append(row)
+            return rows, None
+
+
+class ExpenseIndexCache:
+    """Bounded LRU of per-month indexes so idle months do not pin memory."""
+
+    def __init__(self, max_months: int = 256) -> None:
+        self.max_months = max_months
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[str, ExpenseIndex]" = OrderedDict()
+
+    def get(self, path: str) -> ExpenseIndex:
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None:
+                index = self._indexes[path] = ExpenseIndex(path)
+                while len(self._indexes) > self.max_months:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(path)
+            return index
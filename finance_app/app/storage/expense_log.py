@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import json
+import os
+import secrets
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from ..api.utils import ensure_dir, load_json, path_lock
+
+_BLOCK = 64 * 1024
+
+
+def new_expense_id() -> str:
+    return secrets.token_hex(8)
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _reverse_lines(f: BinaryIO, end: int) -> Iterator[bytes]:
+    """Lines of ``f[:end]`` last to first, reading fixed-size blocks backwards."""
+    pos = end
+    tail = b""
+    while pos > 0:
+        step = min(_BLOCK, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step) + tail
+        lines = chunk.split(b"\n")
+        tail = lines.pop(0)
+        for line in reversed(lines):
+            if line:
+                yield line
+    if tail:
+        yield tail
+
+
+def _records_newest_first(f: BinaryIO, end: int) -> Iterator[Dict[str, Any]]:
+    for raw in _reverse_lines(f, end):
+        try:
+            yield json.loads(raw)
+        except ValueError:
+            continue  # torn line from a crash mid-append
+
+
+class ExpenseLog:
+    """Append-only JSON-lines log of one user-month of expenses.
+
+    Each line is either a row carrying a stable ``id`` or a tombstone
+    ``{"id": ..., "op": "del"}``. Inserts and deletes append one line, and
+    reads walk the file backwards so the newest rows come first without
+    loading the whole file. ``compact`` rewrites the file without deleted rows.
+
+    The caller serialises writers with ``path_lock(path).write()``. Readers
+    only take the read lock to open the file and note its size. Appends after
+    that point are not seen, and ``compact`` swaps in a new inode, so an open
+    reader keeps a consistent snapshot.
+
+    A legacy ``expenses_YYYY-MM.json`` array (newest first) is converted the
+    first time the month is touched and kept as ``.json.bak``.
+    """
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None) -> None:
+        self.path = path
+        self.legacy_path = legacy_path
+
+    @property
+    def lock(self) -> Any:
+        return path_lock(self.path)
+
+    def ensure_converted(self) -> None:
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        with self.lock.write():
+            if os.path.exists(self.legacy_path) and not os.path.exists(self.path):
+                self.convert(self.legacy_path, self.path)
+                os.replace(self.legacy_path, self.legacy_path + ".bak")
+
+    @staticmethod
+    def convert(legacy_path: str, path: str) -> int:
+        """Write a JSON array of rows (newest first) as a log; returns the row count."""
+        rows = load_json(legacy_path, [])
+        ensure_dir(os.path.dirname(path))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for row in reversed(rows):
+                f.write(_line(dict(row, id=row.get("id") or new_expense_id())))
+        os.replace(tmp_path, path)
+        return len(rows)
+
+    # Writes: caller holds ``self.lock.write()``
+    def append(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        record = dict(row, id=row.get("id") or new_expense_id())
+        ensure_dir(os.path.dirname(self.path))
+        with open(self.path, "ab") as f:
+            f.write(_line(record))
+        return record
+
+    def extend(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Append many rows with a single ``write`` call."""
+        records = [dict(row, id=row.get("id") or new_expense_id()) for row in rows]
+        if records:
+            ensure_dir(os.path.dirname(self.path))
+            with open(self.path, "ab") as f:
+                f.write(b"".join(_line(r) for r in records))
+        return records
+
+    def tombstone(self, expense_id: str) -> None:
+        with open(self.path, "ab") as f:
+            f.write(_line({"id": expense_id, "op": "del"}))
+
+    def compact(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        live = list(self.live_rows())
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for row in reversed(live):
+                f.write(_line(row))
+        os.replace(tmp_path, self.path)
+
+    # Reads
+    def _open_snapshot(self) -> Optional[Tuple[BinaryIO, int]]:
+        self.ensure_converted()
+        with self.lock.read():
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                return None
+            return f, os.fstat(f.fileno()).st_size
+
+    def _scan_live(self, f: BinaryIO, end: int) -> Iterator[Dict[str, Any]]:
+        deleted = set()
+        for record in _records_newest_first(f, end):
+            if record.get("op") == "del":
+                deleted.add(record.get("id"))
+            elif record.get("id") in deleted:
+                deleted.discard(record.get("id"))
+            else:
+                yield record
+
+    def live_rows(self) -> Iterator[Dict[str, Any]]:
+        """Live rows newest first; the caller holds the lock."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            yield from self._scan_live(f, os.fstat(f.fileno()).st_size)
+
+    def iter_newest(self) -> Iterator[Dict[str, Any]]:
+        """Live rows newest first, read lazily from a snapshot of the file."""
+        snap = self._open_snapshot()
+        if snap is None:
+            return
+        f, end = snap
+        with f:
+            yield from self._scan_live(f, end)
+
+    def garbage(self) -> int:
+        """Lines that compaction would drop (tombstones plus the rows they delete)."""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as f:
+            tombstones = sum(1 for r in _records_newest_first(f, os.fstat(f.fileno()).st_size) if r.get("op") == "del")
+        return tombstones * 2
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from ..api.utils import data_dir, dump_json, file_stamp, load_json, read_json, update_json, write_json
+from .aggregates import MonthSummary
+from .base import StorageBackend
+from .event_log import EventLog, open_event_log
+from .expense_index import ExpenseIndexCache
+from .expense_log import ExpenseLog
+from .query import ExpenseFilter, ExpensePage
+from .user_repository import UserRepository
+
+
+# Compact a month's log once deleted rows plus tombstones reach this many
+# lines and outnumber the live rows.
+COMPACT_MIN_GARBAGE = 64
+
+
+class JsonStorage(StorageBackend):
+    """The original layout: one JSON document per file under ``data/``.
+
+    Expenses are the exception: each user-month is an append-only
+    ``expenses_YYYY-MM.jsonl`` log (see ``ExpenseLog``). Named logs such as
+    ``ai_call_log`` are rotating ``EventLog`` files.
+    """
+
+    name = "json"
+
+    def __init__(self, base_dir: Optional[str] = None) -> None:
+        self.base_dir = base_dir or data_dir()
+        self.users = UserRepository(self._users_path())
+        self.expense_indexes = ExpenseIndexCache()
+        self.event_logs: Dict[str, EventLog] = {}
+
+    def _users_path(self) -> str:
+        return os.path.join(self.base_dir, "users.json")
+
+    def _user_dir(self, username: str) -> str:
+        return os.path.join(self.base_dir, "user_data", username)
+
+    def _expenses_path(self, username: str, month: str) -> str:
+        return os.path.join(self._user_dir(username), f"expenses_{month}.jsonl")
+
+    def _legacy_expenses_path(self, username: str, month: str) -> str:
+        return os.path.join(self._user_dir(username), f"expenses_{month}.json")
+
+    def _summary_path(self, username: str, month: str) -> str:
+        return os.path.join(self._user_dir(username), f"expenses_{month}.summary.json")
+
+    def _expense_log(self, username: str, month: str) -> ExpenseLog:
+        return ExpenseLog(self._expenses_path(username, month), self._legacy_expenses_path(username, month))
+
+    def _doc_path(self, username: str, name: str) -> str:
+        return os.path.join(self._user_dir(username), f"{name}.json")
+
+    def _tickets_path(self) -> str:
+        return os.path.join(self.base_dir, "support_tickets.json")
+
+    # Users
+    def list_users(self) -> List[Dict[str, Any]]:
+        return self.users.all()
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        return self.users.get_by_username(username)
+
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return self.users.get_by_email(email)
+
+    def user_exists(self, username: Optional[str] = None, email: Optional[str] = None) -> bool:
+        return self.users.exists(username=username, email=email)
+
+    def save_users(self, users: List[Dict[str, Any]]) -> None:
+        self.users.save(users)
+
+    def create_user(self, user: Dict[str, Any], referrer: Optional[str] = None, referral_points: int = 0) -> bool:
+        return self.users.create(user, referrer, referral_points)
+
+    def update_user(self, username: str, fields: Dict[str, Any], expect: Optional[Dict[str, Any]] = None) -> bool:
+        return self.users.update(username, fields, expect)
+
+    # Expenses
+    def list_expenses(self, username: str, month: str) -> List[Dict[str, Any]]:
+        return list(self._expense_log(username, month).iter_newest())
+
+    def iter_expenses(self, username: str, month: str) -> Iterator[Dict[str, Any]]:
+        return self._expense_log(username, month).iter_newest()
+
+    def query_expenses(
+        self,
+        username: str,
+        month: str,
+        flt: Optional[ExpenseFilter] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> ExpensePage:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        with log.lock.read():
+            return self.expense_indexes.get(log.path).query(flt or ExpenseFilter(), limit, cursor)
+
+    def add_expense(self, username: str, month: str, expense: Dict[str, Any]) -> Dict[str, Any]:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        with log.lock.write():
+            before = file_stamp(log.path)
+            row = log.append(expense)
+            self._update_summary(username, month, before, lambda s: s.add(row))
+        return row
+
+    def add_expenses(self, username: str, month: str, expenses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        with log.lock.write():
+            before = file_stamp(log.path)
+            rows = log.extend(expenses)
+            self._update_summary(username, month, before, lambda s: [s.add(r) for r in rows])
+        return rows
+
+    def delete_expense(self, username: str, month: str, expense_id: str) -> bool:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        with log.lock.write():
+            row = self.expense_indexes.get(log.path).get(expense_id)
+            if row is None:
+                return False
+            before = file_stamp(log.path)
+            log.tombstone(expense_id)
+            sidecar = self._update_summary(username, month, before, lambda s: s.remove(row), garbage=2)
+            if sidecar["garbage"] >= COMPACT_MIN_GARBAGE and sidecar["garbage"] >= sidecar["summary"]["count"]:
+                log.compact()
+                sidecar["garbage"] = 0
+                self._write_summary(username, month, sidecar)
+        return True
+
+    def compact_expenses(self, username: str, month: str) -> None:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        with log.lock.write():
+            log.compact()
+            summary = MonthSummary.build(log.live_rows())
+            self._write_summary(username, month, {"summary": summary.to_dict(), "garbage": 0})
+
+    def expenses_version(self, username: str, month: str) -> str:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        stamp = file_stamp(log.path)
+        return "%d-%d" % stamp if stamp else "0"
+
+    # The summary sidecar records the (mtime, size) of the log it describes,
+    # plus how many log lines are garbage. It is only touched while holding
+    # the log's write lock, so a mismatching stamp means an out-of-band edit.
+    def _write_summary(self, username: str, month: str, sidecar: Dict[str, Any]) -> None:
+        sidecar["source"] = list(file_stamp(self._expenses_path(username, month)) or ())
+        dump_json(self._summary_path(username, month), sidecar)
+
+    def _update_summary(
+        self, username: str, month: str, before: Any, apply: Callable[[MonthSummary], None], garbage: int = 0
+    ) -> Dict[str, Any]:
+        sidecar = load_json(self._summary_path(username, month), None)
+        if sidecar and before and sidecar.get("source") == list(before):
+            summary = MonthSummary.from_dict(sidecar.get("summary") or {})
+            apply(summary)
+            sidecar = {"summary": summary.to_dict(), "garbage": int(sidecar.get("garbage", 0)) + garbage}
+        else:
+            sidecar = self._scan_summary(username, month)
+        self._write_summary(username, month, sidecar)
+        return sidecar
+
+    def _scan_summary(self, username: str, month: str) -> Dict[str, Any]:
+        log = self._expense_log(username, month)
+        if not os.path.exists(log.path):
+            return {"summary": MonthSummary().to_dict(), "garbage": 0}
+        return {"summary": MonthSummary.build(log.live_rows()).to_dict(), "garbage": log.garbage()}
+
+    def month_summary(self, username: str, month: str) -> MonthSummary:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        with log.lock.read():
+            stamp = file_stamp(log.path)
+            if stamp is None:
+                return MonthSummary()
+            sidecar = load_json(self._summary_path(username, month), None)
+            if sidecar and sidecar.get("source") == list(stamp):
+                summary = MonthSummary.from_dict(sidecar.get("summary") or {})
+                if not summary.extrema_stale:
+                    return summary
+        return self.rebuild_summary(username, month)
+
+    def rebuild_summary(self, username: str, month: str) -> MonthSummary:
+        log = self._expense_log(username, month)
+        log.ensure_converted()
+        with log.lock.write():
+            sidecar = self._scan_summary(username, month)
+            if os.path.exists(log.path):
+                self._write_summary(username, month, sidecar)
+        return MonthSummary.from_dict(sidecar["summary"])
+
+    # Per-user documents
+    def get_doc(self, username: str, name: str, default: Any) -> Any:
+        return read_json(self._doc_path(username, name), default)
+
+    def put_doc(self, username: str, name: str, data: Any) -> None:
+        write_json(self._doc_path(username, name), data)
+
+    def update_doc(self, username: str, name: str, default: Any, fn: Callable[[Any], Any]) -> Any:
+        return update_json(self._doc_path(username, name), default, fn)
+
+    # Support tickets
+    def list_tickets(self) -> List[Dict[str, Any]]:
+        return read_json(self._tickets_path(), [])
+
+    def add_ticket(self, ticket: Dict[str, Any]) -> None:
+        update_json(self._tickets_path(), [], lambda items: items.append(ticket))
+
+    # Logs
+    def _event_log(self, name: str) -> EventLog:
+        log = self.event_logs.get(name)
+        if log is None:
+            log = self.event_logs.setdefault(name, open_event_log(os.path.join(self.base_dir, name)))
+        return log
+
+    def append_log(self, name: str, entry: Dict[str, Any]) -> None:
+        self._event_log(name).append(entry)
+
+    def append_logs(self, name: str, entries: List[Dict[str, Any]]) -> None:
+        self._event_log(name).append_many(entries)
+
+    def read_log(self, name: str) -> List[Dict[str, Any]]:
+        return list(self._event_log(name))
+
+    def iter_log(self, name: str) -> Iterator[Dict[str, Any]]:
+        return iter(self._event_log(name))
+
+    def count_log(self, name: str) -> int:
+        return self._event_log(name).count()
@@ -0,0 +1,102 @@
+"""One-shot import of the JSON ``data/`` tree into the SQLite backend.
+
+Usage::
+
+    python -m finance_app.app.storage.migrate [--data-dir DIR] [--db PATH] [--force]
+
+Rows are appended, so importing twice would duplicate expenses, tickets
+and logs: a target that already holds data is refused unless ``--force``
+is given, which empties it first.
+
+Only what goes through the storage backend is imported. Upgrade requests,
+password reset tokens and the notification queue are file-backed under
+``data/`` (or in Redis) whichever backend is active, and are left in place.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+from typing import Any, Dict, List
+
+from ..api.utils import data_dir, read_json
+from .json_backend import JsonStorage
+from .sqlite_backend import SQLiteStorage
+
+# Legacy arrays (.json) and append-only logs (.jsonl)
+_EXPENSES_FILE = re.compile(r"^expenses_(\d{4}-\d{2})\.jsonl?$")
+_LOG_NAMES = ("ai_call_log", "reset_log")
+
+
+class TargetNotEmpty(RuntimeError):
+    pass
+
+
+def migrate(source: JsonStorage, target: SQLiteStorage, force: bool = False) -> Dict[str, int]:
+    existing = {table: n for table, n in target.row_counts().items() if n}
+    if existing:
+        if not force:
+            raise TargetNotEmpty(
+                "target database already has data (" + ", ".join(f"{k}={v}" for k, v in existing.items()) + ")"
+            )
+        target.clear()
+    counts = {"users": 0, "expenses": 0, "documents": 0, "tickets": 0, "logs": 0}
+
+    users = source.list_users()
+    target.save_users(users)
+    counts["users"] = len(users)
+
+    user_root = os.path.join(source.base_dir, "user_data")
+    for username in sorted(os.listdir(user_root)) if os.path.isdir(user_root) else []:
+        user_dir = os.path.join(user_root, username)
+        if not os.path.isdir(user_dir):
+            continue
+        months = set()
+        for fname in sorted(os.listdir(user_dir)):
+            match = _EXPENSES_FILE.match(fname)
+            if match:
+                months.add(match.group(1))
+            elif fname.endswith(".json") and not fname.endswith(".summary.json"):
+                name = fname[: -len(".json")]
+                target.put_doc(username, name, read_json(os.path.join(user_dir, fname), None))
+                counts["documents"] += 1
+        for month in sorted(months):
+            rows = source.list_expenses(username, month)
+            # Listings are newest first; insert oldest first so ids keep the order
+            target.import_expenses(username, month, reversed(rows))
+            counts["expenses"] += len(rows)
+
+    for ticket in source.list_tickets():
+        target.add_ticket(ticket)
+        counts["tickets"] += 1
+
+    for name in _LOG_NAMES:
+        batch: List[Dict[str, Any]] = []
+        for entry in source.iter_log(name):
+            batch.append(entry)
+            if len(batch) >= 1000:
+                target.append_logs(name, batch)
+                counts["logs"] += len(batch)
+                batch = []
+        if batch:
+            target.append_logs(name, batch)
+            counts["logs"] += len(batch)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import the JSON data tree into SQLite")
+    parser.add_argument("--data-dir", default=data_dir())
+    parser.add_argument("--db", default=None, help="SQLite file (default: <data-dir>/finance.db)")
+    parser.add_argument("--force", action="store_true", help="empty a non-empty target database and import again")
+    args = parser.parse_args()
+    db_path = args.db or os.path.join(args.data_dir, "finance.db")
+    try:
+        counts = migrate(JsonStorage(args.data_dir), SQLiteStorage(db_path), force=args.force)
+    except TargetNotEmpty as exc:
+        parser.exit(1, f"{db_path}: {exc}; nothing imported. Use --force to replace it.\n")
+    print(f"Migrated into {db_path}: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ExpenseFilter:
+    """Server-side filters for expense listings; ``None`` fields match everything.
+
+    Dates compare as ``YYYY-MM-DD`` strings, ``category`` matches exactly
+    (case-insensitive) and ``note`` is a case-insensitive substring.
+    """
+
+    category: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    note: Optional[str] = None
+
+    def matches_fields(self, date: Any, category: Any, amount: Any) -> bool:
+        """Everything except the note, which needs the full row."""
+        if self.category is not None and str(category or "").lower() != self.category.lower():
+            return False
+        if self.min_amount is not None or self.max_amount is not None:
+            amt = float(amount or 0)
+            if self.min_amount is not None and amt < self.min_amount:
+                return False
+            if self.max_amount is not None and amt > self.max_amount:
+                return False
+        day = str(date or "")[:10]
+        if self.start_date is not None and day < self.start_date:
+            return False
+        if self.end_date is not None and day > self.end_date:
+            return False
+        return True
+
+    def matches_note(self, row: Dict[str, Any]) -> bool:
+        return self.note is None or self.note.lower() in str(row.get("note") or "").lower()
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        return self.matches_fields(row.get("date"), row.get("category"), row.get("amount")) and self.matches_note(row)
+
+
+# (rows newest first, cursor for the next page or None)
+ExpensePage = Tuple[List[Dict[str, Any]], Optional[str]]
@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from ..api.utils import ensure_dir
+from .aggregates import MonthSummary
+from .base import StorageBackend
+from .query import ExpenseFilter, ExpensePage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    month TEXT NOT NULL,
+    date TEXT,
+    category TEXT,
+    amount REAL,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_user_month ON expenses(username, month, id);
+
+CREATE TABLE IF NOT EXISTS expense_summaries (
+    username TEXT NOT NULL,
+    month TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (username, month)
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    username TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (username, name)
+);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
+
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logs_name ON logs(name, id);
+"""
+
+_EXPENSE_COLUMNS = ("date", "category", "amount", "note")
+
+
+def _expense_row(r: Any) -> Dict[str, Any]:
+    """(id, date, category, amount, note) -> API row; ids are strings on every backend."""
+    return dict(zip(_EXPENSE_COLUMNS, r[1:]), id=str(r[0]))
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class SQLiteStorage(StorageBackend):
+    """Embedded SQLite engine in WAL mode.
+
+    Each thread gets its own connection; WAL lets readers proceed while a
+    writer commits, and every mutation touches only the affected rows.
+    Goals, budgets and other per-user documents live in ``documents`` keyed by
+    (username, name).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        ensure_dir(os.path.dirname(os.path.abspath(path)))
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    _TABLES = ("users", "expenses", "expense_summaries", "documents", "tickets", "logs")
+
+    def row_counts(self) -> Dict[str, int]:
+        conn = self._conn()
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in self._TABLES}
+
+    def clear(self) -> None:
+        """Delete every row, in one transaction (used by ``migrate --force``)."""
+        conn = self._conn()
+        with conn:
+            for table in self._TABLES:
+                conn.execute(f"DELETE FROM {table}")
+
+    # Users
+    def list_users(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM users ORDER BY rowid").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM users WHERE email = ? LIMIT 1", (email,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def user_exists(self, username: Optional[str] = None, email: Optional[str] = None) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM users WHERE username = ? OR email = ? LIMIT 1", (username, email)
+        ).fetchone()
+        return row is not None
+
+    def save_users(self, users: List[Dict[str, Any]]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (username, email, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET email = excluded.email, data = excluded.data",
+                [(u.get("username"), u.get("email"), _dumps(u)) for u in users],
+            )
+
+    def create_user(self, user: Dict[str, Any], referrer: Optional[str] = None, referral_points: int = 0) -> bool:
+        conn = self._conn()
+        user = dict(user)
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                # email is not UNIQUE in the schema; the write lock makes this check safe
+                if conn.execute("SELECT 1 FROM users WHERE email = ? LIMIT 1", (user.get("email"),)).fetchone():
+                    return False
+                row = conn.execute("SELECT data FROM users WHERE username = ?", (referrer,)).fetchone() if referrer else None
+                if row:
+                    ref = json.loads(row[0])
+                    ref["points"] = int(ref.get("points", 0)) + referral_points
+                    user["points"] = int(user.get("points", 0)) + referral_points
+                    conn.execute("UPDATE users SET data = ? WHERE username = ?", (_dumps(ref), referrer))
+                conn.execute(
+                    "INSERT INTO users (username, email, data) VALUES (?, ?, ?)",
+                    (user.get("username"), user.get("email"), _dumps(user)),
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_user(self, username: str, fields: Dict[str, Any], expect: Optional[Dict[str, Any]] = None) -> bool:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM users WHERE username = ?", (username,)).fetchone()
+            if not row:
+                return False
+            user = json.loads(row[0])
+            if any(user.get(k) != v for k, v in (expect or {}).items()):
+                return False
+            user.update(fields)
+            conn.execute(
+                "UPDATE users SET email = ?, data = ? WHERE username = ?", (user.get("email"), _dumps(user), username)
+            )
+        return True
+
+    # Expenses
+    def list_expenses(self, username: str, month: str) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT id, date, category, amount, note FROM expenses WHERE username = ? AND month = ? ORDER BY id DESC",
+            (username, month),
+        ).fetchall()
+        return [_expense_row(r) for r in rows]
+
+    def iter_expenses(self, username: str, month: str, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        # Keyset batches rather than one open cursor: a streaming response may
+        # resume the generator on a different threadpool thread, and each
+        # thread must use its own connection.
+        last_id = None
+        while True:
+            rows = self._conn().execute(
+                "SELECT id, date, category, amount, note FROM expenses WHERE username = ? AND month = ? "
+                "AND (? IS NULL OR id < ?) ORDER BY id DESC LIMIT ?",
+                (username, month, last_id, last_id, batch_size),
+            ).fetchall()
+            for r in rows:
+                yield _expense_row(r)
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def query_expenses(
+        self,
+        username: str,
+        month: str,
+        flt: Optional[ExpenseFilter] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> ExpensePage:
+        flt = flt or ExpenseFilter()
+        clauses, params = ["username = ?", "month = ?"], [username, month]
+        if cursor is not None:
+            try:
+                params.append(int(cursor))
+            except ValueError:
+                return [], None
+            clauses.append("id < ?")
+        if flt.category is not None:
+            clauses.append("category = ? COLLATE NOCASE")
+            params.append(flt.category)
+        if flt.min_amount is not None:
+            clauses.append("COALESCE(amount, 0) >= ?")
+            params.append(flt.min_amount)
+        if flt.max_amount is not None:
+            clauses.append("COALESCE(amount, 0) <= ?")
+            params.append(flt.max_amount)
+        if flt.start_date is not None:
+            clauses.append("substr(COALESCE(date, ''), 1, 10) >= ?")
+            params.append(flt.start_date)
+        if flt.end_date is not None:
+            clauses.append("substr(COALESCE(date, ''), 1, 10) <= ?")
+            params.append(flt.end_date)
+        if flt.note is not None:
+            clauses.append("instr(lower(COALESCE(note, '')), ?) > 0")
+            params.append(flt.note.lower())
+        sql = "SELECT id, date, category, amount, note FROM expenses WHERE " + " AND ".join(clauses) + " ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        rows = [_expense_row(r) for r in self._conn().execute(sql, params).fetchall()]
+        if limit is not None and len(rows) > limit:
+            return rows[:limit], rows[limit - 1]["id"]
+        return rows, None
+
+    def add_expense(self, username: str, month: str, expense: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO expenses (username, month, date, category, amount, note) VALUES (?, ?, ?, ?, ?, ?)",
+                (username, month) + tuple(expense.get(c) for c in _EXPENSE_COLUMNS),
+            )
+            self._update_summary(conn, username, month, lambda s: s.add(expense))
+        return dict(expense, id=str(cur.lastrowid))
+
+    def add_expenses(self, username: str, month: str, expenses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        conn = self._conn()
+        out = []
+        with conn:
+            for expense in expenses:
+                cur = conn.execute(
+                    "INSERT INTO expenses (username, month, date, category, amount, note) VALUES (?, ?, ?, ?, ?, ?)",
+                    (username, month) + tuple(expense.get(c) for c in _EXPENSE_COLUMNS),
+                )
+                out.append(dict(expense, id=str(cur.lastrowid)))
+            self._update_summary(conn, username, month, lambda s: [s.add(e) for e in expenses])
+        return out
+
+    def import_expenses(self, username: str, month: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Insert rows oldest first in a single transaction."""
+        rows = list(rows)
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO expenses (username, month, date, category, amount, note) VALUES (?, ?, ?, ?, ?, ?)",
+                [(username, month) + tuple(r.get(c) for c in _EXPENSE_COLUMNS) for r in rows],
+            )
+            self._update_summary(conn, username, month, lambda s: [s.add(r) for r in rows])
+
+    def delete_expense(self, username: str, month: str, expense_id: str) -> bool:
+        try:
+            row_id = int(expense_id)
+        except (TypeError, ValueError):
+            return False
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                "SELECT id, date, category, amount, note FROM expenses WHERE id = ? AND username = ? AND month = ?",
+                (row_id, username, month),
+            ).fetchone()
+            if not row:
+                return False
+            conn.execute("DELETE FROM expenses WHERE id = ?", (row[0],))
+            removed = dict(zip(_EXPENSE_COLUMNS, row[1:]))
+            self._update_summary(conn, username, month, lambda s: s.remove(removed))
+        return True
+
+    def expenses_version(self, username: str, month: str) -> str:
+        # Ids only grow, so (count, max id) identifies the row set
+        count, max_id = self._conn().execute(
+            "SELECT COUNT(*), MAX(id) FROM expenses WHERE username = ? AND month = ?", (username, month)
+        ).fetchone()
+        return f"{count}-{max_id or 0}"
+
+    # Called inside the transaction that changed the rows, so the summary
+    # commits or rolls back together with them.
+    def _update_summary(
+        self, conn: sqlite3.Connection, username: str, month: str, apply: Callable[[MonthSummary], Any]
+    ) -> None:
+        row = conn.execute(
+            "SELECT data FROM expense_summaries WHERE username = ? AND month = ?", (username, month)
+        ).fetchone()
+        if row:
+            summary = MonthSummary.from_dict(json.loads(row[0]))
+            apply(summary)
+        else:
+            summary = self._build_summary(conn, username, month)
+        self._put_summary(conn, username, month, summary)
+
+    def _build_summary(self, conn: sqlite3.Connection, username: str, month: str) -> MonthSummary:
+        rows = conn.execute(
+            "SELECT date, category, amount, note FROM expenses WHERE username = ? AND month = ?", (username, month)
+        )
+        return MonthSummary.build(dict(zip(_EXPENSE_COLUMNS, r)) for r in rows)
+
+    def _put_summary(self, conn: sqlite3.Connection, username: str, month: str, summary: MonthSummary) -> None:
+        conn.execute(
+            "INSERT INTO expense_summaries (username, month, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(username, month) DO UPDATE SET data = excluded.data",
+            (username, month, _dumps(summary.to_dict())),
+        )
+
+    def month_summary(self, username: str, month: str) -> MonthSummary:
+        row = self._conn().execute(
+            "SELECT data FROM expense_summaries WHERE username = ? AND month = ?", (username, month)
+        ).fetchone()
+        if not row:
+            # No summary row yet: build one only if the month has rows, so a
+            # read of an empty month writes nothing
+            if not self._conn().execute(
+                "SELECT 1 FROM expenses WHERE username = ? AND month = ? LIMIT 1", (username, month)
+            ).fetchone():
+                return MonthSummary()
+            return self.rebuild_summary(username, month)
+        summary = MonthSummary.from_dict(json.loads(row[0]))
+        if summary.extrema_stale:
+            conn = self._conn()
+            with conn:
+                summary.min, summary.max = conn.execute(
+                    "SELECT MIN(COALESCE(amount, 0)), MAX(COALESCE(amount, 0)) FROM expenses "
+                    "WHERE username = ? AND month = ?",
+                    (username, month),
+                ).fetchone()
+                summary.extrema_stale = False
+                self._put_summary(conn, username, month, summary)
+        return summary
+
+    def rebuild_summary(self, username: str, month: str) -> MonthSummary:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            summary = self._build_summary(conn, username, month)
+            self._put_summary(conn, username, month, summary)
+        return summary
+
+    # Per-user documents
+    def get_doc(self, username: str, name: str, default: Any) -> Any:
+        row = self._conn().execute(
+            "SELECT data FROM documents WHERE username = ? AND name = ?", (username, name)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put_doc(self, username: str, name: str, data: Any) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO documents (username, name, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(username, name) DO UPDATE SET data = excluded.data",
+                (username, name, _dumps(data)),
+            )
+
+    def update_doc(self, username: str, name: str, default: Any, fn: Callable[[Any], Any]) -> Any:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data FROM documents WHERE username = ? AND name = ?", (username, name)
+            ).fetchone()
+            data = json.loads(row[0]) if row else default
+            result = fn(data)
+            if result is not None:
+                data = result
+            conn.execute(
+                "INSERT INTO documents (username, name, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(username, name) DO UPDATE SET data = excluded.data",
+                (username, name, _dumps(data)),
+            )
+        return data
+
+    # Support tickets
+    def list_tickets(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM tickets ORDER BY id").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def add_ticket(self, ticket: Dict[str, Any]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO tickets (status, data) VALUES (?, ?)", (ticket.get("status"), _dumps(ticket)))
+
+    # Logs
+    def append_log(self, name: str, entry: Dict[str, Any]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO logs (name, data) VALUES (?, ?)", (name, _dumps(entry)))
+
+    def append_logs(self, name: str, entries: List[Dict[str, Any]]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT INTO logs (name, data) VALUES (?, ?)", ((name, _dumps(e)) for e in entries))
+
+    def read_log(self, name: str) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM logs WHERE name = ? ORDER BY id", (name,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def iter_log(self, name: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        last_id = 0
+        while True:
+            rows = self._conn().execute(
+                "SELECT id, data FROM logs WHERE name = ? AND id > ? ORDER BY id LIMIT ?", (name, last_id, batch_size)
+            ).fetchall()
+            for r in rows:
+                yield json.loads(r[1])
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def count_log(self, name: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM logs WHERE name = ?", (name,)).fetchone()[0]
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import copy
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..api.utils import dump_json, ensure_dir, load_json, path_lock, read_json, update_json
+
+
+class UserRepository:
+    """``users.json`` with in-memory username and email hash indexes.
+
+    The file is parsed again only when its (mtime, size) stamp changes, so
+    edits made by another worker or by hand are picked up on the next call.
+    Saves write through to disk and refresh the indexes from the stored list.
+    Records are handed out as copies; mutate them and pass them to ``save``.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._users: List[Dict[str, Any]] = []
+        self._by_username: Dict[str, Dict[str, Any]] = {}
+        self._by_email: Dict[str, Dict[str, Any]] = {}
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _index(self, users: List[Dict[str, Any]], stamp: Optional[Tuple[int, int]]) -> None:
+        self._users = users
+        self._by_username = {u.get("username"): u for u in users}
+        # first match wins, as with the old linear scan
+        self._by_email = {}
+        for u in users:
+            self._by_email.setdefault(u.get("email"), u)
+        self._stamp = stamp
+
+    def _refresh(self) -> None:
+        stamp = self._stat()
+        if stamp != self._stamp or stamp is None:
+            self._index(read_json(self.path, []), stamp)
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._users)
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._users)
+
+    def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            user = self._by_username.get(username)
+            return copy.deepcopy(user) if user else None
+
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            user = self._by_email.get(email)
+            return copy.deepcopy(user) if user else None
+
+    def exists(self, username: Optional[str] = None, email: Optional[str] = None) -> bool:
+        with self._lock:
+            self._refresh()
+            return (username is not None and username in self._by_username) or (
+                email is not None and email in self._by_email
+            )
+
+    def save(self, users: List[Dict[str, Any]]) -> None:
+        """Insert or replace ``users`` (matched by username) and write through."""
+
+        def apply(existing: List[Dict[str, Any]]) -> None:
+            positions = {u.get("username"): i for i, u in enumerate(existing)}
+            for user in users:
+                pos = positions.get(user.get("username"))
+                if pos is None:
+                    positions[user.get("username")] = len(existing)
+                    existing.append(copy.deepcopy(user))
+                else:
+                    existing[pos] = copy.deepcopy(user)
+
+        with self._lock:
+            stored = update_json(self.path, [], apply)
+            self._index(stored, self._stat())
+
+    def create(self, user: Dict[str, Any], referrer: Optional[str] = None, referral_points: int = 0) -> bool:
+        """Append ``user`` unless its username or email is taken, checked under
+        the file's write lock; a referral bonus is added to the stored referrer
+        record in the same write."""
+        ensure_dir(os.path.dirname(self.path))
+        with self._lock, path_lock(self.path).write():
+            existing = load_json(self.path, [])
+            if any(u.get("username") == user.get("username") or u.get("email") == user.get("email") for u in existing):
+                return False
+            user = copy.deepcopy(user)
+            ref = next((u for u in existing if referrer and u.get("username") == referrer), None)
+            if ref is not None:
+                ref["points"] = int(ref.get("points", 0)) + referral_points
+                user["points"] = int(user.get("points", 0)) + referral_points
+            existing.append(user)
+            dump_json(self.path, existing)
+            self._index(existing, self._stat())
+        return True
+
+    def update(self, username: str, fields: Dict[str, Any], expect: Optional[Dict[str, Any]] = None) -> bool:
+        """Set ``fields`` on the stored record under the write lock, only if
+        it still has the ``expect`` values."""
+        with self._lock, path_lock(self.path).write():
+            existing = load_json(self.path, [])
+            user = next((u for u in existing if u.get("username") == username), None)
+            if user is None or any(user.get(k) != v for k, v in (expect or {}).items()):
+                return False
+            user.update(copy.deepcopy(fields))
+            dump_json(self.path, existing)
+            self._index(existing, self._stat())
+        return True
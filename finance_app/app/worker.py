@@ -0,0 +1,27 @@
+"""Celery worker for background jobs.
+
+Run with::
+
+    celery -A finance_app.app.worker worker --loglevel=info
+
+and start the API with ``EXPORT_QUEUE=celery``. Broker and result backend
+default to ``REDIS_URL``.
+"""
+import os
+
+from celery import Celery
+
+from .services.export_jobs import run_export_job
+
+_redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+celery_app = Celery(
+    "finance_app",
+    broker=os.getenv("CELERY_BROKER_URL", _redis_url),
+    backend=os.getenv("CELERY_RESULT_BACKEND", _redis_url),
+)
+celery_app.conf.update(task_acks_late=True, worker_prefetch_multiplier=1)
+
+
+@celery_app.task(name="finance_app.render_export")
+def render_export(job_id: str) -> None:
+    run_export_job(job_id)
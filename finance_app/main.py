@@ -3,13 +3,22 @@ from typing import Optional
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Response
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.sessions import SessionMiddleware
 from .app.api.utils import read_json, users_path
 from .app.middleware.security import security_headers_middleware
 from .app.middleware.rate_limit import rate_limit_middleware
+from .app.services.assets import AssetFiles, create_asset_pipeline
+from .app.services.event_writer import close_event_writer
+from .app.services.gemini_client import close_gemini_client
+from .app.services.key_pool import flush_key_pool
+from .app.services.metrics_service import flush_metrics, get_metrics
+from .app.services.notification_dispatcher import start_notification_dispatcher, stop_notification_dispatcher
+from .app.services.page_cache import create_page_cache
+from .app.services.password_hasher import close_password_hasher
+from .app.services.reset_tokens import start_reset_token_sweeper, stop_reset_token_sweeper
 
 
 def get_env(key: str, default: Optional[str] = None) -> Optional[str]:
@@ -18,6 +27,23 @@ def get_env(key: str, default: Optional[str] = None) -> Optional[str]:
 
 
 app = FastAPI(title="Finance App", version="0.1.0")
+app.add_event_handler("startup", start_notification_dispatcher)
+app.add_event_handler("shutdown", stop_notification_dispatcher)
+app.add_event_handler("startup", start_reset_token_sweeper)
+app.add_event_handler("shutdown", stop_reset_token_sweeper)
+app.add_event_handler("shutdown", close_gemini_client)
+app.add_event_handler("shutdown", flush_key_pool)
+app.add_event_handler("shutdown", close_event_writer)
+app.add_event_handler("shutdown", flush_metrics)
+app.add_event_handler("shutdown", close_password_hasher)
+
+
+@app.exception_handler(Exception)
+async def count_server_error(request: Request, exc: Exception):
+    # Unhandled errors only; Starlette still logs and re-raises them
+    get_metrics().incr("server_errors")
+    return PlainTextResponse("Internal Server Error", status_code=500)
+
 
 # Static & Templates
 static_dir = os.path.join(os.path.dirname(__file__), "app", "static")
@@ -28,10 +54,19 @@ if not os.path.isdir(static_dir):
 if not os.path.isdir(templates_dir):
     os.makedirs(templates_dir, exist_ok=True)
 
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+assets = create_asset_pipeline(static_dir)
+assets.ensure_built()
+app.mount("/static", AssetFiles(assets), name="static")
 templates = Jinja2Templates(directory=templates_dir)
+templates.env.globals["asset_url"] = assets.url
+pages = create_page_cache(templates, versions=[assets.version])
+app.add_event_handler("startup", pages.warm)
 
 # Middleware
+# Registered before SessionMiddleware so it runs inside it and can key
+# limits by the signed-in user and plan.
+app.middleware("http")(rate_limit_middleware(100))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -45,7 +80,6 @@ app.add_middleware(SessionMiddleware, secret_key=session_secret)
 
 # Extra middlewares
 app.middleware("http")(security_headers_middleware)
-app.middleware("http")(rate_limit_middleware(100))
 
 # Routers
 from .app.api.auth import router as auth_router  # noqa: E402
@@ -65,12 +99,12 @@ app.include_router(support_router)
 app.include_router(admin_router, prefix="/admin")
 @app.get("/admin")
 async def admin_index(request: Request):
-    return templates.TemplateResponse("admin/index.html", {"request": request})
+    return await pages.response("admin/index.html", request)
 
 
 @app.get("/")
 async def index(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return await pages.response("dashboard.html", request)
 
 
 @app.get("/health")
@@ -91,97 +125,97 @@ async def favicon():
 
 @app.get("/login")
 async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return await pages.response("login.html", request)
 
 
 @app.get("/register")
 async def register_page(request: Request):
-    return templates.TemplateResponse("register.html", {"request": request})
+    return await pages.response("register.html", request)
 
 
 @app.get("/upgrade")
 async def upgrade_page(request: Request):
-    return templates.TemplateResponse("upgrade.html", {"request": request})
+    return await pages.response("upgrade.html", request)
 
 
 @app.get("/generate-plan")
 async def generate_plan_page(request: Request):
-    return templates.TemplateResponse("generate-plan.html", {"request": request})
+    return await pages.response("generate-plan.html", request)
 
 
 @app.get("/forgot-password")
 async def forgot_password_page(request: Request):
-    return templates.TemplateResponse("forgot_password.html", {"request": request})
+    return await pages.response("forgot_password.html", request)
 
 
 @app.get("/reset-password")
 async def reset_password_page(request: Request):
-    return templates.TemplateResponse("reset_password.html", {"request": request})
+    return await pages.response("reset_password.html", request)
 
 
 @app.get("/daily-chat-input")
 async def daily_chat_input_page(request: Request):
-    return templates.TemplateResponse("daily-chat-input.html", {"request": request})
+    return await pages.response("daily-chat-input.html", request)
 
 
 @app.get("/analysis")
 async def analysis_page(request: Request):
-    return templates.TemplateResponse("analysis.html", {"request": request})
+    return await pages.response("analysis.html", request)
 
 
 @app.get("/categories")
 async def categories_page(request: Request):
-    return templates.TemplateResponse("categories.html", {"request": request})
+    return await pages.response("categories.html", request)
 
 
 @app.get("/budget/edit")
 async def budget_edit_page(request: Request):
-    return templates.TemplateResponse("budget_edit.html", {"request": request})
+    return await pages.response("budget_edit.html", request)
 
 
 @app.get("/expenses")
 async def expenses_page(request: Request):
-    return templates.TemplateResponse("expenses.html", {"request": request})
+    return await pages.response("expenses.html", request)
 
 
 @app.get("/goals")
 async def goals_page(request: Request):
-    return templates.TemplateResponse("goals.html", {"request": request})
+    return await pages.response("goals.html", request)
 
 
 @app.get("/admin/users")
 async def admin_users_page(request: Request):
-    return templates.TemplateResponse("admin/users.html", {"request": request})
+    return await pages.response("admin/users.html", request)
 
 
 @app.get("/admin/api-keys")
 async def admin_keys_page(request: Request):
-    return templates.TemplateResponse("admin/api-keys.html", {"request": request})
+    return await pages.response("admin/api-keys.html", request)
 
 
 @app.get("/admin/approve-upgrade")
 async def admin_upgrade_page(request: Request):
-    return templates.TemplateResponse("admin/approve-upgrade.html", {"request": request})
+    return await pages.response("admin/approve-upgrade.html", request)
 
 
 @app.get("/admin/metrics")
 async def admin_metrics_page(request: Request):
-    return templates.TemplateResponse("admin/metrics.html", {"request": request})
+    return await pages.response("admin/metrics.html", request)
 
 
 @app.get("/admin/support")
 async def admin_support_page(request: Request):
-    return templates.TemplateResponse("admin/support.html", {"request": request})
+    return await pages.response("admin/support.html", request)
 
 
 @app.get("/admin/notifications")
 async def admin_notifications_page(request: Request):
-    return templates.TemplateResponse("admin/notifications.html", {"request": request})
+    return await pages.response("admin/notifications.html", request)
 
 
 @app.get("/admin/bank-info")
 async def admin_bank_info_page(request: Request):
-    return templates.TemplateResponse("admin/bank-info.html", {"request": request})
+    return await pages.response("admin/bank-info.html", request)
 
 
 if __name__ == "__main__":
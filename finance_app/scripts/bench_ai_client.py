@@ -0,0 +1,76 @@
+"""Measure GeminiClient throughput and latency against the in-process mock.
+
+    python finance_app/scripts/bench_ai_client.py [--requests 2000] [--concurrency 200]
+
+The mock answers after ``--latency`` seconds and fails ``--failure-rate``
+of calls with HTTP 503, so retries and breakers are exercised as well.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from finance_app.app.services.gemini_client import (  # noqa: E402
+    AIServiceError,
+    CircuitBreaker,
+    GeminiClient,
+    mock_transport,
+)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    client = GeminiClient(
+        transport=mock_transport(args.latency, args.failure_rate),
+        per_key_concurrency=args.per_key,
+        backoff_base=0.01,
+        breaker_factory=lambda: CircuitBreaker(failure_threshold=50, reset_timeout=1.0),
+    )
+    keys = [f"key-{i}" for i in range(args.keys)]
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies: list = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with gate:
+            start = time.perf_counter()
+            try:
+                await client.generate(keys[i % len(keys)], f"income: {1000 + i}", json_output=True)
+            except AIServiceError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+
+    print(f"requests:   {args.requests} ({errors} failed)")
+    print(f"throughput: {args.requests / elapsed:.0f} req/s")
+    if latencies:
+        print(f"p50:        {percentile(latencies, 0.5) * 1000:.1f} ms")
+        print(f"p99:        {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--per-key", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure enqueue cost and email delivery throughput of the notification pipeline.
+
+    python finance_app/scripts/bench_notifications.py [--emails 5000] [--batch 50] [--concurrency 4]
+
+Emails go through ``NotificationDispatcher`` and ``SmtpTransport`` to an
+in-process ``SmtpDebugServer``; ``--fail-rate`` makes the server answer that
+share of messages with a temporary 451 so retries are part of the run.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from finance_app.app.services.notification_dispatcher import NotificationDispatcher, SmtpTransport  # noqa: E402
+from finance_app.app.services.notification_queue import NotificationQueue  # noqa: E402
+from finance_app.app.services.smtp_debug import SmtpDebugServer  # noqa: E402
+from finance_app.app.storage import JsonStorage, set_storage  # noqa: E402
+
+
+async def run(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        set_storage(JsonStorage(tmp))  # dead letters
+        server = await SmtpDebugServer(keep=False, fail_rate=args.fail_rate).start()
+        queue = NotificationQueue(os.path.join(tmp, "notifications_queue.jsonl"))
+
+        start = time.perf_counter()
+        for i in range(args.emails):
+            queue.put({"kind": "email", "to": f"user{i}@example.com", "subject": "Bench", "message": f"Message {i}"})
+        enqueue = time.perf_counter() - start
+        print(f"enqueue  {args.emails} emails: {enqueue / args.emails * 1e6:.1f} us/op, journal {os.path.getsize(queue.path) / 1024:.0f} KiB")
+
+        dispatcher = NotificationDispatcher(
+            queue,
+            {"email": SmtpTransport("127.0.0.1", server.port)},
+            batch_size=args.batch,
+            concurrency={"email": args.concurrency},
+            backoff_base=0.05,
+            poll_interval=0.05,
+        )
+        start = time.perf_counter()
+        dispatcher.start()
+        while dispatcher.sent + dispatcher.failed < args.emails:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        await dispatcher.stop()
+        await server.stop()
+        print(
+            f"deliver  {dispatcher.sent} sent, {dispatcher.failed} dead in {elapsed:.2f}s: "
+            f"{dispatcher.sent / elapsed:.0f} emails/sec (batch {args.batch}, concurrency {args.concurrency}, "
+            f"server saw {server.received} DATA)"
+        )
+        queue.compact(force=True)
+        print(f"pending  {len(queue)}, journal after compaction {os.path.getsize(queue.path) / 1024:.0f} KiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
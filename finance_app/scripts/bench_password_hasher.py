@@ -0,0 +1,108 @@
+"""Measure request latency on a worker while it handles a burst of logins.
+
+    python finance_app/scripts/bench_password_hasher.py [--logins-per-sec 50] [--seconds 10]
+
+A probe requests ``--path`` every 20 ms while logins arrive at the given
+rate, first with no logins (baseline), then with bcrypt on the hasher pool,
+then with bcrypt run on the event loop as the handlers used to (``inline``).
+Each login comes from its own client address so the per-IP rate limit does
+not reject it.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import httpx  # noqa: E402
+
+from finance_app.app.services import password_hasher  # noqa: E402
+from finance_app.app.services.password_hasher import PasswordHasher, _hash  # noqa: E402
+from finance_app.app.storage import JsonStorage, set_storage  # noqa: E402
+from finance_app.main import app  # noqa: E402
+
+
+class InlineHasher(PasswordHasher):
+    """The old behaviour: bcrypt on the event loop."""
+
+    async def _run(self, fn, *args):
+        return fn(*args)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+async def probe(client: httpx.AsyncClient, path: str, stop: asyncio.Event, latencies: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.02)
+
+
+async def login(n: int, users: int, password: str, status: list) -> None:
+    transport = httpx.ASGITransport(app=app, client=(f"10.{n // 62500 % 250}.{n // 250 % 250}.{n % 250}", 40000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.post("/auth/login", json={"username_or_email": f"user{n % users}", "password": password})
+        status.append(r.status_code)
+
+
+async def phase(name: str, args: argparse.Namespace, rate: float) -> None:
+    latencies: list = []
+    status: list = []
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        prober = asyncio.create_task(probe(client, args.path, stop, latencies))
+        tasks = []
+        start = time.perf_counter()
+        n = 0
+        while time.perf_counter() - start < args.seconds:
+            if rate:
+                tasks.append(asyncio.create_task(login(n, args.users, args.password, status)))
+                n += 1
+                await asyncio.sleep(max(0.0, start + n / rate - time.perf_counter()))
+            else:
+                await asyncio.sleep(0.1)
+        await asyncio.gather(*tasks)
+        stop.set()
+        await prober
+    ok = sum(1 for s in status if s == 200)
+    print(
+        f"{name:9} logins {len(status):4} ok {ok:4} busy {status.count(503):4} | "
+        f"{args.path} p50 {percentile(latencies, 0.5):7.1f} ms  p99 {percentile(latencies, 0.99):7.1f} ms  "
+        f"max {max(latencies or [0]):7.1f} ms"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JsonStorage(tmp)
+        hashed = _hash(args.password, args.rounds)
+        store.save_users([{"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": hashed, "plan": "free"} for i in range(args.users)])
+        set_storage(store)
+        await phase("baseline", args, 0)
+        password_hasher._hasher = PasswordHasher(rounds=args.rounds, workers=args.workers)
+        await phase("pool", args, args.logins_per_sec)
+        password_hasher._hasher = InlineHasher(rounds=args.rounds)
+        await phase("inline", args, args.logins_per_sec)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins-per-sec", type=float, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--password", default="correct horse battery staple")
+    parser.add_argument("--path", default="/health")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
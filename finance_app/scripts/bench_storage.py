@@ -0,0 +1,107 @@
+"""Compare the JSON and SQLite storage backends on a synthetic data set.
+
+    python finance_app/scripts/bench_storage.py [--users 10000] [--expenses 100000]
+
+Expenses are spread over ``--heavy-users`` users in one month, so each
+heavy user holds a large month of expenses.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from finance_app.app.api.utils import write_json  # noqa: E402
+from finance_app.app.storage import JsonStorage, SQLiteStorage  # noqa: E402
+
+MONTH = "2025-09"
+
+
+def make_user(i: int) -> dict:
+    return {
+        "username": f"user{i}",
+        "email": f"user{i}@example.com",
+        "password_hash": "$2b$12$" + "x" * 53,
+        "plan": "free",
+        "plan_usage": {"ai_month": 0, "ai_day": 0, "voice_month": 0},
+        "points": 0,
+    }
+
+
+def make_expense(i: int) -> dict:
+    return {"date": f"{MONTH}-{i % 28 + 1:02d}", "category": "Ăn uống", "amount": 1000.0 + i, "note": f"item {i}"}
+
+
+def seed_json(store: JsonStorage, users: list, per_user: dict) -> None:
+    write_json(store._users_path(), users)
+    for username, rows in per_user.items():
+        # Seed the legacy array layout, then convert it to the append-only log
+        write_json(store._legacy_expenses_path(username, MONTH), list(reversed(rows)))
+        store.rebuild_summary(username, MONTH)
+
+
+def seed_sqlite(store: SQLiteStorage, users: list, per_user: dict) -> None:
+    store.save_users(users)
+    for username, rows in per_user.items():
+        store.import_expenses(username, MONTH, rows)
+
+
+def timed(label: str, fn, repeat: int) -> None:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<28} {elapsed * 1000:9.3f} ms/op")
+
+
+def run(store, repeat: int, heavy: str) -> None:
+    print(f"[{store.name}]")
+
+    added = []
+
+    def add_expense(i):
+        added.append(store.add_expense(heavy, MONTH, make_expense(i))["id"])
+
+    def delete_expense(i):
+        store.delete_expense(heavy, MONTH, added[i])
+
+    def bump_quota(i):
+        user = store.get_user("user42")
+        user["plan_usage"]["ai_month"] += 1
+        store.save_user(user)
+
+    timed("add_expense", add_expense, repeat)
+    timed("delete_expense", delete_expense, repeat)
+    timed("bump quota (get+save user)", bump_quota, repeat)
+    timed("get_user_by_email", lambda i: store.get_user_by_email(f"user{i}@example.com"), repeat)
+    timed("list_expenses (heavy month)", lambda i: store.list_expenses(heavy, MONTH), repeat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--heavy-users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    users = [make_user(i) for i in range(args.users)]
+    per_user: dict = {}
+    for i in range(args.expenses):
+        per_user.setdefault(f"user{i % args.heavy_users}", []).append(make_expense(i))
+    print(f"{args.users} users, {args.expenses} expenses across {args.heavy_users} heavy users")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_store = JsonStorage(os.path.join(tmp, "json"))
+        seed_json(json_store, users, per_user)
+        run(json_store, args.repeat, "user0")
+
+        sqlite_store = SQLiteStorage(os.path.join(tmp, "finance.db"))
+        seed_sqlite(sqlite_store, users, per_user)
+        run(sqlite_store, args.repeat, "user0")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+from finance_app.app.services.cache_service import CacheService, MemoryCacheBackend, RedisCacheBackend
+from finance_app.app.services.redis_client import InMemoryRedis
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_memory_ttl_expiry_counts_expirations():
+    clock = FakeClock()
+    cache = CacheService(MemoryCacheBackend(clock=clock))
+    cache.set("a", 1, ttl_seconds=10)
+    assert cache.get("a") == 1
+    clock.now += 10
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+    assert stats["entries"] == 0
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = CacheService(MemoryCacheBackend(max_entries=2))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_byte_bound_and_oversized_values():
+    backend = MemoryCacheBackend(max_bytes=10)
+    backend.set("a", "x" * 6, None)
+    backend.set("b", "y" * 6, None)
+    assert backend.get("a") is None and backend.get("b") == "y" * 6
+    backend.set("big", "z" * 11, None)
+    assert backend.get("big") is None
+    assert backend.info()["bytes"] == 6
+
+
+def test_hit_rate_and_decorator():
+    cache = CacheService()
+    calls = []
+
+    @cache.cached(ttl_seconds=60)
+    async def square(n):
+        calls.append(n)
+        return n * n
+
+    assert asyncio.run(square(3)) == 9
+    assert asyncio.run(square(3)) == 9
+    assert calls == [3]
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_decorator_keeps_blocking_backends_off_the_event_loop():
+    threads = []
+
+    class RecordingRedis(InMemoryRedis):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+    cache = CacheService(RedisCacheBackend(RecordingRedis()))
+
+    @cache.cached(ttl_seconds=60)
+    async def double(n):
+        return n * 2
+
+    async def run():
+        return [await double(4), await double(4)], threading.current_thread()
+
+    results, loop_thread = asyncio.run(run())
+    assert results == [8, 8]
+    assert threads and loop_thread not in threads
+    assert cache.stats()["hits"] == 1
+
+
+def test_redis_backend_roundtrip_and_ttl():
+    cache = CacheService(RedisCacheBackend(InMemoryRedis()))
+    cache.set("k", {"v": [1, 2]}, ttl_seconds=0.05)
+    assert cache.get("k") == {"v": [1, 2]}
+    time.sleep(0.06)
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_redis_clear_only_touches_prefix_in_batches():
+    client = InMemoryRedis()
+    client.set("other:keep", "1")
+    backend = RedisCacheBackend(client)
+    for i in range(1203):
+        backend.set(f"k{i}", i, None)
+    backend.clear(batch=100)
+    assert client.keys("cache:*") == []
+    assert client.get("other:keep") == b"1"
+
+
+def test_analytics_results_are_cached_per_storage_version(monkeypatch):
+    from datetime import date
+
+    from finance_app.app.api import finance
+    from finance_app.app.services import cache_service
+
+    calls = []
+
+    class FakeAnalytics:
+        def analyze(self, *args):
+            calls.append(args)
+            return {"total": 1.0}
+
+    monkeypatch.setattr(cache_service, "_cache", CacheService())
+    monkeypatch.setattr(finance, "get_analytics_service", lambda: FakeAnalytics())
+    args = ("alice", date(2024, 5, 1), date(2024, 5, 31), "month", 3)
+    assert asyncio.run(finance._analyze(*args, "json:1-10")) == {"total": 1.0}
+    asyncio.run(finance._analyze(*args, "json:1-10"))
+    assert len(calls) == 1
+    asyncio.run(finance._analyze(*args, "json:2-20"))
+    assert len(calls) == 2
@@ -0,0 +1,65 @@
+import pytest
+
+from finance_app.app.storage import JsonStorage, SQLiteStorage
+from finance_app.app.storage.base import StorageBackend
+from finance_app.app.storage.query import ExpenseFilter
+
+MONTH = "2024-05"
+
+
+@pytest.fixture(params=["json", "sqlite", "generic"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteStorage(str(tmp_path / "finance.db"))
+    store = JsonStorage(str(tmp_path))
+    if request.param == "generic":
+        # The StorageBackend default, used by backends without their own query
+        store.query_expenses = StorageBackend.query_expenses.__get__(store)
+    return store
+
+
+def add(store, notes):
+    store.add_expenses("alice", MONTH, [
+        {"date": f"{MONTH}-{i + 1:02d}", "category": "food", "amount": 10 * (i + 1), "note": note}
+        for i, note in enumerate(notes)
+    ])
+
+
+def pages(store, flt, limit):
+    out, cursor = [], None
+    while True:
+        rows, cursor = store.query_expenses("alice", MONTH, flt, limit, cursor)
+        out.append([r["note"] for r in rows])
+        if cursor is None:
+            return out
+
+
+def test_no_trailing_empty_page_when_older_rows_miss_the_note_filter(store):
+    # Newest first: the last two matches fill the second page exactly and
+    # only non-matching rows remain after them
+    add(store, ["other", "other", "lunch 1", "lunch 2", "other", "lunch 3", "lunch 4"])
+    assert pages(store, ExpenseFilter(note="lunch"), 2) == [["lunch 4", "lunch 3"], ["lunch 2", "lunch 1"]]
+
+
+def test_cursor_walks_all_matches(store):
+    add(store, [f"note {i}" for i in range(7)])
+    assert pages(store, ExpenseFilter(), 3) == [
+        ["note 6", "note 5", "note 4"],
+        ["note 3", "note 2", "note 1"],
+        ["note 0"],
+    ]
+
+
+def test_field_filters_and_exact_fit(store):
+    add(store, ["a", "b", "c", "d"])
+    assert pages(store, ExpenseFilter(min_amount=30), 2) == [["d", "c"]]
+
+
+def test_delete_by_id(store):
+    add(store, ["a", "b", "c"])
+    rows = store.list_expenses("alice", MONTH)
+    assert store.delete_expense("alice", MONTH, rows[1]["id"])
+    assert not store.delete_expense("alice", MONTH, rows[1]["id"])
+    assert not store.delete_expense("alice", MONTH, "999999")
+    assert [r["note"] for r in store.list_expenses("alice", MONTH)] == ["c", "a"]
+    assert store.month_summary("alice", MONTH).total == 40
@@ -0,0 +1,49 @@
+import json
+import os
+import time
+
+import pytest
+
+from finance_app.app.services import export_jobs
+from finance_app.app.services.export_jobs import ExportJobService, artifact_path
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "exports_dir", lambda: str(tmp_path))
+    return tmp_path
+
+
+def write_job(root, job_id, status, age, artifact_age=None):
+    now = time.time()
+    job = {"id": job_id, "status": status, "created_at": now - age, "finished_at": now - age}
+    (root / f"{job_id}.json").write_text(json.dumps(job))
+    if artifact_age is not None:
+        path = artifact_path(job)
+        with open(path, "wb") as f:
+            f.write(b"data")
+        os.utime(path, (now - artifact_age, now - artifact_age))
+    return job
+
+
+def test_old_job_and_artifact_are_removed_together(root):
+    write_job(root, "old", "done", age=2 * 3600, artifact_age=2 * 3600)
+    assert ExportJobService(queue=object()).cleanup(max_age=3600, force=True) == 1
+    assert os.listdir(root) == []
+
+
+def test_recent_done_job_keeps_an_old_artifact(root):
+    # The artifact's mtime alone must not expire a job whose record is fresh
+    job = write_job(root, "fresh", "done", age=60, artifact_age=2 * 3600)
+    ExportJobService(queue=object()).cleanup(max_age=3600, force=True)
+    assert os.path.exists(artifact_path(job))
+    assert export_jobs.get_job("fresh")["status"] == "done"
+
+
+def test_running_job_is_kept_and_orphans_are_removed(root):
+    write_job(root, "running", "running", age=0)
+    orphan = root / "gone.bin"
+    orphan.write_bytes(b"x")
+    os.utime(orphan, (time.time() - 7200, time.time() - 7200))
+    ExportJobService(queue=object()).cleanup(max_age=3600, force=True)
+    assert sorted(os.listdir(root)) == ["running.json"]
@@ -0,0 +1,50 @@
+import pytest
+
+from finance_app.app.storage import JsonStorage, SQLiteStorage
+from finance_app.app.storage.migrate import TargetNotEmpty, migrate
+
+
+@pytest.fixture
+def source(tmp_path):
+    store = JsonStorage(str(tmp_path / "data"))
+    store.save_users([{"username": "alice", "email": "a@example.com"}])
+    store.add_expenses("alice", "2024-05", [
+        {"date": "2024-05-01", "category": "food", "amount": 10, "note": "first"},
+        {"date": "2024-05-02", "category": "food", "amount": 20, "note": "second"},
+    ])
+    store.add_ticket({"username": "alice", "subject": "help", "status": "open"})
+    store.append_logs("ai_call_log", [{"user": "alice", "n": i} for i in range(3)])
+    return store
+
+
+def test_migrate_copies_everything_once(source, tmp_path):
+    target = SQLiteStorage(str(tmp_path / "finance.db"))
+    counts = migrate(source, target)
+    assert (counts["users"], counts["expenses"], counts["tickets"], counts["logs"]) == (1, 2, 1, 3)
+    assert [r["note"] for r in target.list_expenses("alice", "2024-05")] == ["second", "first"]
+    assert target.month_summary("alice", "2024-05").total == 30
+
+
+def test_second_run_is_refused_and_changes_nothing(source, tmp_path):
+    target = SQLiteStorage(str(tmp_path / "finance.db"))
+    migrate(source, target)
+    before = target.row_counts()
+    with pytest.raises(TargetNotEmpty):
+        migrate(source, target)
+    assert target.row_counts() == before
+
+
+def test_force_replaces_instead_of_duplicating(source, tmp_path):
+    target = SQLiteStorage(str(tmp_path / "finance.db"))
+    migrate(source, target)
+    before = target.row_counts()
+    migrate(source, target, force=True)
+    assert target.row_counts() == before
+    assert len(target.list_expenses("alice", "2024-05")) == 2
+    assert len(target.read_log("ai_call_log")) == 3
+
+
+def test_summary_of_an_empty_month_writes_nothing(tmp_path):
+    target = SQLiteStorage(str(tmp_path / "finance.db"))
+    assert target.month_summary("alice", "2024-06").count == 0
+    assert target.row_counts()["expense_summaries"] == 0
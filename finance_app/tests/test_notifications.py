@@ -0,0 +1,127 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from finance_app.app import storage
+from finance_app.app.services.notification_dispatcher import NotificationDispatcher, SmtpTransport
+from finance_app.app.services.notification_queue import NotificationQueue, read_pending
+from finance_app.app.services.smtp_debug import SmtpDebugServer
+from finance_app.app.storage import JsonStorage
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_storage", JsonStorage(str(tmp_path)))  # dead letters
+    return NotificationQueue(str(tmp_path / "notifications_queue.jsonl"))
+
+
+def emails(n):
+    return [{"kind": "email", "to": f"user{i}@example.com", "subject": "Test", "message": f"Message {i}"} for i in range(n)]
+
+
+async def run_dispatcher(queue, total, fail_rate=0.0, max_attempts=5, timeout=10.0):
+    server = await SmtpDebugServer(fail_rate=fail_rate).start()
+    dispatcher = NotificationDispatcher(
+        queue,
+        {"email": SmtpTransport("127.0.0.1", server.port)},
+        batch_size=8,
+        concurrency={"email": 2},
+        max_attempts=max_attempts,
+        backoff_base=0.01,
+        backoff_max=0.05,
+        poll_interval=0.01,
+    )
+    dispatcher.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while dispatcher.sent + dispatcher.failed < total:
+            assert time.monotonic() < deadline, "dispatcher did not finish"
+            await asyncio.sleep(0.01)
+    finally:
+        await dispatcher.stop()
+        await server.stop()
+    return dispatcher, server
+
+
+def journal_ops(queue):
+    with open(queue.path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_delivers_and_acks_every_message(queue):
+    queue.put_many(emails(20))
+    dispatcher, server = asyncio.run(run_dispatcher(queue, 20))
+    assert (dispatcher.sent, dispatcher.failed) == (20, 0)
+    assert sorted(rcpt[0] for _, rcpt, _ in server.messages) == sorted(m["to"] for m in emails(20))
+    assert len(queue) == 0
+    assert sum(op["op"] == "ack" for op in journal_ops(queue)) == 20
+    assert read_pending(queue.path) == []
+
+
+def test_temporary_failures_are_retried_with_backoff(queue):
+    queue.put_many(emails(20))
+    dispatcher, server = asyncio.run(run_dispatcher(queue, 20, fail_rate=0.5, max_attempts=10))
+    assert (dispatcher.sent, dispatcher.failed) == (20, 0)
+    assert len(server.messages) == 20 and server.received > 20
+    retries = [op for op in journal_ops(queue) if op["op"] == "retry"]
+    assert retries and all("451" in op["error"] and op["attempts"] >= 1 for op in retries)
+
+
+def test_backoff_is_full_jitter_and_capped(queue):
+    dispatcher = NotificationDispatcher(queue, {}, backoff_base=2.0, backoff_max=10.0)
+    for attempts, cap in ((1, 2.0), (2, 4.0), (3, 8.0), (6, 10.0)):
+        delays = [dispatcher._backoff(attempts) for _ in range(200)]
+        assert all(0 <= d <= cap for d in delays)
+        assert max(delays) > cap / 2
+
+
+def test_dead_letters_after_max_attempts(queue):
+    queue.put_many(emails(5) + [{"kind": "email", "subject": "no recipient"}])
+    dispatcher, server = asyncio.run(run_dispatcher(queue, 6, fail_rate=1.0, max_attempts=3))
+    assert (dispatcher.sent, dispatcher.failed) == (0, 6)
+    assert server.received == 5 * 3  # the message without a recipient is never sent
+    dead = storage.get_storage().read_log("notifications_dead")
+    assert sorted(d["attempts"] for d in dead) == [1, 3, 3, 3, 3, 3]
+    assert len(queue) == 0
+
+
+def test_journal_replay_and_compaction(queue):
+    ids = queue.put_many(emails(5))
+    queue.poll()
+    taken = queue.take(3)
+    queue.ack([m["id"] for m in taken[:2]])
+    queue.retry(taken[2]["id"], 1, time.time() + 60, "451 later")
+
+    # A fresh consumer replays the journal to the same state
+    replay = NotificationQueue(queue.path)
+    replay.poll()
+    pending = {m["id"]: m for m in replay.pending()}
+    assert set(pending) == set(ids) - {m["id"] for m in taken[:2]}
+    assert pending[taken[2]["id"]]["attempts"] == 1
+    assert replay.take(10) and replay.next_due() is not None
+
+    assert queue.compact(force=True)
+    ops = journal_ops(queue)
+    assert len(ops) == 3 and all(op["op"] == "enq" for op in ops)
+    queue.put({"kind": "email", "to": "late@example.com"})  # appends after compaction are kept
+    compacted = NotificationQueue(queue.path)
+    compacted.poll()
+    assert len(compacted) == 4
+    assert {m["id"]: m["attempts"] for m in compacted.pending()}[taken[2]["id"]] == 1
+
+
+def test_legacy_queue_is_imported_once_by_concurrent_workers(queue, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    legacy = tmp_path / "notifications_queue.json"
+    legacy.write_text(json.dumps(emails(2000)))
+    workers = [NotificationQueue(queue.path) for _ in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        imported = list(pool.map(lambda q: q.import_legacy(str(legacy)), workers))
+    assert sorted(imported) == [0] * 7 + [2000]
+    assert not legacy.exists() and (tmp_path / "notifications_queue.json.bak").exists()
+    replay = NotificationQueue(queue.path)
+    replay.poll()
+    assert len(replay) == 2000
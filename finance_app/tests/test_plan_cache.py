@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from finance_app.app.services.plan_cache import SingleFlight
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    async def main():
+        flights, calls = SingleFlight(), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "plan"
+
+        return await asyncio.gather(*(flights.do("k", fetch) for _ in range(10))), calls
+
+    results, calls = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 9
+    assert all(value == "plan" for value, _ in results)
+
+
+def test_errors_are_shared():
+    async def main():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        return await asyncio.gather(*(flights.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+
+def test_cancelled_leader_hands_over_to_a_follower():
+    async def main():
+        flights, calls = SingleFlight(), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "plan"
+
+        leader = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flights.do("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers), calls
+
+    results, calls = asyncio.run(main())
+    assert len(calls) == 2
+    assert [value for value, _ in results] == ["plan"] * 3
+    assert sorted(shared for _, shared in results) == [False, True, True]
+
+
+def test_cancelled_follower_does_not_affect_others():
+    async def main():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.03)
+            return "plan"
+
+        leader = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("k", fetch))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == ("plan", False)
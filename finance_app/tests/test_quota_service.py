@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from finance_app.app.services.quota_service import (
+    MemoryQuotaBackend,
+    QuotaRule,
+    QuotaService,
+    RedisQuotaBackend,
+    SQLiteQuotaBackend,
+    legacy_usage,
+    period_window,
+)
+from finance_app.app.services.redis_client import InMemoryRedis
+
+RULES = [QuotaRule("ai_day", "day", 10), QuotaRule("ai_month", "month", 50)]
+
+
+@pytest.fixture(params=["memory", "redis", "sqlite"])
+def service(request, tmp_path):
+    if request.param == "memory":
+        return QuotaService(MemoryQuotaBackend())
+    if request.param == "sqlite":
+        return QuotaService(SQLiteQuotaBackend(str(tmp_path / "quota.db")))
+    return QuotaService(RedisQuotaBackend(InMemoryRedis()))
+
+
+def test_concurrent_consume_admits_exactly_limit(service):
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        decisions = list(pool.map(lambda _: service.consume("alice", RULES), range(100)))
+    admitted = [d for d in decisions if d.allowed]
+    assert len(admitted) == 10
+    assert all(d.exceeded == "ai_day" for d in decisions if not d.allowed)
+    assert service.usage("alice", RULES) == {"ai_day": 10, "ai_month": 10}
+
+
+def test_refunds_restore_counters(service):
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        decisions = list(pool.map(lambda _: service.consume("bob", RULES), range(100)))
+    admitted = [d for d in decisions if d.allowed]
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(service.refund, admitted[:4] + [d for d in decisions if not d.allowed]))
+    assert service.usage("bob", RULES) == {"ai_day": 6, "ai_month": 6}
+    assert sum(service.consume("bob", RULES).allowed for _ in range(10)) == 4
+
+
+def test_rejected_call_charges_nothing(service):
+    rules = [QuotaRule("ai_month", "month", 50), QuotaRule("voice_day", "day", 0)]
+    decision = service.consume("carol", rules)
+    assert not decision.allowed and decision.exceeded == "voice_day"
+    assert service.usage("carol", rules) == {"ai_month": 0, "voice_day": 0}
+
+
+class FlakyRedis(InMemoryRedis):
+    """Fails every ``pexpire``, i.e. after the first INCRBY has been applied."""
+
+    def pexpire(self, key, ms):
+        raise ConnectionError("redis went away")
+
+
+def test_redis_failure_fails_open_without_charging():
+    client = FlakyRedis()
+    service = QuotaService(RedisQuotaBackend(client))
+    decision = service.consume("dave", RULES)
+    assert decision.allowed and decision.keys == ()
+    service.refund(decision)
+    assert service.usage("dave", RULES) == {"ai_day": 0, "ai_month": 0}
+
+
+def test_sqlite_counters_are_shared_and_survive_restarts(tmp_path):
+    path = str(tmp_path / "quota.db")
+    workers = [QuotaService(SQLiteQuotaBackend(path)) for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        decisions = list(pool.map(lambda i: workers[i % 4].consume("erin", RULES), range(100)))
+    assert sum(d.allowed for d in decisions) == 10
+    restarted = QuotaService(SQLiteQuotaBackend(path))
+    assert restarted.usage("erin", RULES) == {"ai_day": 10, "ai_month": 10}
+    assert not restarted.consume("erin", RULES).allowed
+
+
+def test_sqlite_backend_is_seeded_once_from_plan_usage(tmp_path):
+    now = 1717243200.0  # 2024-06-01 12:00 UTC
+    day, _ = period_window("day", now)
+    month, _ = period_window("month", now)
+    users = [
+        {"username": "fay", "plan_usage": {"ai_day": 3, "ai_month": 40, "voice_month": 2}, "last_reset_day": day, "last_reset_month": month},
+        # Counted on an earlier day and month: the old code would have reset these
+        {"username": "gus", "plan_usage": {"ai_day": 9, "ai_month": 9}, "last_reset_day": "2024-05-31", "last_reset_month": "2024-05"},
+    ]
+    calls = []
+
+    def seed():
+        calls.append(1)
+        return legacy_usage(users, "quota:", now)
+
+    path = str(tmp_path / "quota.db")
+    service = QuotaService(SQLiteQuotaBackend(path, clock=lambda: now, seed=seed), clock=lambda: now)
+    voice = [QuotaRule("voice_month", "month", 5)]
+    assert service.usage("fay", RULES + voice) == {"ai_day": 3, "ai_month": 40, "voice_month": 2}
+    assert service.usage("gus", RULES) == {"ai_day": 0, "ai_month": 0}
+    service.consume("fay", RULES)
+    again = QuotaService(SQLiteQuotaBackend(path, clock=lambda: now, seed=seed), clock=lambda: now)
+    assert again.usage("fay", RULES) == {"ai_day": 4, "ai_month": 41}
+    assert len(calls) == 1
@@ -0,0 +1,92 @@
+import pytest
+
+from finance_app.app.services.rate_limiter import MemoryRateLimitBackend, RedisRateLimitBackend
+from finance_app.app.services.redis_client import InMemoryRedis
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "redis"])
+def limiter(request):
+    clock = FakeClock(6000.0)  # start of a 60 s window
+    if request.param == "memory":
+        return MemoryRateLimitBackend(clock=clock), clock
+    return RedisRateLimitBackend(InMemoryRedis(), clock=clock), clock
+
+
+def hits(backend, n, key="k", limit=10):
+    return [backend.hit(key, limit, 60) for _ in range(n)]
+
+
+def test_limit_within_one_window(limiter):
+    backend, _ = limiter
+    decisions = hits(backend, 12)
+    assert [d.allowed for d in decisions] == [True] * 10 + [False] * 2
+    assert [d.remaining for d in decisions[:3]] == [9, 8, 7]
+    assert decisions[-1].retry_after >= 1
+
+
+def test_previous_window_is_weighted_by_overlap(limiter):
+    backend, clock = limiter
+    hits(backend, 10)
+    # A quarter into the next window 75% of the previous count still applies;
+    # a request fits while 10 * 0.75 + curr + 1 <= 10, i.e. for curr 0 and 1
+    clock.now += 60 + 15
+    assert [d.allowed for d in hits(backend, 3)] == [True, True, False]
+    # Three quarters in 2.5 remain: curr may grow from 2 to 7
+    clock.now += 30
+    assert [d.allowed for d in hits(backend, 6)] == [True] * 5 + [False]
+
+
+def test_window_rollover_forgets_older_windows(limiter):
+    backend, clock = limiter
+    hits(backend, 10)
+    clock.now += 120  # two windows later nothing of the burst remains
+    assert all(d.allowed for d in hits(backend, 10))
+
+
+def test_rejected_requests_are_not_counted(limiter):
+    backend, clock = limiter
+    hits(backend, 30)  # 10 allowed, 20 rejected
+    clock.now += 60 + 30  # half of the previous 10 still counts
+    assert [d.allowed for d in hits(backend, 6)] == [True] * 5 + [False]
+
+
+def test_retry_after_points_at_next_free_slot(limiter):
+    backend, clock = limiter
+    clock.now += 30
+    rejected = hits(backend, 11)[-1]
+    assert not rejected.allowed
+    clock.now += rejected.retry_after
+    assert backend.hit("k", 10, 60).allowed
+
+
+def test_zero_limit_blocks(limiter):
+    backend, _ = limiter
+    decision = backend.hit("k", 0, 60)
+    assert not decision.allowed and decision.retry_after == 60
+
+
+def test_keys_are_independent(limiter):
+    backend, _ = limiter
+    hits(backend, 10, key="a")
+    assert backend.hit("b", 10, 60).allowed
+    assert not backend.hit("a", 10, 60).allowed
+
+
+def test_rejection_by_a_later_rule_gives_back_earlier_hits(limiter):
+    backend, _ = limiter
+    from finance_app.app.services.rate_limiter import RateLimiter
+
+    rl = RateLimiter(backend)
+    checks = [("all:ip", 10), ("login:ip", 2)]
+    results = [rl.hit_many(checks)[-1].allowed for _ in range(5)]
+    assert results == [True, True, False, False, False]
+    # Only the two admitted logins were charged to the general budget
+    assert [d.allowed for d in hits(backend, 9, key="all:ip")] == [True] * 8 + [False]
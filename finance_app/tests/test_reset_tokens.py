@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from finance_app.app import storage
+from finance_app.app.api import auth
+from finance_app.app.services.redis_client import InMemoryRedis
+from finance_app.app.services.reset_tokens import (
+    JsonResetTokenBackend,
+    RedisResetTokenBackend,
+    ResetTokenError,
+    ResetTokenStore,
+)
+from finance_app.app.storage import JsonStorage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["json", "redis"])
+def clock_and_tokens(request, tmp_path):
+    clock = Clock()
+    if request.param == "json":
+        backend = JsonResetTokenBackend(str(tmp_path / "password_resets.json"), clock=clock)
+    else:
+        backend = RedisResetTokenBackend(InMemoryRedis(), clock=clock)
+    return clock, ResetTokenStore(backend, ttl=60, clock=clock)
+
+
+def test_check_does_not_use_the_token_up(clock_and_tokens):
+    _, tokens = clock_and_tokens
+    token = tokens.issue("alice")
+    assert tokens.check(token) == "alice"
+    assert tokens.consume(token) == "alice"
+    with pytest.raises(ResetTokenError):
+        tokens.check(token)
+    with pytest.raises(ResetTokenError):
+        tokens.consume(token)
+
+
+def test_expired_token_is_rejected_by_check(tmp_path):
+    clock = Clock()
+    tokens = ResetTokenStore(JsonResetTokenBackend(str(tmp_path / "r.json"), clock=clock), ttl=60, clock=clock)
+    token = tokens.issue("alice")
+    clock.now += 61
+    with pytest.raises(ResetTokenError, match="expired"):
+        tokens.check(token)
+
+
+class CountingHasher:
+    def __init__(self):
+        self.calls = 0
+
+    async def hash(self, password):
+        self.calls += 1
+        return "hashed:" + password
+
+
+@pytest.fixture
+def app_state(tmp_path, monkeypatch):
+    store = JsonStorage(str(tmp_path / "data"))
+    store.create_user({"username": "alice", "email": "a@example.com", "password_hash": "old", "plan": "pro"})
+    tokens = ResetTokenStore(JsonResetTokenBackend(str(tmp_path / "data" / "password_resets.json")))
+    hasher = CountingHasher()
+    monkeypatch.setattr(storage, "_storage", store)
+    monkeypatch.setattr(auth, "get_reset_tokens", lambda: tokens)
+    monkeypatch.setattr(auth, "get_password_hasher", lambda: hasher)
+    return store, tokens, hasher
+
+
+def test_bogus_token_costs_no_hash(app_state):
+    _, _, hasher = app_state
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(auth.reset_password(auth.ResetPasswordRequest(token="bogus", new_password="pw")))
+    assert exc.value.status_code == 400
+    assert hasher.calls == 0
+
+
+def test_reset_sets_only_the_hash(app_state):
+    store, tokens, hasher = app_state
+    token = tokens.issue("alice")
+    asyncio.run(auth.reset_password(auth.ResetPasswordRequest(token=token, new_password="pw")))
+    assert hasher.calls == 1
+    assert store.get_user("alice")["password_hash"] == "hashed:pw"
+    assert store.get_user("alice")["plan"] == "pro"
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from finance_app.app.storage import JsonStorage, SQLiteStorage
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        return JsonStorage(str(tmp_path / "data"))
+    return SQLiteStorage(str(tmp_path / "finance.db"))
+
+
+def test_create_user_refuses_taken_username_or_email(store):
+    assert store.create_user({"username": "alice", "email": "a@example.com", "password_hash": "h1"})
+    assert not store.create_user({"username": "alice", "email": "other@example.com", "password_hash": "h2"})
+    assert not store.create_user({"username": "bob", "email": "a@example.com", "password_hash": "h3"})
+    assert store.get_user("alice")["password_hash"] == "h1"
+    assert store.get_user("bob") is None
+
+
+def test_concurrent_registrations_keep_the_first_account(store):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def register(i):
+        barrier.wait()
+        results.append(store.create_user({"username": "alice", "email": f"a{i}@example.com", "password_hash": f"h{i}"}))
+
+    threads = [threading.Thread(target=register, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert len(store.list_users()) == 1
+
+
+def test_referral_bonus_updates_the_stored_referrer(store):
+    store.create_user({"username": "ref", "email": "r@example.com", "points": 0})
+    # Changed after the registration request would have read it
+    store.save_user({"username": "ref", "email": "r@example.com", "points": 7, "plan": "pro"})
+    assert store.create_user({"username": "new", "email": "n@example.com", "points": 0}, referrer="ref", referral_points=50)
+    assert store.get_user("ref")["points"] == 57
+    assert store.get_user("ref")["plan"] == "pro"
+    assert store.get_user("new")["points"] == 50
+    store.create_user({"username": "solo", "email": "s@example.com", "points": 0}, referrer="nobody", referral_points=50)
+    assert store.get_user("solo")["points"] == 0
+
+
+def test_update_user_sets_fields_only_if_expected_values_still_hold(store):
+    store.create_user({"username": "alice", "email": "a@example.com", "password_hash": "old", "plan": "free"})
+    # A plan upgrade lands between the login's read and its rehash write
+    assert store.update_user("alice", {"plan": "pro"})
+    assert store.update_user("alice", {"password_hash": "rehashed"}, expect={"password_hash": "old"})
+    assert store.get_user("alice") == {"username": "alice", "email": "a@example.com", "password_hash": "rehashed", "plan": "pro"}
+    # A reset replaced the hash: the stale rehash must not restore the old one
+    store.update_user("alice", {"password_hash": "reset"})
+    assert not store.update_user("alice", {"password_hash": "rehashed"}, expect={"password_hash": "old"})
+    assert store.get_user("alice")["password_hash"] == "reset"
+    assert not store.update_user("nobody", {"plan": "pro"})